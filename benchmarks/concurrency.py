@@ -0,0 +1,209 @@
+"""Compare hub reads mixed with UI writes on file-backed SQLite engines.
+
+Concurrent readers make hub selection lookups while concurrent writers add
+and select entrypoints, for a fixed time. Engines are either one shared pool
+the way the service sets them up by default, reads using autocommit
+connections from it, or a single writer connection with a pool of read-only
+connections. Reports throughput, latency and errors (e.g. SQLITE_BUSY) for
+reads and writes separately.
+
+Usage:
+
+    python -m benchmarks.concurrency --readers 16 --writers 1 4 --output c.json
+
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from jupyterhub_entrypoint import dbi
+
+from benchmarks.pragmas import PROFILES
+from benchmarks.seed import (
+    create_engine, database_url, entrypoint_data, seed, temporary_directory
+)
+from benchmarks.timing import report, summarize
+
+MODES = ["shared", "split"]
+
+
+async def create_engines(mode, url, pool_size, pragmas):
+    """Create the write and read engines for a mode."""
+
+    if mode == "shared":
+        engine = await create_engine(
+            url,
+            sqlite_pragmas=pragmas,
+            pool_size=pool_size
+        )
+        return engine, engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    engine = await create_engine(
+        url,
+        sqlite_pragmas=pragmas,
+        sqlite_mode="writer"
+    )
+    read_engine = dbi.async_engine(
+        url,
+        sqlite_pragmas=pragmas,
+        sqlite_mode="reader",
+        pool_size=pool_size,
+        future=True
+    )
+    return engine, read_engine
+
+
+async def run(
+    mode,
+    user_count,
+    readers,
+    writers,
+    seconds,
+    pool_size,
+    rng_seed=0,
+    directory=None
+):
+    """Seed a file database and time reads and writes running together.
+
+    Returns:
+        list: Result records for reads and for writes
+
+    """
+
+    url = database_url("file", directory)
+    engine, read_engine = await create_engines(
+        mode, url, pool_size, PROFILES["wal"]
+    )
+    population = await seed(engine, user_count, rng_seed)
+    async with engine.begin() as conn:
+        context_ids = await dbi.retrieve_context_ids(conn)
+
+    rng = random.Random(rng_seed)
+    selections = list(population.selections)
+    rng.shuffle(selections)
+    context_name = population.context_names[0]
+
+    durations = dict(read=list(), write=list())
+    errors = dict(read=0, write=0)
+    deadline = time.perf_counter() + seconds
+
+    async def read(i):
+        user, selection_context_name = selections[i % len(selections)]
+        async with read_engine.connect() as conn:
+            await dbi.retrieve_selection(
+                conn,
+                user,
+                selection_context_name,
+                raw=True,
+                batchspawner=False
+            )
+
+    async def write(i):
+        user = population.users[i % len(population.users)]
+        entrypoint_name = f"bench-{i}"
+        async with engine.begin() as conn:
+            await dbi.create_entrypoint(
+                conn,
+                user,
+                entrypoint_name,
+                "trusted_script",
+                entrypoint_data(rng, entrypoint_name, "trusted_script"),
+                [context_name],
+                context_ids
+            )
+            await dbi.update_selection(
+                conn, user, entrypoint_name, context_name, context_ids
+            )
+
+    async def worker(kind, function, w, count):
+        i = w
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await function(i)
+            except Exception:
+                errors[kind] += 1
+            else:
+                durations[kind].append(time.perf_counter() - start)
+            i += count
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker("read", read, w, readers) for w in range(readers)),
+        *(worker("write", write, w, writers) for w in range(writers))
+    )
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    await read_engine.dispose()
+
+    results = list()
+    for kind in ["read", "write"]:
+        result = dict(
+            mode=mode,
+            users=user_count,
+            readers=readers,
+            writers=writers,
+            step=kind,
+            errors=errors[kind],
+            per_second=len(durations[kind]) / elapsed,
+        )
+        if durations[kind]:
+            result.update(summarize(durations[kind]))
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, default=10000,
+        help="User count to seed"
+    )
+    parser.add_argument(
+        "--modes", choices=MODES, nargs="+", default=MODES,
+        help="Engine setups to compare"
+    )
+    parser.add_argument(
+        "--readers", type=int, default=16,
+        help="Concurrent hub readers"
+    )
+    parser.add_argument(
+        "--writers", type=int, nargs="+", default=[1, 4],
+        help="Concurrent UI writers, one run each"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=5.0,
+        help="How long each run lasts"
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=8,
+        help="Shared pool size, or read-only connections when split"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed for the population"
+    )
+    parser.add_argument("--output", help="Output JSON file, default stdout")
+    args = parser.parse_args()
+
+    results = list()
+    for mode in args.modes:
+        for writers in args.writers:
+            with temporary_directory() as directory:
+                results += asyncio.run(run(
+                    mode,
+                    args.users,
+                    args.readers,
+                    writers,
+                    args.seconds,
+                    args.pool_size,
+                    args.seed,
+                    directory
+                ))
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
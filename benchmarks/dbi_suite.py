@@ -0,0 +1,280 @@
+"""Time each public dbi function against a production-scale population.
+
+Usage:
+
+    python -m benchmarks.dbi_suite --users 10000 100000 --output dbi.json
+
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from jupyterhub_entrypoint import dbi
+
+from benchmarks.seed import (
+    create_engine, database_url, entrypoint_data, seed, temporary_directory
+)
+from benchmarks.timing import report, sample
+
+
+async def run(database, user_count, samples, rng_seed=0, directory=None):
+    """Seed a database and time every dbi function against it.
+
+    Each call runs in its own transaction, the way handlers make them.
+
+    Returns:
+        list: One result record per function
+
+    """
+
+    engine = await create_engine(database_url(database, directory))
+    start = time.perf_counter()
+    population = await seed(engine, user_count, rng_seed)
+    seed_seconds = time.perf_counter() - start
+
+    async with engine.begin() as conn:
+        context_ids = await dbi.retrieve_context_ids(conn)
+
+    rng = random.Random(rng_seed)
+    context_names = population.context_names
+    owners = [u for u in population.users if population.entrypoints[u]]
+    tagged = list(population.tags.items())
+    selections = list(population.selections)
+    created = [
+        (rng.choice(population.users), f"bench-{i}") for i in range(samples)
+    ]
+
+    def transaction(function):
+        async def timed(i):
+            async with engine.begin() as conn:
+                await function(conn, i)
+        return timed
+
+    def owner_entrypoint(i):
+        user = owners[i % len(owners)]
+        return user, population.entrypoints[user][0]
+
+    async def stream_many_entrypoints(conn, i):
+        groups = dbi.stream_many_entrypoints(conn, owners[i % len(owners)])
+        async for group in groups:
+            pass
+
+    # Tagging with every context adds the missing tags the first time, and
+    # changes nothing after that
+
+    def set_entrypoint_contexts(conn, i):
+        (user, entrypoint_name), _ = tagged[i % len(tagged)]
+        return dbi.set_entrypoint_contexts(
+            conn,
+            user,
+            population.uuids[(user, entrypoint_name)],
+            context_names,
+            context_ids
+        )
+
+    cases = [(
+        "retrieve_contexts",
+        lambda conn, i: dbi.retrieve_contexts(conn)
+    ), (
+        "retrieve_context_ids",
+        lambda conn, i: dbi.retrieve_context_ids(conn)
+    ), (
+        "retrieve_one_entrypoint",
+        lambda conn, i: dbi.retrieve_one_entrypoint(
+            conn, *owner_entrypoint(i)
+        )
+    ), (
+        "retrieve_one_entrypoint_uuid",
+        lambda conn, i: dbi.retrieve_one_entrypoint(
+            conn,
+            owner_entrypoint(i)[0],
+            uuid=population.uuids[owner_entrypoint(i)]
+        )
+    ), (
+        "retrieve_many_entrypoints",
+        lambda conn, i: dbi.retrieve_many_entrypoints(
+            conn, owners[i % len(owners)]
+        )
+    ), (
+        "retrieve_many_entrypoints_context",
+        lambda conn, i: dbi.retrieve_many_entrypoints(
+            conn,
+            owners[i % len(owners)],
+            None,
+            context_names[i % len(context_names)]
+        )
+    ), (
+        "retrieve_entrypoint_page",
+        lambda conn, i: dbi.retrieve_entrypoint_page(
+            conn, owners[i % len(owners)], limit=10
+        )
+    ), (
+        "retrieve_entrypoint_page_after",
+        lambda conn, i: dbi.retrieve_entrypoint_page(
+            conn,
+            owners[i % len(owners)],
+            limit=10,
+            after=(context_names[0], "", "")
+        )
+    ), (
+        "stream_many_entrypoints",
+        stream_many_entrypoints
+    ), (
+        "retrieve_selection",
+        lambda conn, i: dbi.retrieve_selection(
+            conn, *selections[i % len(selections)]
+        )
+    ), (
+        "create_entrypoint",
+        lambda conn, i: dbi.create_entrypoint(
+            conn,
+            created[i][0],
+            created[i][1],
+            "trusted_script",
+            entrypoint_data(rng, created[i][1], "trusted_script"),
+            context_names[:1],
+            context_ids
+        )
+    ), (
+        "update_entrypoint",
+        lambda conn, i: dbi.update_entrypoint(
+            conn,
+            created[i][0],
+            created[i][1],
+            "trusted_script",
+            entrypoint_data(rng, created[i][1], "trusted_script")
+        )
+    ), (
+        "update_entrypoint_uuid",
+        lambda conn, i: dbi.update_entrypoint_uuid(
+            conn,
+            owner_entrypoint(i)[0],
+            population.uuids[owner_entrypoint(i)],
+            owner_entrypoint(i)[1],
+            entrypoint_data(rng, owner_entrypoint(i)[1], "trusted_script")
+        )
+    ), (
+        "tag_entrypoint",
+        lambda conn, i: dbi.tag_entrypoint(
+            conn, *created[i], context_names[1], context_ids
+        )
+    ), (
+        "retag_entrypoint",
+        lambda conn, i: dbi.tag_entrypoint(
+            conn,
+            *tagged[i % len(tagged)][0],
+            tagged[i % len(tagged)][1][0],
+            context_ids
+        )
+    ), (
+        "set_entrypoint_contexts",
+        set_entrypoint_contexts
+    ), (
+        "set_entrypoint_contexts_unchanged",
+        set_entrypoint_contexts
+    ), (
+        "untag_entrypoint",
+        lambda conn, i: dbi.untag_entrypoint(
+            conn, *created[i], context_names[1], context_ids
+        )
+    ), (
+        "update_selection",
+        lambda conn, i: dbi.update_selection(
+            conn,
+            tagged[i % len(tagged)][0][0],
+            tagged[i % len(tagged)][0][1],
+            tagged[i % len(tagged)][1][0],
+            context_ids
+        )
+    ), (
+        "delete_selection",
+        lambda conn, i: dbi.delete_selection(
+            conn, *selections[i % len(selections)], context_ids
+        )
+    ), (
+        "delete_entrypoint",
+        lambda conn, i: dbi.delete_entrypoint(conn, *created[i])
+    ), (
+        "create_context",
+        lambda conn, i: dbi.create_context(conn, f"bench-context-{i}")
+    ), (
+        "create_contexts_existing",
+        lambda conn, i: dbi.create_contexts(conn, context_names)
+    ), (
+        "delete_context",
+        lambda conn, i: dbi.delete_context(conn, f"bench-context-{i}")
+    )]
+
+    results = list()
+    for name, function in cases:
+        result = dict(
+            database=database,
+            users=user_count,
+            function=name,
+        )
+        result.update(await sample(transaction(function), samples))
+        results.append(result)
+
+    # Deleting a populated context cascades to its tags, time it once
+
+    result = dict(database=database, users=user_count,
+                  function="delete_context_populated")
+    result.update(await sample(transaction(
+        lambda conn, i: dbi.delete_context(conn, context_names[-1])
+    ), 1))
+    results.append(result)
+
+    results.append(dict(
+        database=database,
+        users=user_count,
+        function="seed",
+        samples=1,
+        total=seed_seconds,
+        entrypoints=sum(map(len, population.entrypoints.values())),
+        selections=len(population.selections),
+    ))
+
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, nargs="+", default=[10000],
+        help="User counts to seed, one run each"
+    )
+    parser.add_argument(
+        "--database", choices=["memory", "file"], nargs="+",
+        default=["memory", "file"],
+        help="SQLite databases to run against"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=200,
+        help="Calls timed per function"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed for the population"
+    )
+    parser.add_argument("--output", help="Output JSON file, default stdout")
+    args = parser.parse_args()
+
+    results = list()
+    for database in args.database:
+        for user_count in args.users:
+            with temporary_directory() as directory:
+                results += asyncio.run(run(
+                    database,
+                    user_count,
+                    args.samples,
+                    args.seed,
+                    directory
+                ))
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
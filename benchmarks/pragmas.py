@@ -0,0 +1,177 @@
+"""Compare write throughput of file-backed SQLite under pragma profiles.
+
+Also compares batching writes from concurrent writers into shared commits,
+for each batch window given, against committing each write on its own.
+
+Usage:
+
+    python -m benchmarks.pragmas --users 10000 --writers 1 8 --output p.json
+    python -m benchmarks.pragmas --profiles wal --batch-windows 0 0.005
+
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from jupyterhub_entrypoint import dbi
+
+from benchmarks.seed import (
+    create_engine, database_url, entrypoint_data, seed, temporary_directory
+)
+from benchmarks.timing import report, summarize
+
+# SQLite's own defaults (rollback journal, synchronous=FULL) against WAL, and
+# WAL with the memory-related settings raised.
+
+PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+    },
+    "wal_tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+    },
+}
+
+
+async def run(
+    profile,
+    user_count,
+    writes,
+    writers,
+    batch_window=0.0,
+    rng_seed=0,
+    directory=None
+):
+    """Seed a file database and time concurrent write transactions.
+
+    Each write creates an entrypoint and selects it, in one transaction, the
+    way a user adding and choosing an entrypoint would. With a batch window
+    writes go through a `WriteCoordinator` the way handlers' writes do.
+
+    Returns:
+        dict: Result record for the profile and writer count
+
+    """
+
+    engine = await create_engine(
+        database_url("file", directory),
+        sqlite_pragmas=PROFILES[profile]
+    )
+    population = await seed(engine, user_count, rng_seed)
+    async with engine.begin() as conn:
+        context_ids = await dbi.retrieve_context_ids(conn)
+
+    begin = engine.begin
+    if batch_window > 0:
+        begin = dbi.WriteCoordinator(engine, batch_window, writers).begin
+
+    rng = random.Random(rng_seed)
+    context_name = population.context_names[0]
+    durations = list()
+    errors = 0
+
+    async def write(i):
+        nonlocal errors
+        user = population.users[i % len(population.users)]
+        entrypoint_name = f"bench-{i}"
+        start = time.perf_counter()
+        try:
+            async with begin() as conn:
+                await dbi.create_entrypoint(
+                    conn,
+                    user,
+                    entrypoint_name,
+                    "trusted_script",
+                    entrypoint_data(rng, entrypoint_name, "trusted_script"),
+                    [context_name],
+                    context_ids
+                )
+                await dbi.update_selection(
+                    conn, user, entrypoint_name, context_name, context_ids
+                )
+        except Exception:
+            errors += 1
+            return
+        durations.append(time.perf_counter() - start)
+
+    async def writer(w):
+        for i in range(w, writes, writers):
+            await write(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(writers)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+
+    result = dict(
+        profile=profile,
+        users=user_count,
+        writers=writers,
+        batch_window=batch_window,
+        errors=errors,
+        writes_per_second=len(durations) / elapsed,
+    )
+    if durations:
+        result.update(summarize(durations))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, default=10000,
+        help="User count to seed"
+    )
+    parser.add_argument(
+        "--profiles", choices=list(PROFILES), nargs="+",
+        default=list(PROFILES),
+        help="Pragma profiles to compare"
+    )
+    parser.add_argument(
+        "--writes", type=int, default=500,
+        help="Write transactions per run"
+    )
+    parser.add_argument(
+        "--writers", type=int, nargs="+", default=[1, 8],
+        help="Concurrent writers, one run each"
+    )
+    parser.add_argument(
+        "--batch-windows", type=float, nargs="+", default=[0.0],
+        help="Write batch windows in seconds, one run each, 0 doesn't batch"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed for the population"
+    )
+    parser.add_argument("--output", help="Output JSON file, default stdout")
+    args = parser.parse_args()
+
+    results = list()
+    for profile in args.profiles:
+        for writers in args.writers:
+            for batch_window in args.batch_windows:
+                with temporary_directory() as directory:
+                    results.append(asyncio.run(run(
+                        profile,
+                        args.users,
+                        args.writes,
+                        writers,
+                        batch_window,
+                        args.seed,
+                        directory
+                    )))
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Time loading the in-memory hub read model, and measure its size.
+
+For each population size, seeds a database, stores spawner arguments the
+way the service does at startup, then loads the read model from it. Reports
+load time, the model's own estimate of its size and what tracemalloc sees,
+both also per 10k users, and hub selection lookups from memory against the
+database for comparison.
+
+Usage:
+
+    python -m benchmarks.read_model --users 10000 100000 --output rm.json
+
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.read_model import ReadModel
+
+from benchmarks.responses import entrypoint_types
+from benchmarks.seed import (
+    create_engine, database_url, seed, temporary_directory
+)
+from benchmarks.timing import report, sample
+
+
+async def materialize(engine, types):
+    """Store spawner arguments for every seeded entrypoint."""
+
+    async with engine.begin() as conn:
+        rows = list()
+        for row in await dbi.retrieve_all_entrypoint_data(conn):
+            entrypoint_type = types[row["entrypoint_type"]]
+            spawner_args = entrypoint_type.materialize_spawner_args(
+                row["entrypoint_data"]
+            )
+            rows.append(dict(spawner_args, uuid=row["uuid"]))
+        await dbi.replace_all_spawner_args(conn, rows)
+
+
+async def run(database, user_count, samples, rng_seed=0, directory=None):
+    """Seed a database, load the read model from it, and time lookups.
+
+    Returns:
+        list: Result records for loading and for lookups
+
+    """
+
+    engine = await create_engine(database_url(database, directory))
+    population = await seed(engine, user_count, rng_seed)
+    types = entrypoint_types()
+    await materialize(engine, types)
+
+    start = time.perf_counter()
+    read_model = ReadModel(types)
+    await read_model.load(engine)
+    elapsed = time.perf_counter() - start
+
+    # Tracing allocations slows loading down a lot, so measure separately
+
+    del read_model
+    tracemalloc.start()
+    read_model = ReadModel(types)
+    await read_model.load(engine)
+    traced, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    footprint = read_model.footprint()
+    per_10k = 10000 / user_count
+    results = [dict(
+        database=database,
+        users=user_count,
+        step="load",
+        loaded_users=len(read_model),
+        seconds=elapsed,
+        footprint_bytes=footprint,
+        footprint_bytes_per_10k_users=footprint * per_10k,
+        traced_bytes=traced,
+        traced_bytes_per_10k_users=traced * per_10k,
+        peak_traced_bytes=peak,
+    )]
+
+    # Selection lookups, the hub's spawn path, from memory and from the
+    # database with stored spawner arguments
+
+    rng = random.Random(rng_seed)
+    selections = list(population.selections)
+    rng.shuffle(selections)
+
+    async def from_memory(i):
+        user, context_name = selections[i % len(selections)]
+        read_model.selection(user, context_name)
+
+    async def from_database(i):
+        user, context_name = selections[i % len(selections)]
+        async with engine.connect() as conn:
+            await dbi.retrieve_selection(
+                conn, user, context_name, raw=True, batchspawner=False
+            )
+
+    for step, function in (("memory", from_memory),
+                           ("database", from_database)):
+        result = dict(database=database, users=user_count, step=step)
+        result.update(await sample(function, samples))
+        results.append(result)
+
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, nargs="+", default=[10000],
+        help="User counts to seed"
+    )
+    parser.add_argument(
+        "--database", choices=["memory", "file"], default="file",
+        help="Where the seeded database lives"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=1000,
+        help="Selection lookups timed each way"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed for the population"
+    )
+    parser.add_argument("--output", help="Output JSON file, default stdout")
+    args = parser.parse_args()
+
+    results = list()
+    for user_count in args.users:
+        with temporary_directory() as directory:
+            results += asyncio.run(run(
+                args.database,
+                user_count,
+                args.samples,
+                args.seed,
+                directory
+            ))
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
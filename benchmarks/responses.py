@@ -0,0 +1,209 @@
+"""Time hub entrypoint lookups with stdlib JSON against orjson.
+
+Each sample does what HubEntrypointAPIHandler does on a cache miss: reads a
+user's entrypoints for a context, renders spawner arguments, and encodes the
+response body. The "stdlib" and "fast" codecs decode entrypoint_data and
+encode the whole body, "raw" reads it as JSON text and splices spawner
+arguments into the body as the handler now does. Users are grouped by how
+many entrypoints they have.
+
+Usage:
+
+    python -m benchmarks.responses --users 10000 --output responses.json
+
+"""
+
+import argparse
+import asyncio
+import json
+
+from tornado.escape import json_encode
+
+from jupyterhub_entrypoint import dbi, jsonutil
+from jupyterhub_entrypoint.types import (
+    ShifterEntrypointType, TrustedPathEntrypointType,
+    TrustedScriptEntrypointType
+)
+
+from benchmarks.seed import (
+    PATHS, SCRIPTS, create_engine, database_url, seed
+)
+from benchmarks.timing import report, sample
+
+# Serializers as the service used them before, and as it uses them now
+
+CODECS = {
+    "stdlib": dict(
+        json_serializer=json.dumps,
+        json_deserializer=json.loads,
+        encode=json_encode,
+    ),
+    "fast": dict(
+        json_serializer=jsonutil.dumps,
+        json_deserializer=jsonutil.loads,
+        encode=jsonutil.dumps_bytes,
+    ),
+    "raw": dict(
+        json_serializer=jsonutil.dumps,
+        json_deserializer=jsonutil.loads,
+        encode=lambda body: body,
+    ),
+}
+
+# Users are binned by entrypoint count, e.g. 1-2, 3-9, 10 and up
+
+BINS = [(1, 2), (3, 9), (10, None)]
+
+
+def entrypoint_types():
+    types = [
+        TrustedScriptEntrypointType(*SCRIPTS),
+        TrustedPathEntrypointType(*PATHS),
+        ShifterEntrypointType("http://localhost/", "token"),
+    ]
+    return {t.get_type_name(): t for t in types}
+
+
+def render(entrypoints, types, context_name):
+    """Build the response the way HubEntrypointAPIHandler does."""
+
+    result = list()
+    for entrypoint_type_name, entrypoint_list in entrypoints.get(
+        context_name, {}
+    ).items():
+        entrypoint_type = types[entrypoint_type_name]
+        for entrypoint in entrypoint_list:
+            entrypoint_data = entrypoint["entrypoint_data"]
+            result.append({
+                "entrypoint_name": entrypoint_data["entrypoint_name"],
+                "entrypoint_type": entrypoint_type_name,
+                "selected": entrypoint["selected"] is True,
+                "spawner_args": entrypoint_type.spawner_args(entrypoint_data)
+            })
+    return dict(entrypoints=result)
+
+
+def render_raw(entrypoints, types, context_name):
+    """Splice the response together from raw entrypoint data."""
+
+    result = list()
+    for entrypoint_type_name, entrypoint_list in entrypoints.get(
+        context_name, {}
+    ).items():
+        entrypoint_type = types[entrypoint_type_name]
+        for entrypoint in entrypoint_list:
+            result.append(b"".join((
+                b'{"entrypoint_name":',
+                jsonutil.dumps_bytes(entrypoint["entrypoint_name"]),
+                b',"entrypoint_type":',
+                jsonutil.dumps_bytes(entrypoint_type_name),
+                b',"selected":',
+                b"true" if entrypoint["selected"] is True else b"false",
+                b',"spawner_args":',
+                entrypoint_type.spawner_args_json(
+                    entrypoint["entrypoint_data"]
+                ),
+                b"}"
+            )))
+    return b'{"entrypoints":[' + b",".join(result) + b"]}"
+
+
+async def run(codec, user_count, samples, rng_seed=0):
+    """Seed a database with one codec and time lookups through it.
+
+    Returns:
+        list: One result record per user bin, plus encoding alone
+
+    """
+
+    encode = CODECS[codec]["encode"]
+    raw = codec == "raw"
+    engine = await create_engine(
+        database_url("memory"),
+        json_serializer=CODECS[codec]["json_serializer"],
+        json_deserializer=CODECS[codec]["json_deserializer"],
+    )
+    population = await seed(engine, user_count, rng_seed)
+    types = entrypoint_types()
+
+    # Each user's busiest context, so responses aren't trivially empty
+
+    lookups = dict()
+    for user, names in population.entrypoints.items():
+        counts = dict()
+        for name in names:
+            for context_name in population.tags[(user, name)]:
+                counts[context_name] = counts.get(context_name, 0) + 1
+        if counts:
+            context_name = max(counts, key=counts.get)
+            lookups[user] = (context_name, counts[context_name])
+
+    results = list()
+    for low, high in BINS:
+        users = [
+            (user, context_name)
+            for user, (context_name, count) in lookups.items()
+            if count >= low and (high is None or count <= high)
+        ]
+        if not users:
+            continue
+        bodies = list()
+
+        async def lookup(i):
+            user, context_name = users[i % len(users)]
+            async with engine.connect() as conn:
+                entrypoints = await dbi.retrieve_many_entrypoints(
+                    conn, user, None, context_name, raw=raw
+                )
+            if raw:
+                bodies.append(render_raw(entrypoints, types, context_name))
+            else:
+                bodies.append(render(entrypoints, types, context_name))
+            encode(bodies[-1])
+
+        result = dict(
+            codec=codec,
+            users=user_count,
+            entrypoints=f"{low}+" if high is None else f"{low}-{high}",
+        )
+        result.update(await sample(lookup, samples))
+        results.append(result)
+
+        async def encode_only(i):
+            encode(bodies[i % len(bodies)])
+
+        result = dict(result, step="encode")
+        result.update(await sample(encode_only, samples))
+        results.append(result)
+
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, default=10000,
+        help="User count to seed"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=500,
+        help="Lookups timed per user bin"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Random seed for the population"
+    )
+    parser.add_argument("--output", help="Output JSON file, default stdout")
+    args = parser.parse_args()
+
+    results = list()
+    for codec in CODECS:
+        results += asyncio.run(
+            run(codec, args.users, args.samples, args.seed)
+        )
+    report(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+
+from dataclasses import dataclass, field
+import os
+import random
+import tempfile
+from uuid import uuid4
+
+from sqlalchemy.sql import insert
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.dbi.model import (
+    contexts, entrypoints, entrypoint_contexts
+)
+
+# Sites have a handful of contexts: login nodes, partitions, reservations.
+
+CONTEXT_NAMES = [
+    "login",
+    "cpu",
+    "gpu",
+    "shared",
+    "debug",
+    "reservation-a",
+    "reservation-b",
+]
+
+# Most users have a few entrypoints, a few power users and service accounts
+# have a great many. Weights are (entrypoint count, relative frequency).
+
+ENTRYPOINT_COUNTS = [
+    (0, 10),
+    (1, 35),
+    (2, 25),
+    (3, 15),
+    (5, 10),
+    (10, 4),
+    (100, 1),
+]
+
+ENTRYPOINT_TYPES = [
+    ("trusted_script", 50),
+    ("shifter", 35),
+    ("trusted_path", 15),
+]
+
+SCRIPTS = [f"/usr/local/bin/entrypoint-{i}.sh" for i in range(50)]
+IMAGES = [f"registry/image-{i}:latest" for i in range(200)]
+PATHS = [f"/global/common/software/env-{i}/bin" for i in range(20)]
+
+SELECTION_PROBABILITY = 0.7
+
+
+@dataclass
+class Population:
+    """What was seeded, for picking realistic arguments when timing."""
+
+    users: list = field(default_factory=list)
+    entrypoints: dict = field(default_factory=dict)
+    uuids: dict = field(default_factory=dict)
+    tags: dict = field(default_factory=dict)
+    selections: dict = field(default_factory=dict)
+    context_names: list = field(default_factory=list)
+
+
+def entrypoint_data(rng, entrypoint_name, entrypoint_type):
+    """Make entrypoint data resembling what each reference type stores."""
+
+    data = dict(entrypoint_name=entrypoint_name)
+    if entrypoint_type == "trusted_script":
+        data["script"] = rng.choice(SCRIPTS)
+    elif entrypoint_type == "shifter":
+        data["image"] = rng.choice(IMAGES)
+    else:
+        data["path"] = rng.choice(PATHS)
+    return data
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+async def seed(engine, user_count, seed=0, batch_size=10000):
+    """Populate the database with users, entrypoints, tags and selections.
+
+    Records are bulk inserted through the model tables rather than the dbi
+    functions, which are what is being measured.
+
+    Args:
+        engine (AsyncEngine): Engine for an initialized, empty database
+        user_count (int): Number of users to create
+        seed (int): Random seed, so runs are comparable
+        batch_size (int): Rows per bulk insert
+
+    Returns:
+        Population: Summary of the seeded records
+
+    """
+
+    rng = random.Random(seed)
+    population = Population(context_names=list(CONTEXT_NAMES))
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(contexts), [
+            dict(id=i + 1, context_name=name)
+            for i, name in enumerate(CONTEXT_NAMES)
+        ])
+
+    entrypoint_rows = list()
+    tag_rows = list()
+    entrypoint_id = 0
+    for u in range(user_count):
+        user = f"user{u:06d}"
+        population.users.append(user)
+        names = list()
+        selectable = dict()
+        first_tag = len(tag_rows)
+        for n in range(weighted(rng, ENTRYPOINT_COUNTS)):
+            entrypoint_id += 1
+            entrypoint_type = weighted(rng, ENTRYPOINT_TYPES)
+            entrypoint_name = f"{entrypoint_type}-{n}"
+            names.append(entrypoint_name)
+            uuid = str(uuid4())
+            population.uuids[(user, entrypoint_name)] = uuid
+            entrypoint_rows.append(dict(
+                id=entrypoint_id,
+                uuid=uuid,
+                user=user,
+                entrypoint_name=entrypoint_name,
+                entrypoint_type=entrypoint_type,
+                entrypoint_data=entrypoint_data(
+                    rng, entrypoint_name, entrypoint_type
+                ),
+            ))
+
+            # Mostly one context, sometimes a few, occasionally everywhere
+
+            roll = rng.random()
+            if roll < 0.6:
+                tagged = rng.sample(CONTEXT_NAMES, 1)
+            elif roll < 0.9:
+                tagged = rng.sample(CONTEXT_NAMES, rng.randint(2, 3))
+            else:
+                tagged = list(CONTEXT_NAMES)
+            population.tags[(user, entrypoint_name)] = tagged
+            for context_name in tagged:
+                selectable.setdefault(context_name, list()).append(
+                    (entrypoint_id, entrypoint_name)
+                )
+                tag_rows.append(dict(
+                    entrypoint_id=entrypoint_id,
+                    context_id=CONTEXT_NAMES.index(context_name) + 1,
+                    user=None,
+                ))
+        population.entrypoints[user] = names
+
+        # Select one entrypoint per context for most contexts
+
+        selected = set()
+        for context_name, candidates in selectable.items():
+            if rng.random() < SELECTION_PROBABILITY:
+                selected_id, selected_name = rng.choice(candidates)
+                context_id = CONTEXT_NAMES.index(context_name) + 1
+                selected.add((selected_id, context_id))
+                population.selections[(user, context_name)] = selected_name
+        for row in tag_rows[first_tag:]:
+            if (row["entrypoint_id"], row["context_id"]) in selected:
+                row["user"] = user
+
+    for rows, table in ((entrypoint_rows, entrypoints),
+                        (tag_rows, entrypoint_contexts)):
+        for i in range(0, len(rows), batch_size):
+            async with engine.begin() as conn:
+                await conn.execute(insert(table), rows[i:i + batch_size])
+
+    return population
+
+
+def database_url(database, directory=None):
+    """Map a database kind to an aiosqlite URL.
+
+    Args:
+        database (str): "memory" or "file"
+        directory (str, optional): Where a file-backed database goes, the
+            caller removes it afterwards, see `temporary_directory()`
+
+    Raises:
+        ValueError: If a file-backed database has no directory
+
+    """
+
+    if database == "memory":
+        return "sqlite+aiosqlite:///:memory:"
+    if directory is None:
+        raise ValueError("File-backed databases need a directory")
+    path = os.path.join(directory, "entrypoint.sqlite")
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def temporary_directory():
+    """Directory for a file-backed database, removed when the run is done."""
+    return tempfile.TemporaryDirectory(prefix="entrypoint-bench-")
+
+
+async def create_engine(url, **kwargs):
+    """Create an engine with an empty, initialized database."""
+
+    engine = dbi.async_engine(url, future=True, **kwargs)
+    async with engine.begin() as conn:
+        await dbi.init_db(conn, True)
+    return engine
@@ -0,0 +1,81 @@
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import sqlalchemy
+
+
+async def sample(function, samples):
+    """Time `samples` awaited calls to `function(i)` for i in range(samples).
+
+    Returns:
+        dict: Summary statistics in seconds
+
+    """
+
+    durations = list()
+    for i in range(samples):
+        start = time.perf_counter()
+        await function(i)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def summarize(durations):
+    """Summarize a list of durations in seconds."""
+
+    durations = sorted(durations)
+    count = len(durations)
+    return dict(
+        samples=count,
+        mean=statistics.mean(durations),
+        median=statistics.median(durations),
+        p95=durations[min(count - 1, int(0.95 * count))],
+        min=durations[0],
+        max=durations[-1],
+        total=sum(durations),
+    )
+
+
+def metadata():
+    """Describe the environment so results can be compared across commits."""
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return dict(
+        commit=commit,
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        python=platform.python_version(),
+        sqlalchemy=sqlalchemy.__version__,
+        platform=platform.platform(),
+    )
+
+
+def report(results, output=None):
+    """Write results with environment metadata as JSON.
+
+    Args:
+        results (list): Result records from a benchmark run
+        output (str, optional): Output path, default is standard output
+
+    """
+
+    document = dict(metadata=metadata(), results=results)
+    text = json.dumps(document, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
@@ -0,0 +1,165 @@
+
+import asyncio
+from collections import OrderedDict
+import time
+
+
+class ResponseCache:
+    """Least-recently-used cache of serialized responses, with expiration.
+
+    Keys are tuples whose first element is the user name, so that everything
+    cached for a user can be invalidated at once when that user's entrypoints
+    or selections change. Entries also expire `ttl` seconds after being set.
+
+    A reader that misses should take a `version()` for the user before going
+    to the database and pass it to `set()`. If the user is invalidated in the
+    meantime the result is not cached, since it may already be out of date.
+    Versions are invalidation times on a counter. Only the `max_size` users
+    invalidated most recently keep their own, the others share the latest
+    time dropped, so a version may change without the user being invalidated
+    but never stays the same when they are.
+
+    Hits and misses are counted for monitoring.
+
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0):
+        """Initialize the cache.
+
+        Args:
+            max_size (int): Maximum number of entries, 0 disables caching
+            ttl (float): Seconds an entry remains valid after being set
+
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._user_keys = dict()
+        self._invalidated = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return cached value for `key`, or None if missing or expired."""
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._discard(key)
+        self.misses += 1
+        return None
+
+    def set(self, key, value, version=None):
+        """Cache `value` for `key` unless the user was invalidated since.
+
+        Args:
+            key (tuple): Cache key, first element is the user name
+            value: Value to cache, should not be mutated afterwards
+            version (tuple, optional): Result of `version()` taken before the
+                value was computed
+
+        """
+
+        if self.max_size <= 0:
+            return
+        user = key[0]
+        if version is not None and version != self.version(user):
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._user_keys.setdefault(user, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def version(self, user):
+        """Return a token that changes whenever `user` is invalidated."""
+        return (self._invalidated.get(user, self._floor),)
+
+    def invalidate(self, user):
+        """Drop every entry cached for `user`."""
+
+        self._clock += 1
+        self._invalidated[user] = self._clock
+        self._invalidated.move_to_end(user)
+        while len(self._invalidated) > self.max_size:
+            _, self._floor = self._invalidated.popitem(last=False)
+        for key in self._user_keys.pop(user, ()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry for every user."""
+
+        self._clock += 1
+        self._floor = self._clock
+        self._invalidated.clear()
+        self._entries.clear()
+        self._user_keys.clear()
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single call.
+
+    The first caller for a key starts the call, and callers arriving while it
+    is still in flight wait for the same result (or exception) instead of
+    starting their own. Results are shared, so they should not be mutated.
+
+    Calls started and waiters coalesced into them are counted for monitoring.
+
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._futures = dict()
+
+    def __contains__(self, key):
+        return key in self._futures
+
+    async def run(self, key, function, *args, **kwargs):
+        """Await `function(*args, **kwargs)`, or an identical call in flight.
+
+        Args:
+            key (tuple): Identifies calls that can share a result
+            function (coroutine function): Makes the call
+
+        Returns:
+            Result of the call
+
+        """
+
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.ensure_future(function(*args, **kwargs))
+            self._futures[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        # A waiter that is cancelled shouldn't cancel the call for the others
+
+        return await asyncio.shield(future)
+
+    def _done(self, key, future):
+        if self._futures.get(key) is future:
+            del self._futures[key]
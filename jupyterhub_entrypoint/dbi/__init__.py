@@ -1,20 +1,29 @@
 
-from sqlite3 import Connection as SQLite3Connection
+import re
 
 from sqlalchemy import event
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from jupyterhub_entrypoint import jsonutil
 
 from .model import metadata
+from .tracing import count_statements, statement_budget, trace_statements
+from .batching import WriteCoordinator
 
 from .entrypoints import (
     create_entrypoint,
     retrieve_one_entrypoint,
     retrieve_many_entrypoints,
+    retrieve_entrypoint_page,
+    stream_many_entrypoints,
+    stream_tagged_entrypoints,
     update_entrypoint,
     update_entrypoint_uuid,
     tag_entrypoint,
     untag_entrypoint,
+    set_entrypoint_contexts,
     delete_entrypoint
 )
 
@@ -24,29 +33,138 @@ from .selections import (
     delete_selection
 )
 
+from .spawner_args import (
+    set_spawner_args,
+    retrieve_all_entrypoint_data,
+    replace_all_spawner_args,
+    retrieve_state,
+    update_state
+)
+
+from .snapshot import (
+    is_memory_database,
+    track_memory_connection,
+    write_snapshot,
+    restore_snapshot
+)
+
 from .contexts import (
     create_context,
+    create_contexts,
     retrieve_contexts,
+    retrieve_context_ids,
     delete_context
 )
 
-def async_engine(*args, **kwargs):
-    engine = create_async_engine(*args, **kwargs)
+def async_engine(
+    *args,
+    sqlite_pragmas=None,
+    sqlite_mode=None,
+    json_serializer=jsonutil.dumps,
+    json_deserializer=jsonutil.loads,
+    **kwargs
+):
+    """Create an asyncio engine, applying SQLite pragmas to its connections.
+
+    Args:
+        sqlite_pragmas      (dict, optional): Pragma names and values set on
+                            each new SQLite connection, e.g.
+                            {"journal_mode": "WAL"}. Foreign keys are always
+                            turned on.
+        sqlite_mode         (str, optional): For file-backed SQLite only,
+                            "writer" for a single long-lived connection that
+                            writers queue for, or "reader" for read-only
+                            connections to the same file
+        json_serializer     (callable): Encodes JSON columns, e.g. entrypoint
+                            data, defaults to orjson if it is installed
+        json_deserializer   (callable): Decodes JSON columns
+
+    Raises:
+        ValueError: If a pragma name or value is not a plain word or number,
+            or a SQLite mode is unknown or not for file-backed SQLite
+
+    """
+
+    pragmas = dict(sqlite_pragmas or {})
+    if sqlite_mode is not None:
+        url = make_url(args[0])
+        if sqlite_file(url) is None:
+            raise ValueError(f"SQLite mode {sqlite_mode} needs a SQLite file")
+
+        # SQLite takes one writer at a time, so writers wait for the single
+        # connection in the pool's queue rather than on SQLite's lock
+
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+        if sqlite_mode == "writer":
+            kwargs.update(pool_size=1, max_overflow=0, pool_recycle=-1)
+        elif sqlite_mode == "reader":
+            args = (read_only_url(url),) + args[1:]
+            kwargs.setdefault("isolation_level", "AUTOCOMMIT")
+            kwargs["max_overflow"] = 0
+            pragmas.pop("journal_mode", None)
+        else:
+            raise ValueError(f"Invalid SQLite mode {sqlite_mode!r}")
+
+    engine = create_async_engine(
+        *args,
+        json_serializer=json_serializer,
+        json_deserializer=json_deserializer,
+        **kwargs
+    )
     if engine.name == "sqlite":
-        register_foreign_keys()
+        pragmas["foreign_keys"] = "ON"
+        register_pragmas(engine, pragmas)
+    if is_memory_database(engine):
+        track_memory_connection(engine)
     return engine
 
-def register_foreign_keys(): # pragma: no cover
-    """Enable deletes with cascade in e.g. sqlite"""
+def sqlite_file(url):
+    """Return the database file of a SQLite URL, None if not file-backed."""
+
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return None
+    if url.database in (None, "", ":memory:"):
+        return None
+    if url.query.get("mode") == "memory":
+        return None
+    return url.database
+
+def read_only_url(url):
+    """Turn a file-backed SQLite URL into one opening the file read-only."""
 
-    # See https://docs.sqlalchemy.org/en/14/dialects/sqlite.html?highlight=pragma#foreign-key-support
+    url = make_url(url)
+    database = url.database
+    if url.query.get("uri") != "true":
+        database = f"file:{database}"
+    return url.set(
+        database=database,
+        query=dict(url.query, mode="ro", uri="true")
+    )
 
-    @event.listens_for(Engine, "connect")
+def register_pragmas(engine, pragmas):
+    """Set pragmas on each new connection of one SQLite engine."""
+
+    # Foreign keys need to be on for deletes with cascade in SQLite, see
+    # https://docs.sqlalchemy.org/en/14/dialects/sqlite.html?highlight=pragma#foreign-key-support
+
+    statements = list()
+    for name, value in pragmas.items():
+        if not _pragma_token.match(str(name)):
+            raise ValueError(f"Invalid SQLite pragma name {name!r}")
+        if not _pragma_token.match(str(value)):
+            raise ValueError(f"Invalid value {value!r} for pragma {name}")
+        statements.append(f"PRAGMA {name}={value}")
+
+    @event.listens_for(engine.sync_engine, "connect")
     def connect(dbi_connection, connection_record):
         cursor = dbi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for statement in statements:
+            cursor.execute(statement)
         cursor.close()
 
+_pragma_token = re.compile(r"^-?\w+$")
+
 async def init_db(conn, drop_all=False):
     if drop_all:
         await conn.run_sync(metadata.drop_all)
@@ -0,0 +1,145 @@
+
+import asyncio
+from contextlib import asynccontextmanager
+
+# To the developer/curious:
+#
+# On a file-backed SQLite database every commit waits for the disk, and that
+# wait dominates small writes like a selection change. Under bursts of writes
+# the coordinator keeps one transaction open for a short window and runs each
+# caller's writes in a savepoint inside it, one caller at a time, so many
+# writes share one commit. Callers resume only once the shared transaction
+# has committed, so as far as they can tell they each had their own.
+#
+# The sqlite3 driver doesn't begin a transaction before a SAVEPOINT, and
+# SQLite treats releasing an outermost savepoint as a commit. That would
+# commit every caller on its own again, so on SQLite the batch transaction
+# begins explicitly.
+
+class _Batch:
+    """One open transaction shared by the writes gathered into it."""
+
+    def __init__(self, conn, committed):
+        self.conn = conn
+        self.committed = committed
+        self.writes = 0
+        self.timer = None
+
+class WriteCoordinator:
+    """Commit writes from concurrent callers together, in batches.
+
+    Callers use `begin()` the way they would use `engine.begin()`. Writes are
+    serialized, each in its own savepoint of a transaction that commits
+    `window` seconds after the first write in it began, or as soon as it holds
+    `max_batch` writes. A caller whose block raises has only its own writes
+    rolled back and gets its exception right away. Other callers leave
+    `begin()` once the transaction committed, or with the commit's exception.
+
+    Batches committed and writes in them are counted for monitoring.
+
+    """
+
+    def __init__(self, engine, window=0.005, max_batch=64):
+        """Initialize a write coordinator.
+
+        Args:
+            engine      (AsyncEngine): SQLAlchemy asyncio engine to write to
+            window      (float): Seconds a batch stays open for more writes
+            max_batch   (int): Writes that commit a batch without waiting
+
+        """
+
+        self.engine = engine
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._lock = asyncio.Lock()
+        self._batch = None
+
+    @asynccontextmanager
+    async def begin(self):
+        """Run a block of writes in the current batch, wait for its commit.
+
+        Yields:
+            AsyncConnection: Connection, inside a savepoint, to write with
+
+        """
+
+        async with self._lock:
+            batch = self._batch
+            if batch is None:
+                batch = await self._open()
+            async with batch.conn.begin_nested():
+                yield batch.conn
+            batch.writes += 1
+            if batch.writes >= self.max_batch:
+                await self._commit(batch)
+
+        # A caller that is cancelled now can't take its writes back anyway
+
+        await asyncio.shield(batch.committed)
+
+    async def flush(self):
+        """Commit the current batch now, if there is one."""
+
+        async with self._lock:
+            if self._batch is not None:
+                await self._commit(self._batch)
+
+    async def _open(self):
+        """Start a batch and the timer that commits it, holding the lock."""
+
+        conn = await self.engine.connect()
+        try:
+            await conn.begin()
+            if conn.dialect.name == "sqlite":
+                await conn.exec_driver_sql("BEGIN")
+        except BaseException:
+            await conn.close()
+            raise
+
+        committed = asyncio.get_running_loop().create_future()
+        committed.add_done_callback(_retrieve)
+        batch = _Batch(conn, committed)
+        batch.timer = asyncio.ensure_future(self._commit_later(batch))
+        self._batch = batch
+        return batch
+
+    async def _commit_later(self, batch):
+        await asyncio.sleep(self.window)
+        async with self._lock:
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        """Commit a batch and report to its callers, holding the lock."""
+
+        if self._batch is not batch:
+            return
+        self._batch = None
+        if batch.timer is not asyncio.current_task():
+            batch.timer.cancel()
+
+        # Callers resume once told, so the connection goes back to the pool
+        # before they are
+
+        error = None
+        try:
+            await batch.conn.commit()
+        except Exception as e:
+            error = e
+        try:
+            await batch.conn.close()
+        finally:
+            if error is not None:
+                batch.committed.set_exception(error)
+            else:
+                batch.committed.set_result(None)
+                self.batches += 1
+                self.writes += batch.writes
+
+def _retrieve(future):
+    """Mark a commit failure as seen even if every caller had failed before."""
+
+    if not future.cancelled():
+        future.exception()
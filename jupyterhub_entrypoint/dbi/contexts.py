@@ -1,9 +1,11 @@
 
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import insert, select, delete
+from sqlalchemy.sql import select, delete
 
 from jupyterhub_entrypoint.dbi.model import contexts
+from jupyterhub_entrypoint.dbi.tracing import traced
+from jupyterhub_entrypoint.dbi.upsert import insert_or_ignore
 
+@traced
 async def create_context(conn, context_name):
     """Create a context for categorizing user entrypoints.
 
@@ -22,12 +24,25 @@ async def create_context(conn, context_name):
 
     """
 
-    try:
-        statement = insert(contexts).values(context_name=context_name)
-        await conn.execute(statement)
-    except IntegrityError:
-        pass
+    await insert_or_ignore(conn, contexts, [dict(context_name=context_name)])
+
+@traced
+async def create_contexts(conn, context_names):
+    """Create several contexts at once, skipping any that already exist.
+
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        context_names   (list of str): Meaningful contextual labels
+
+    """
 
+    await insert_or_ignore(
+        conn,
+        contexts,
+        [dict(context_name=context_name) for context_name in context_names]
+    )
+
+@traced
 async def retrieve_contexts(conn):
     """Retrieve all contexts sorted by name.
 
@@ -40,6 +55,28 @@ async def retrieve_contexts(conn):
     results = await conn.execute(statement)
     return sorted([r.context_name for r in results.fetchall()])
 
+@traced
+async def retrieve_context_ids(conn):
+    """Retrieve a mapping of context names to context ids.
+
+    Contexts are defined by configuration and only change when the service
+    reconciles them at startup, so the mapping can be loaded once and passed
+    back to other dbi functions as `context_ids` to avoid looking contexts up
+    on every call.
+
+    Args:
+        conn        (AsyncConnection): SQLAlchemy asyncio connection proxy
+
+    Returns:
+        dict: Context ids keyed by context name
+
+    """
+
+    statement = select(contexts.c.id, contexts.c.context_name)
+    results = await conn.execute(statement)
+    return dict((r.context_name, r.id) for r in results.fetchall())
+
+@traced
 async def delete_context(conn, context_name):
     """Delete context and all corresponding entrypoint+context tags.
 
@@ -63,3 +100,26 @@ async def delete_context(conn, context_name):
     results = await conn.execute(statement)
     if results.rowcount == 0:
         raise ValueError
+
+async def _context_ids(conn, context_names, context_ids=None):
+    """Utility function resolving context names to ids, in the same order.
+
+    Uses the `context_ids` mapping if one is given, otherwise the database.
+
+    Raises:
+        ValueError: If one or more named contexts do not exist.
+
+    """
+
+    if context_ids is None:
+        statement = (
+            select(contexts.c.id, contexts.c.context_name)
+            .where(contexts.c.context_name.in_(context_names))
+        )
+        results = await conn.execute(statement)
+        context_ids = dict((r.context_name, r.id) for r in results.fetchall())
+
+    try:
+        return [context_ids[context_name] for context_name in context_names]
+    except KeyError:
+        raise ValueError
@@ -3,20 +3,31 @@ import itertools
 from uuid import uuid4
 
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import insert, select, update, delete
-from sqlalchemy.sql.expression import label
+from sqlalchemy import Text
+from sqlalchemy.sql import (
+    cast, delete, func, insert, select, tuple_, update
+)
+from sqlalchemy.sql.expression import label, null, true
 
+from jupyterhub_entrypoint.dbi.contexts import _context_ids
 from jupyterhub_entrypoint.dbi.model import (
-    entrypoints, entrypoint_contexts, contexts
+    entrypoints, entrypoint_contexts, entrypoint_spawner_args, contexts
+)
+from jupyterhub_entrypoint.dbi.spawner_args import _with_spawner_args
+from jupyterhub_entrypoint.dbi.tracing import operation, traced
+from jupyterhub_entrypoint.dbi.upsert import (
+    insert_or_ignore, insert_select_or_ignore
 )
 
+@traced
 async def create_entrypoint(
     conn,
     user,
     entrypoint_name,
     entrypoint_type,
     entrypoint_data,
-    context_names=[]
+    context_names=[],
+    context_ids=None
 ):
     """Create user entrypoint with optional contexts.
 
@@ -27,6 +38,7 @@ async def create_entrypoint(
         entrypoint_type (str): Type of user entrypoint
         entrypoint_data (dict): Contains type-specific metadata
         context_names   (list of str, optional): Context names
+        context_ids     (dict, optional): Context ids keyed by context name
 
     Raises:
         ValueError: If insertion of the entrypoint record fails.
@@ -55,23 +67,15 @@ async def create_entrypoint(
     if not context_names:
         return
 
-    statement = (
-        select(contexts)
-        .where(contexts.c.context_name.in_(context_names))
-    )
-    results = await conn.execute(statement)
-    context_ids = [r.id for r in results.fetchall()]
-    if len(context_ids) != len(context_names):
-        raise ValueError
+    ids = await _context_ids(conn, context_names, context_ids)
 
     statement = (
         insert(entrypoint_contexts)
-        .values([
-            dict(entrypoint_id=entrypoint_id, context_id=t) for t in context_ids
-        ])
+        .values([dict(entrypoint_id=entrypoint_id, context_id=t) for t in ids])
     )
     await conn.execute(statement)
 
+@traced
 async def retrieve_one_entrypoint(conn, user, entrypoint_name=None, uuid=None):
     """Retrieve data & contexts for a user's entrypoint either by name or UUID.
 
@@ -145,11 +149,14 @@ async def retrieve_one_entrypoint(conn, user, entrypoint_name=None, uuid=None):
         context_names=context_names
     )
 
+@traced
 async def retrieve_many_entrypoints(
     conn,
     user,
     entrypoint_type=None,
-    context_name=None
+    context_name=None,
+    raw=False,
+    batchspawner=None
 ):
     """Retrieve data, selection status, and context for a user's entrypoints.
 
@@ -177,20 +184,220 @@ async def retrieve_many_entrypoints(
           }
         }
 
+    With `raw`, entrypoint data is the JSON text as stored, not decoded, and
+    each dictionary also has the "entrypoint_name" key. Callers that only
+    pass the data along can then skip decoding and encoding it again. With
+    `batchspawner` given, each dictionary also has the "spawner_args" key,
+    the materialized spawner arguments for that variant as JSON text, or
+    None if they have not been materialized.
+
     Args:
         conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
         user            (str): User name
         entrypoint_type (str, optional): Limit to a particular type
         context_name    (str, optional): Limit to a particular context
+        raw             (bool): Return entrypoint data as JSON text
+        batchspawner    (bool, optional): Also return materialized spawner
+                        arguments, for batchspawner or not
 
     Returns:
         dict: Actually dict of dict of list of dict
 
     """
 
+    statement = _many_entrypoints_statement(
+        user, entrypoint_type, context_name, raw=raw, batchspawner=batchspawner
+    )
+    results = await conn.execute(statement)
+    return _group_entrypoints(results.fetchall(), raw, batchspawner)
+
+@traced
+async def retrieve_entrypoint_page(
+    conn,
+    user,
+    entrypoint_type=None,
+    context_name=None,
+    limit=100,
+    after=None,
+    raw=False,
+    batchspawner=None
+):
+    """Retrieve a page of a user's entrypoints, keyset-paginated.
+
+    Like `retrieve_many_entrypoints` but returns at most `limit` entrypoint
+    and context pairs, in order of context name, entrypoint type, and
+    entrypoint name. Untagged entrypoints sort under an empty context name.
+    Pass the key returned with one page as `after` to get the next one.
+    Rows are found through the (user, entrypoint name) index and the sort key
+    is computed, so each page reads and sorts the user's entrypoints past the
+    key. That is bounded by the user's own entrypoints, not by page depth or
+    by other users' entrypoints.
+
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user            (str): User name
+        entrypoint_type (str, optional): Limit to a particular type
+        context_name    (str, optional): Limit to a particular context
+        limit           (int): Maximum number of entries in the page
+        after           (tuple, optional): Key returned with previous page
+        raw             (bool): Return entrypoint data as JSON text
+        batchspawner    (bool, optional): Also return materialized spawner
+                        arguments, for batchspawner or not
+
+    Returns:
+        tuple: Page like `retrieve_many_entrypoints` returns, and the key to
+            pass as `after` for the next page or None if this is the last
+
+    """
+
+    statement = _many_entrypoints_statement(
+        user, entrypoint_type, context_name, after, raw, batchspawner
+    )
+    results = await conn.execute(statement.limit(limit + 1))
+    rows = results.fetchall()
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        r = rows[-1]
+        next_after = (
+            r.context_name or "",
+            r.entrypoint_type,
+            r.entrypoint_name
+        )
+    return _group_entrypoints(rows, raw, batchspawner), next_after
+
+async def stream_many_entrypoints(
+    conn,
+    user,
+    entrypoint_type=None,
+    context_name=None
+):
+    """Stream a user's entrypoints grouped by context and entrypoint type.
+
+    Like `retrieve_many_entrypoints` but yields each group as soon as its
+    rows have been read, instead of reading every row up front. Use it inside
+    a transaction or connection that outlives the iteration.
+
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user            (str): User name
+        entrypoint_type (str, optional): Limit to a particular type
+        context_name    (str, optional): Limit to a particular context
+
+    Yields:
+        tuple: Context name, entrypoint type, and list of dicts with keys
+            "uuid," "entrypoint_data," and "selected"
+
+    """
+
+    statement = _many_entrypoints_statement(
+        user, entrypoint_type, context_name
+    )
+
+    # Rows are fetched as the caller iterates, but only the statement itself
+    # is traced, so the operation need only be set while it executes
+
+    token = None
+    if operation.get() is None:
+        token = operation.set("stream_many_entrypoints")
+    try:
+        results = await conn.stream(statement)
+    finally:
+        if token is not None:
+            operation.reset(token)
+
+    group = None
+    entries = list()
+    async for r in results:
+        if (r.context_name, r.entrypoint_type) != group:
+            if entries:
+                yield group + (entries,)
+            group = (r.context_name, r.entrypoint_type)
+            entries = list()
+        entries.append(_entry(r))
+    if entries:
+        yield group + (entries,)
+
+async def stream_tagged_entrypoints(conn, user=None):
+    """Stream tagged entrypoints with their stored spawner arguments.
+
+    Yields one row per entrypoint and context it is tagged with, for every
+    user or only one, ordered by user, context name, entrypoint type, and
+    entrypoint name. This is what the hub needs to know about an entrypoint,
+    for loading it into memory.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user    (str, optional): Limit to a particular user
+
+    Yields:
+        Row: With attributes "user," "context_name," "entrypoint_name,"
+            "entrypoint_type," "selected," "entrypoint_data" as JSON text,
+            and "spawner_args" and "batchspawner_args," None if not stored
+
+    """
+
+    statement = (
+        select(
+            entrypoints.c.user,
+            contexts.c.context_name,
+            entrypoints.c.entrypoint_name,
+            entrypoints.c.entrypoint_type,
+            (entrypoint_contexts.c.user == entrypoints.c.user).label(
+                "selected"
+            ),
+            _entrypoint_data(raw=True),
+            entrypoint_spawner_args.c.spawner_args,
+            entrypoint_spawner_args.c.batchspawner_args
+        )
+        .select_from(entrypoints)
+        .join(entrypoint_contexts)
+        .join(contexts)
+        .join(
+            entrypoint_spawner_args,
+            entrypoint_spawner_args.c.entrypoint_id == entrypoints.c.id,
+            isouter=True
+        )
+        .order_by(
+            entrypoints.c.user,
+            contexts.c.context_name,
+            entrypoints.c.entrypoint_type,
+            entrypoints.c.entrypoint_name
+        )
+    )
+
+    if user is not None:
+        statement = statement.where(entrypoints.c.user == user)
+
+    token = None
+    if operation.get() is None:
+        token = operation.set("stream_tagged_entrypoints")
+    try:
+        results = await conn.stream(statement)
+    finally:
+        if token is not None:
+            operation.reset(token)
+
+    async for r in results:
+        yield r
+
+def _many_entrypoints_statement(
+    user,
+    entrypoint_type=None,
+    context_name=None,
+    after=None,
+    raw=False,
+    batchspawner=None
+):
+    """Select a user's entrypoints with their contexts, in key order."""
+
+    sort_context_name = func.coalesce(contexts.c.context_name, "")
+
     statement = (
         select(
-            entrypoints,
+            *[c for c in entrypoints.c if c.name != "entrypoint_data"],
+            _entrypoint_data(raw),
             (entrypoint_contexts.c.user == user).label("selected"),
             contexts.c.context_name
         )
@@ -199,7 +406,7 @@ async def retrieve_many_entrypoints(
         .join(contexts, isouter=True)
         .where(entrypoints.c.user == user)
         .order_by(
-            contexts.c.context_name,
+            sort_context_name,
             entrypoints.c.entrypoint_type,
             entrypoints.c.entrypoint_name
         )
@@ -215,23 +422,56 @@ async def retrieve_many_entrypoints(
             contexts.c.context_name == context_name
         )
 
-    results = await conn.execute(statement)
+    if after:
+        statement = statement.where(
+            tuple_(
+                sort_context_name,
+                entrypoints.c.entrypoint_type,
+                entrypoints.c.entrypoint_name
+            ) > tuple_(*after)
+        )
+
+    if batchspawner is not None:
+        statement = _with_spawner_args(statement, batchspawner)
+
+    return statement
 
-    grouper = itertools.groupby(results.fetchall(), lambda r: r.context_name)
+def _entrypoint_data(raw=False):
+    """Select entrypoint data, or with `raw` the JSON text as stored."""
+
+    if raw:
+        return cast(entrypoints.c.entrypoint_data, Text).label(
+            "entrypoint_data"
+        )
+    return entrypoints.c.entrypoint_data
+
+def _entry(r, raw=False, batchspawner=None):
+    entry = {
+        "uuid": r.uuid,
+        "entrypoint_data": r.entrypoint_data,
+        "selected": r.selected
+    }
+    if raw:
+        entry["entrypoint_name"] = r.entrypoint_name
+    if batchspawner is not None:
+        entry["spawner_args"] = r.spawner_args
+    return entry
+
+def _group_entrypoints(rows, raw=False, batchspawner=None):
+    """Nest rows in key order by context name and then entrypoint type."""
+
+    grouper = itertools.groupby(rows, lambda r: r.context_name)
     data = dict((context_name, list(rows)) for (context_name, rows) in grouper)
 
     for context_name, rows in data.items():
         grouper = itertools.groupby(rows, lambda r: r.entrypoint_type)
         data[context_name] = dict((
-            entrypoint_type, [{
-                "uuid": r.uuid,
-                "entrypoint_data": r.entrypoint_data,
-                "selected": r.selected
-            } for r in rows]
+            entrypoint_type, [_entry(r, raw, batchspawner) for r in rows]
         ) for (entrypoint_type, rows) in grouper)
 
     return data
 
+@traced
 async def update_entrypoint(
     conn,
     user,
@@ -276,6 +516,7 @@ async def update_entrypoint(
     if results.rowcount == 0:
         raise ValueError
 
+@traced
 async def update_entrypoint_uuid(
     conn,
     user,
@@ -315,7 +556,13 @@ async def update_entrypoint_uuid(
     if results.rowcount == 0:
         raise ValueError
 
-async def _entrypoint_context_ids(conn, user, entrypoint_name, context_name):
+async def _entrypoint_context_ids(
+    conn,
+    user,
+    entrypoint_name,
+    context_name,
+    context_ids=None
+):
     """Utility function for tag/untag entrypoint operations"""
 
     statement = (
@@ -330,15 +577,18 @@ async def _entrypoint_context_ids(conn, user, entrypoint_name, context_name):
     if not entrypoint:
         raise ValueError
 
-    statement = select(contexts).where(contexts.c.context_name == context_name)
-    results = await conn.execute(statement)
-    context = results.fetchone()
-    if not context:
-        raise ValueError
+    context_id, = await _context_ids(conn, [context_name], context_ids)
 
-    return entrypoint.id, context.id
+    return entrypoint.id, context_id
 
-async def tag_entrypoint(conn, user, entrypoint_name, context_name):
+@traced
+async def tag_entrypoint(
+    conn,
+    user,
+    entrypoint_name,
+    context_name,
+    context_ids=None
+):
     """Tag user entrypoint.
 
     Creates an entry in the entrypoint+context association table. This
@@ -354,6 +604,7 @@ async def tag_entrypoint(conn, user, entrypoint_name, context_name):
         user            (str): User name
         entrypoint_name (str): User-assigned entrypoint name
         context_name    (str): Context name to associate with entrypoint
+        context_ids     (dict, optional): Context ids keyed by context name
 
     Raises:
         ValueError: If no entrypoint named `entrypoint_name` exists.
@@ -362,23 +613,23 @@ async def tag_entrypoint(conn, user, entrypoint_name, context_name):
     """
 
     entrypoint_id, context_id = await (
-        _entrypoint_context_ids(conn, user, entrypoint_name, context_name)
-    )
-
-    statement = (
-        insert(entrypoint_contexts)
-        .values(
-            entrypoint_id=entrypoint_id,
-            context_id=context_id,
-            user=None
+        _entrypoint_context_ids(
+            conn, user, entrypoint_name, context_name, context_ids
         )
     )
-    try:
-        results = await conn.execute(statement)
-    except IntegrityError:
-        pass
 
-async def untag_entrypoint(conn, user, entrypoint_name, context_name):
+    await insert_or_ignore(conn, entrypoint_contexts, [
+        dict(entrypoint_id=entrypoint_id, context_id=context_id, user=None)
+    ])
+
+@traced
+async def untag_entrypoint(
+    conn,
+    user,
+    entrypoint_name,
+    context_name,
+    context_ids=None
+):
     """Remove a tag from a user entrypoint.
 
     Deletes the corresponding entry from the entrypoint+context association
@@ -390,6 +641,7 @@ async def untag_entrypoint(conn, user, entrypoint_name, context_name):
         user            (str): User name
         entrypoint_name (str): User-assigned entrypoint name
         context_name    (str): Context name to associate with entrypoint
+        context_ids     (dict, optional): Context ids keyed by context name
 
     Raises:
         ValueError: If the entrypoint isn't actually tagged
@@ -399,7 +651,9 @@ async def untag_entrypoint(conn, user, entrypoint_name, context_name):
     # FIXME verify that untagging a selected entrypoint removes selection
 
     entrypoint_id, context_id = await (
-        _entrypoint_context_ids(conn, user, entrypoint_name, context_name)
+        _entrypoint_context_ids(
+            conn, user, entrypoint_name, context_name, context_ids
+        )
     )
 
     statement = (
@@ -413,6 +667,84 @@ async def untag_entrypoint(conn, user, entrypoint_name, context_name):
     if results.rowcount == 0:
         raise ValueError
 
+@traced
+async def set_entrypoint_contexts(
+    conn,
+    user,
+    uuid,
+    context_names,
+    context_ids=None
+):
+    """Tag user entrypoint with exactly the given contexts.
+
+    Tags the entrypoint with contexts it doesn't have yet and removes tags for
+    contexts not given, in one DELETE and one INSERT however many contexts
+    change. Removing a tag removes any selection made with it. Keyed on uuid
+    so it can follow a rename in the same transaction.
+
+    If no entrypoint has the uuid, nothing changes.
+
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user            (str): User name
+        uuid            (str): Entrypoint UUID
+        context_names   (list of str): Context names the entrypoint should have
+        context_ids     (dict, optional): Context ids keyed by context name
+
+    Raises:
+        ValueError: If one or more named contexts do not exist.
+
+    """
+
+    ids = await _context_ids(conn, context_names, context_ids)
+
+    entrypoint_id = (
+        select(entrypoints.c.id)
+        .where(
+            entrypoints.c.user == user,
+            entrypoints.c.uuid == uuid
+        )
+        .scalar_subquery()
+    )
+
+    statement = (
+        delete(entrypoint_contexts)
+        .where(
+            entrypoint_contexts.c.entrypoint_id == entrypoint_id,
+            entrypoint_contexts.c.context_id.not_in(ids)
+        )
+    )
+    await conn.execute(statement)
+
+    if not ids:
+        return
+
+    tagged = (
+        select(entrypoint_contexts.c.context_id)
+        .where(
+            entrypoint_contexts.c.entrypoint_id == entrypoints.c.id,
+            entrypoint_contexts.c.context_id == contexts.c.id
+        )
+        .exists()
+    )
+    statement = (
+        select(entrypoints.c.id, contexts.c.id, null())
+        .select_from(entrypoints.join(contexts, true()))
+        .where(
+            entrypoints.c.user == user,
+            entrypoints.c.uuid == uuid,
+            contexts.c.id.in_(ids),
+            ~tagged
+        )
+    )
+    await insert_select_or_ignore(
+        conn,
+        entrypoint_contexts,
+        ["entrypoint_id", "context_id", "user"],
+        statement
+    )
+
+@traced
 async def delete_entrypoint(conn, user, entrypoint_name):
     """Delete user entrypoint and any associated entrypoint+context entries.
 
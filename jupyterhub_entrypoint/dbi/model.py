@@ -43,3 +43,23 @@ entrypoint_contexts = Table(
     Column("user", Text, nullable=True),
     UniqueConstraint("context_id", "user")
 )
+
+entrypoint_spawner_args = Table(
+    "entrypoint_spawner_args",
+    metadata,
+    Column(
+        "entrypoint_id",
+        None,
+        ForeignKey("entrypoints.id", ondelete="CASCADE"),
+        primary_key=True
+    ),
+    Column("spawner_args", Text, nullable=False),
+    Column("batchspawner_args", Text, nullable=False)
+)
+
+service_state = Table(
+    "service_state",
+    metadata,
+    Column("key", Text, primary_key=True),
+    Column("value", Text, nullable=False)
+)
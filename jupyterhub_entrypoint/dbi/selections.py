@@ -1,9 +1,12 @@
 
 from sqlalchemy.sql import select, update
 
+from jupyterhub_entrypoint.dbi.entrypoints import _entrypoint_data
 from jupyterhub_entrypoint.dbi.model import (
     entrypoints, entrypoint_contexts, contexts
 )
+from jupyterhub_entrypoint.dbi.spawner_args import _with_spawner_args
+from jupyterhub_entrypoint.dbi.tracing import traced
 
 # To the developer/curious:
 #
@@ -20,7 +23,14 @@ from jupyterhub_entrypoint.dbi.model import (
 # even if it is empty, which is why there is no create operation and the delete
 # function really just does an update.
 
-async def update_selection(conn, user, entrypoint_name, context_name):
+@traced
+async def update_selection(
+    conn,
+    user,
+    entrypoint_name,
+    context_name,
+    context_ids=None
+):
     """Update user selection for the given context name.
 
     Among all user entrypoints with a given context, one may be "selected" to be
@@ -35,60 +45,84 @@ async def update_selection(conn, user, entrypoint_name, context_name):
         user            (str): User name
         entrypoint_name (str): Name of user entrypoint to select
         context_name    (str): Context where a selection is being made
+        context_ids     (dict, optional): Context ids keyed by context name
+
+    Returns:
+        bool: True if a previous selection for the context was replaced
 
     Raises:
         ValueError: If no entrypoint named `entrypoint_name` is found.
         ValueError: If no context named `context_name` is found.
+        ValueError: If the entrypoint is not tagged with the context.
 
     """
 
-    # SQLite doesn't support multi-table update, so we take the long way.
-
-    await delete_selection(conn, user, context_name)
-
-    statement = select(contexts).where(contexts.c.context_name == context_name)
-    results = await conn.execute(statement)
-    context = results.fetchone()
-
-    # If context doesn't exist, delete will have failed => don't need to verify
+    # SQLite doesn't support multi-table update, so both statements resolve ids
+    # with scalar subqueries instead (or context ids, if known). Two statements
+    # are needed because the (context_id, user) constraint is checked row by
+    # row, so the old selection has to be cleared before the new one can be
+    # set.
 
-    statement = (
-        select(entrypoints)
+    context_id = _context_id(context_name, context_ids)
+    entrypoint_id = (
+        select(entrypoints.c.id)
         .where(
             entrypoints.c.user == user,
             entrypoints.c.entrypoint_name == entrypoint_name
         )
+        .scalar_subquery()
+    )
+
+    statement = (
+        update(entrypoint_contexts)
+        .values(user=None)
+        .where(
+            entrypoint_contexts.c.user == user,
+            entrypoint_contexts.c.context_id == context_id
+        )
     )
     results = await conn.execute(statement)
-    entrypoint = results.fetchone()
-    if not entrypoint:
-        raise ValueError
+    replaced = results.rowcount > 0
 
     statement = (
         update(entrypoint_contexts)
         .values(user=user)
         .where(
-            entrypoint_contexts.c.context_id == context.id,
-            entrypoint_contexts.c.entrypoint_id == entrypoint.id
+            entrypoint_contexts.c.context_id == context_id,
+            entrypoint_contexts.c.entrypoint_id == entrypoint_id
         )
     )
     results = await conn.execute(statement)
+    if results.rowcount == 0:
+        raise ValueError
 
-    # FIXME This should probably return something
+    return replaced
 
-async def retrieve_selection(conn, user, context_name):
+@traced
+async def retrieve_selection(
+    conn,
+    user,
+    context_name,
+    raw=False,
+    batchspawner=None
+):
     """Retrieve the selected user entrypoint's data for the given context name.
 
     Args:
         conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
         user            (str): User name
         context_name    (str): Context used to find selection
+        raw             (bool): Return entrypoint data as JSON text
+        batchspawner    (bool, optional): Also return materialized spawner
+                        arguments, for batchspawner or not
 
     Returns:
         (tuple): tuple containing:
 
             str: Entrypoint type
-            dict: User entrypoint data
+            dict: User entrypoint data, or str JSON text if `raw`
+            str: Only if `batchspawner` is given, spawner arguments as JSON
+                text, or None if they have not been materialized
 
     Raises:
         ValueError: If no selection is found.
@@ -98,7 +132,7 @@ async def retrieve_selection(conn, user, context_name):
     statement = (
         select(
             entrypoints.c.entrypoint_type,
-            entrypoints.c.entrypoint_data,
+            _entrypoint_data(raw),
         )
         .select_from(entrypoints)
         .join(entrypoint_contexts, isouter=True)
@@ -108,25 +142,40 @@ async def retrieve_selection(conn, user, context_name):
             contexts.c.context_name == context_name
         )
     )
+    if batchspawner is not None:
+        statement = _with_spawner_args(statement, batchspawner)
     results = await conn.execute(statement)
     result = results.fetchone()
     if not result:
         raise ValueError
 
+    if batchspawner is not None:
+        return (
+            result.entrypoint_type,
+            result.entrypoint_data,
+            result.spawner_args
+        )
     return (result.entrypoint_type, result.entrypoint_data)
 
-async def delete_selection(conn, user, context_name):
+@traced
+async def delete_selection(conn, user, context_name, context_ids=None):
     """Delete user entrypoint selection for the given context name.
 
-    TBD
+    Deleting a selection when there is none for the context has no effect.
 
-    """
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user            (str): User name
+        context_name    (str): Context where the selection is being deleted
+        context_ids     (dict, optional): Context ids keyed by context name
 
-    statement = select(contexts).where(contexts.c.context_name == context_name)
-    results = await conn.execute(statement)
-    context = results.fetchone()
-    if not context:
-        raise ValueError
+    Returns:
+        bool: True if a selection was deleted
+
+    Raises:
+        ValueError: If no context named `context_name` is found.
+
+    """
 
     # Actually an update, not a delete.
 
@@ -135,9 +184,45 @@ async def delete_selection(conn, user, context_name):
         .values(user=None)
         .where(
             entrypoint_contexts.c.user == user,
-            entrypoint_contexts.c.context_id == context.id
+            entrypoint_contexts.c.context_id == (
+                _context_id(context_name, context_ids)
+            )
         )
     )
     results = await conn.execute(statement)
+    if results.rowcount > 0:
+        return True
+    if context_ids is not None:
+        return False
+
+    # Nothing was cleared, only now is it worth checking the context exists.
 
-    # FIXME This should probably return something
+    statement = select(contexts.c.id).where(
+        contexts.c.context_name == context_name
+    )
+    results = await conn.execute(statement)
+    if not results.fetchone():
+        raise ValueError
+    return False
+
+def _context_id(context_name, context_ids=None):
+    """Utility function resolving a context name to its id for a statement.
+
+    Uses the `context_ids` mapping if one is given, otherwise a subquery.
+
+    Raises:
+        ValueError: If `context_ids` is given and has no `context_name`.
+
+    """
+
+    if context_ids is not None:
+        try:
+            return context_ids[context_name]
+        except KeyError:
+            raise ValueError
+
+    return (
+        select(contexts.c.id)
+        .where(contexts.c.context_name == context_name)
+        .scalar_subquery()
+    )
@@ -0,0 +1,97 @@
+
+import os
+import sqlite3
+import weakref
+
+import aiosqlite
+from sqlalchemy import event
+
+# To the developer/curious:
+#
+# An in-memory SQLite database is fast but gone on restart. These copy it to
+# and from a file with SQLite's online backup API, which copies pages rather
+# than statements and so takes about as long as reading the file. In-memory
+# databases are served from a single shared connection, and a backup taken
+# while a transaction is open on it would include changes not yet committed.
+# Statements of a transaction may still be queued for that connection when
+# it looks idle, so callers must keep writes out while a snapshot is taken,
+# the service does with a lock. A transaction that is open anyway makes the
+# snapshot skip, and the caller tries again later. Checking
+# that connection out of the pool to back it up isn't an option either, the
+# pool rolls back whatever is open on it when it is returned.
+
+_connections = weakref.WeakKeyDictionary()
+
+def is_memory_database(engine):
+    """Whether an engine's database is in-memory SQLite."""
+
+    url = engine.url
+    return (
+        url.get_backend_name() == "sqlite"
+        and url.database in (None, "", ":memory:")
+    )
+
+def track_memory_connection(engine):
+    """Keep the driver connection of an in-memory database for snapshots."""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        _connections[engine.sync_engine] = connection_record.driver_connection
+
+async def write_snapshot(engine, path):
+    """Copy an in-memory SQLite database to a file.
+
+    The copy is written next to `path` and renamed over it, so a crash never
+    leaves a partial snapshot in place.
+
+    Args:
+        engine  (AsyncEngine): SQLAlchemy asyncio engine, in-memory SQLite
+        path    (str): Snapshot file
+
+    Returns:
+        bool: True if written, False if skipped for a transaction in progress
+
+    """
+
+    # Nothing can be open on the connection before it is first made
+
+    source = _connections.get(engine.sync_engine)
+    if source is None:
+        async with engine.connect():
+            pass
+        source = _connections[engine.sync_engine]
+    if source.in_transaction:
+        return False
+
+    partial = f"{path}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    target = sqlite3.connect(partial, check_same_thread=False)
+    try:
+        await source.backup(target)
+    finally:
+        target.close()
+
+    os.replace(partial, path)
+    return True
+
+async def restore_snapshot(engine, path):
+    """Replace an in-memory SQLite database with a snapshot, if there is one.
+
+    Args:
+        engine  (AsyncEngine): SQLAlchemy asyncio engine, in-memory SQLite
+        path    (str): Snapshot file
+
+    Returns:
+        bool: True if restored, False if there was no snapshot
+
+    """
+
+    if not os.path.exists(path):
+        return False
+
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        async with aiosqlite.connect(path) as source:
+            await source.backup(raw.driver_connection)
+    return True
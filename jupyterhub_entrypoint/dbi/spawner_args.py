@@ -0,0 +1,179 @@
+
+from sqlalchemy.sql import bindparam, delete, insert, literal, select
+
+from jupyterhub_entrypoint.dbi.model import (
+    entrypoints, entrypoint_spawner_args, service_state
+)
+from jupyterhub_entrypoint.dbi.tracing import traced
+
+# To the developer/curious:
+#
+# Spawner arguments only depend on entrypoint data and the entrypoint type's
+# configuration, so they are rendered when an entrypoint is written rather
+# than when the hub asks for them. Each entrypoint has one row here holding
+# both variants the hub asks for, with and without batchspawner, as JSON text
+# ready to be written into a response. The rows are rebuilt in bulk when the
+# service starts with a different type configuration, which it can tell from
+# a fingerprint of the configuration kept in the service state table.
+
+def _with_spawner_args(statement, batchspawner):
+    """Add one variant of materialized spawner args to an entrypoint query."""
+
+    if batchspawner:
+        column = entrypoint_spawner_args.c.batchspawner_args
+    else:
+        column = entrypoint_spawner_args.c.spawner_args
+    return (
+        statement
+        .add_columns(column.label("spawner_args"))
+        .join(
+            entrypoint_spawner_args,
+            entrypoint_spawner_args.c.entrypoint_id == entrypoints.c.id,
+            isouter=True
+        )
+    )
+
+@traced
+async def set_spawner_args(
+    conn,
+    user,
+    entrypoint_name,
+    spawner_args,
+    replace=True
+):
+    """Store materialized spawner arguments for a user entrypoint.
+
+    Args:
+        conn            (AsyncConnection): SQLAlchemy asyncio connection proxy
+        user            (str): User name
+        entrypoint_name (str): User-assigned entrypoint name
+        spawner_args    (dict): JSON text for keys "spawner_args" and
+                        "batchspawner_args"
+        replace         (bool): Replace stored arguments, False skips that
+                        for an entrypoint just created, which has none
+
+    Raises:
+        ValueError: If the entrypoint cannot be found.
+
+    """
+
+    entrypoint_id = (
+        select(entrypoints.c.id)
+        .where(
+            entrypoints.c.user == user,
+            entrypoints.c.entrypoint_name == entrypoint_name
+        )
+    )
+
+    if replace:
+        statement = (
+            delete(entrypoint_spawner_args)
+            .where(
+                entrypoint_spawner_args.c.entrypoint_id
+                == entrypoint_id.scalar_subquery()
+            )
+        )
+        await conn.execute(statement)
+
+    statement = (
+        insert(entrypoint_spawner_args)
+        .from_select(
+            ["entrypoint_id", "spawner_args", "batchspawner_args"],
+            entrypoint_id.add_columns(
+                literal(spawner_args["spawner_args"]),
+                literal(spawner_args["batchspawner_args"])
+            )
+        )
+    )
+    results = await conn.execute(statement)
+    if results.rowcount == 0:
+        raise ValueError
+
+@traced
+async def retrieve_all_entrypoint_data(conn):
+    """Retrieve every entrypoint's type and data, for all users.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+
+    Returns:
+        list: Dicts with keys "uuid," "entrypoint_type," and
+            "entrypoint_data"
+
+    """
+
+    statement = select(
+        entrypoints.c.uuid,
+        entrypoints.c.entrypoint_type,
+        entrypoints.c.entrypoint_data
+    )
+    results = await conn.execute(statement)
+    return [dict(r._mapping) for r in results.fetchall()]
+
+@traced
+async def replace_all_spawner_args(conn, rows):
+    """Replace all materialized spawner arguments.
+
+    Entrypoints left out of `rows`, for instance because their type is no
+    longer configured, have no spawner arguments afterwards.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        rows    (list): Dicts with keys "uuid," "spawner_args," and
+                "batchspawner_args"
+
+    """
+
+    await conn.execute(delete(entrypoint_spawner_args))
+    if not rows:
+        return
+
+    entrypoint_id = (
+        select(entrypoints.c.id)
+        .where(entrypoints.c.uuid == bindparam("entrypoint_uuid"))
+        .scalar_subquery()
+    )
+    statement = insert(entrypoint_spawner_args).values(
+        entrypoint_id=entrypoint_id,
+        spawner_args=bindparam("spawner_args"),
+        batchspawner_args=bindparam("batchspawner_args")
+    )
+    await conn.execute(statement, [
+        dict(
+            entrypoint_uuid=row["uuid"],
+            spawner_args=row["spawner_args"],
+            batchspawner_args=row["batchspawner_args"]
+        )
+        for row in rows
+    ])
+
+@traced
+async def retrieve_state(conn, key):
+    """Retrieve a service state value.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        key     (str): State key
+
+    Returns:
+        str: Value, or None if it has never been set
+
+    """
+
+    statement = select(service_state.c.value).where(service_state.c.key == key)
+    return await conn.scalar(statement)
+
+@traced
+async def update_state(conn, key, value):
+    """Set a service state value.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        key     (str): State key
+        value   (str): New value
+
+    """
+
+    statement = delete(service_state).where(service_state.c.key == key)
+    await conn.execute(statement)
+    await conn.execute(insert(service_state).values(key=key, value=value))
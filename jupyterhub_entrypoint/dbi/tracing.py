@@ -0,0 +1,143 @@
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import logging
+import time
+
+from sqlalchemy import event
+
+# Name of the dbi function whose statements are being executed. Statements
+# run outside of any dbi function (e.g. schema creation) are left untagged.
+
+operation = ContextVar("dbi_operation", default=None)
+
+# Counts statements executed on behalf of e.g. a request, when one is set.
+
+statements = ContextVar("dbi_statements", default=None)
+
+class StatementCounter:
+    """Number of statements executed while counting."""
+
+    def __init__(self):
+        self.count = 0
+
+@contextmanager
+def count_statements():
+    """Count statements executed by traced engines within the block.
+
+    Yields:
+        StatementCounter: Counter updated as statements execute
+
+    """
+
+    counter = StatementCounter()
+    token = statements.set(counter)
+    try:
+        yield counter
+    finally:
+        statements.reset(token)
+
+@contextmanager
+def statement_budget(budget):
+    """Fail if traced engines execute more than `budget` statements.
+
+    Meant for tests, to catch query count regressions.
+
+    Args:
+        budget  (int): Maximum number of statements allowed in the block
+
+    Raises:
+        AssertionError: If the budget is exceeded
+
+    """
+
+    with count_statements() as counter:
+        yield counter
+    if counter.count > budget:
+        raise AssertionError(
+            f"{counter.count} statements executed, budget is {budget}"
+        )
+
+def traced(function):
+    """Tag statements executed by a dbi function with the function's name.
+
+    If dbi functions are nested, statements are attributed to the outermost.
+
+    """
+
+    name = function.__name__
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        if operation.get() is not None:
+            return await function(*args, **kwargs)
+        token = operation.set(name)
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            operation.reset(token)
+
+    return wrapper
+
+def trace_statements(engine, observe=None, slow_query_threshold=0, log=None):
+    """Time and count every statement an engine executes.
+
+    Args:
+        engine                  (AsyncEngine): Engine to instrument
+        observe                 (callable, optional): Called with the dbi
+                                function name (or "other") and the elapsed
+                                seconds for every statement
+        slow_query_threshold    (float): Statements taking at least this many
+                                seconds are logged with redacted parameters,
+                                0 disables the slow query log
+        log                     (Logger, optional): Logger for slow queries
+
+    """
+
+    log = log or logging.getLogger(__name__)
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_start"] = time.perf_counter()
+        counter = statements.get()
+        if counter is not None:
+            counter.count += 1
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("statement_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        name = operation.get() or "other"
+        if observe is not None:
+            observe(name, elapsed)
+        if slow_query_threshold > 0 and elapsed >= slow_query_threshold:
+            log.warning(
+                "Slow query in %s (%.3f s): %s %s",
+                name,
+                elapsed,
+                " ".join(statement.split()),
+                redact(parameters)
+            )
+
+def redact(parameters):
+    """Replace bound parameter values with their types for logging.
+
+    Integers and None are kept, they are only ever row ids or flags here.
+    Everything else (user names, entrypoint data) is reduced to its type and
+    length so that logs don't leak user data.
+
+    """
+
+    if isinstance(parameters, dict):
+        return {k: redact(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(redact(v) for v in parameters)
+    if parameters is None or isinstance(parameters, (bool, int, float)):
+        return parameters
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__}:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
@@ -0,0 +1,72 @@
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import insert
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+
+_inserts = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+async def insert_or_ignore(conn, table, rows):
+    """Insert rows, skipping any that conflict with rows already there.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING where the dialect has it. Unlike
+    catching IntegrityError, this doesn't abort the enclosing transaction on
+    PostgreSQL, and it costs no failed statement. Other dialects insert each
+    row in a savepoint, so a conflict rolls back only that row.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        table   (Table): Table to insert into
+        rows    (list): Column values for each row
+
+    """
+
+    if not rows:
+        return
+
+    dialect_insert = _inserts.get(conn.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(table).on_conflict_do_nothing()
+        await conn.execute(statement, rows)
+        return
+
+    for row in rows:
+        try:
+            async with conn.begin_nested():
+                await conn.execute(insert(table), row)
+        except IntegrityError:
+            pass
+
+async def insert_select_or_ignore(conn, table, names, select):
+    """Insert rows from a SELECT, skipping any that conflict.
+
+    Like `insert_or_ignore`. Other dialects run the whole insert in one
+    savepoint, so `select` should already leave out rows known to exist.
+
+    Args:
+        conn    (AsyncConnection): SQLAlchemy asyncio connection proxy
+        table   (Table): Table to insert into
+        names   (list of str): Columns the SELECT provides, in order
+        select  (Select): Rows to insert
+
+    """
+
+    dialect_insert = _inserts.get(conn.dialect.name)
+    if dialect_insert is not None:
+        statement = (
+            dialect_insert(table)
+            .from_select(names, select)
+            .on_conflict_do_nothing()
+        )
+        await conn.execute(statement)
+        return
+
+    try:
+        async with conn.begin_nested():
+            await conn.execute(insert(table).from_select(names, select))
+    except IntegrityError:
+        pass
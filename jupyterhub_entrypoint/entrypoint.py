@@ -2,31 +2,41 @@
 import asyncio
 import binascii
 from collections import OrderedDict
+import hashlib
 import logging
 import os
+import signal
 import sys
 from textwrap import dedent
+import time
 
 from jupyterhub.log import CoroutineLogFormatter
 from jupyterhub._data import DATA_FILES_PATH
 from jupyterhub.services.auth import HubOAuthCallbackHandler
 from jupyterhub.utils import url_path_join
 from jupyterhub.handlers.static import LogoHandler
-from tornado.ioloop import IOLoop
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.web import Application, RedirectHandler, StaticFileHandler
 from traitlets import (
     config, default, observe,
-    Bool, Dict, Instance, Integer, List, Tuple, Type, Unicode
+    Bool, Dict, Float, Instance, Integer, List, Tuple, Type, Unicode
 )
 
+from jupyterhub_entrypoint.cache import ResponseCache, SingleFlight
+from jupyterhub_entrypoint.read_model import ReadModel
 from jupyterhub_entrypoint.ssl_context import SSLContext
 from jupyterhub_entrypoint.handlers import (
     AboutHandler, NewHandler, ViewHandler, UpdateHandler,
     EntrypointAPIHandler, SelectionAPIHandler, HubSelectionAPIHandler,
-    HubEntrypointAPIHandler
+    HubEntrypointAPIHandler, MetricsHandler
 )
 from jupyterhub_entrypoint.types import EntrypointType
-from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint import dbi, jsonutil, metrics
+from jupyterhub_entrypoint.metrics import (
+    DB_SNAPSHOT_DURATION_SECONDS, DB_SNAPSHOT_LAST_SUCCESS_SECONDS
+)
 
 
 class EntrypointService(config.Application):
@@ -61,6 +71,11 @@ class EntrypointService(config.Application):
         help="SQLAlchemy engine database URL"
     ).tag(config=True)
 
+    connect_args = Dict(
+        {},
+        help="Extra arguments passed to the database driver's connect()"
+    ).tag(config=True)
+
     data_files_path = Unicode(
         DATA_FILES_PATH,
         help="Location of JupyterHub data files"
@@ -82,7 +97,7 @@ class EntrypointService(config.Application):
     entrypoint_types = Dict(
         Instance(EntrypointType),
         key_trait=Unicode,
-        help="TBD"
+        help="Registry of entrypoint types built from types, by type name"
     )
 
     _log_formatter_cls = CoroutineLogFormatter
@@ -106,17 +121,104 @@ class EntrypointService(config.Application):
             self.data_files_path, "static", "images", "jupyterhub-80.png"
         )
 
+    max_overflow = Integer(
+        None,
+        allow_none=True,
+        help="Connections allowed beyond pool_size, unset uses the default"
+    ).tag(config=True)
+
+    pool_pre_ping = Bool(
+        False,
+        help="Test pooled connections for liveness before using them"
+    ).tag(config=True)
+
+    pool_recycle = Integer(
+        None,
+        allow_none=True,
+        help="Replace pooled connections older than this many seconds"
+    ).tag(config=True)
+
+    pool_size = Integer(
+        None,
+        allow_none=True,
+        help="Database connections kept in the pool, unset uses the default"
+    ).tag(config=True)
+
+    pool_timeout = Float(
+        None,
+        allow_none=True,
+        help="Seconds to wait for a pooled connection before giving up"
+    ).tag(config=True)
+
     port = Integer(
         8889,
         help="Port this service will listen on"
     ).tag(config=True)
 
+    query_count_header = Bool(
+        help="Report SQL statements per request in X-Entrypoint-Query-Count"
+    ).tag(config=True)
+
+    @default("query_count_header")
+    def _query_count_header(self):
+        return self.log_level <= logging.DEBUG
+
+    read_database_url = Unicode(
+        "",
+        help="Database URL for reads (e.g. a replica), unset reads the primary"
+    ).tag(config=True)
+
+    read_model = Bool(
+        False,
+        help="Serve hub lookups from memory, for a single service process only"
+    ).tag(config=True)
+
+    selection_cache_size = Integer(
+        1024,
+        help="Maximum number of cached hub selection responses, 0 disables"
+    ).tag(config=True)
+
+    selection_cache_ttl = Float(
+        30.0,
+        help="Seconds a cached hub selection response remains valid"
+    ).tag(config=True)
+
     service_prefix = Unicode(
         os.environ.get("JUPYTERHUB_SERVICE_PREFIX",
                        "/services/entrypoint/"),
         help="Entrypoint service prefix"
     ).tag(config=True)
 
+    slow_query_threshold = Float(
+        0.5,
+        help="Log SQL statements slower than this many seconds, 0 disables"
+    ).tag(config=True)
+
+    snapshot_interval = Float(
+        300.0,
+        help="Seconds between database snapshots, 0 snapshots on shutdown only"
+    ).tag(config=True)
+
+    snapshot_path = Unicode(
+        "",
+        help="In-memory SQLite database snapshot file, restored at startup"
+    ).tag(config=True)
+
+    sqlite_pragmas = Dict(
+        {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "temp_store": "MEMORY",
+        },
+        help="Pragmas set on each SQLite connection, foreign_keys is always ON"
+    ).tag(config=True)
+
+    sqlite_readers = Integer(
+        0,
+        help="Read-only connections beside one SQLite writer, 0 shares a pool"
+    ).tag(config=True)
+
     contexts = List(
         [],
         help="List of contexts"
@@ -137,6 +239,21 @@ class EntrypointService(config.Application):
             os.path.join(self.data_files_path, "templates"),
         ]
 
+    template_auto_reload = Bool(
+        False,
+        help="Check templates for changes on every render, for development"
+    ).tag(config=True)
+
+    template_cache_path = Unicode(
+        "",
+        help="Directory for compiled template bytecode cache, unset disables"
+    ).tag(config=True)
+
+    templates = List(
+        ["about.html", "error-no-tags.html", "index.html", "manage.html"],
+        help="Templates to compile when the service starts"
+    )
+
     types = List(
         Tuple(Type(), List()),
         help="TBD"
@@ -147,6 +264,16 @@ class EntrypointService(config.Application):
         help="Turns on SQLAlchemy echo for verbose output"
     ).tag(config=True)
 
+    write_batch_size = Integer(
+        64,
+        help="Most writes committed together when batching writes"
+    ).tag(config=True)
+
+    write_batch_window = Float(
+        0.0,
+        help="Seconds to gather writes into one transaction, 0 disables"
+    ).tag(config=True)
+
     about_text = Unicode(dedent("""\
         <div class="row">
           <div class="col-md-offset-2 col-md-8">
@@ -181,18 +308,57 @@ class EntrypointService(config.Application):
 
         self.init_ssl_context()
 
-        # create SQLAlchemy engine, optionally init database
-        # FIXME parameterize
+        # create SQLAlchemy engines, optionally init database
 
-        engine = dbi.async_engine(
-            self.database_url,
-            echo=self.verbose_sqlalchemy,
-            future=True
-        )
+        engine, read_engine = self.init_engines()
+
+        # Snapshots keep an in-memory database across restarts. Handlers hold
+        # the lock for their whole write transactions, on the connection the
+        # snapshot copies, so a snapshot never sees one half done.
+
+        self.snapshots = False
+        self.snapshot_lock = None
+        if self.snapshot_path:
+            if dbi.is_memory_database(engine):
+                self.snapshots = True
+                self.snapshot_lock = asyncio.Lock()
+            else:
+                self.log.warning(
+                    "Ignoring snapshot_path, the database is not in memory"
+                )
+
+        # Batching writes saves commits, which cost nothing in memory
+
+        write_coordinator = None
+        if self.write_batch_window > 0:
+            if dbi.is_memory_database(engine):
+                self.log.warning(
+                    "Ignoring write_batch_window, the database is in memory"
+                )
+            else:
+                write_coordinator = dbi.WriteCoordinator(
+                    engine,
+                    self.write_batch_window,
+                    self.write_batch_size
+                )
+                metrics.register_write_coordinator(
+                    "primary", write_coordinator
+                )
+
+        # Create registry of entrypoint types, built once and shared by all
+        # requests, which bind them to a user as needed
+
+        for cls, args in self.types:
+            entrypoint_type = cls(*args)
+            entrypoint_type.compile_schema()
+            self.entrypoint_types[cls.get_type_name()] = entrypoint_type
 
         # Initialize database
 
         async def init_db(engine):
+            if self.snapshots:
+                await self.restore_snapshot(engine)
+
             async with engine.begin() as conn:
                 await dbi.init_db(conn)
 
@@ -214,17 +380,46 @@ class EntrypointService(config.Application):
 
                 for context_name in drop_contexts:
                     await dbi.delete_context(conn, context_name)
-                for context_name in create_contexts:
-                    await dbi.create_context(conn, context_name)
+                await dbi.create_contexts(conn, sorted(create_contexts))
+
+                # Refresh registry of context ids now contexts are settled
+
+                self.context_ids.clear()
+                self.context_ids.update(await dbi.retrieve_context_ids(conn))
+
+            async with engine.begin() as conn:
+                await self.materialize_spawner_args(conn)
+
+            if read_model is not None:
+                await self.load_read_model(read_model, engine)
+
+            # Cached responses may refer to contexts that were just dropped
+
+            self.selection_cache.clear()
+
+        read_model = None
+        if self.read_model:
+            read_model = ReadModel(self.entrypoint_types)
+
+        self.context_ids = dict()
+        self.selection_cache = ResponseCache(
+            self.selection_cache_size,
+            self.selection_cache_ttl
+        )
 
         loop = asyncio.get_event_loop()
         coroutine = init_db(engine)
         loop.run_until_complete(coroutine)
 
-        # Create registry of entrypoint type classes
+        # Template environment, shared by all web handlers
 
-        for cls, args in self.types:
-            self.entrypoint_types[cls.get_type_name()] = (cls, args)
+        self.init_jinja2_env()
+
+        # Shared request coalescing for hub lookups, caches report metrics
+
+        single_flight = SingleFlight()
+        metrics.register_cache("selection", self.selection_cache)
+        metrics.register_single_flight("hub_lookups", single_flight)
 
         # Cookie secret
 
@@ -242,10 +437,16 @@ class EntrypointService(config.Application):
             "static_path": os.path.join(self.data_files_path, "static"),
             "static_url_prefix": url_path_join(self.service_prefix, "static/"),
             "engine": engine,
+            "read_engine": read_engine,
             "contexts": self.contexts,
-            "template_paths": (
-                self.custom_template_paths + self.default_template_paths
-            ),
+            "context_ids": self.context_ids,
+            "query_count_header": self.query_count_header,
+            "read_model": read_model,
+            "selection_cache": self.selection_cache,
+            "single_flight": single_flight,
+            "write_coordinator": write_coordinator,
+            "snapshot_lock": self.snapshot_lock,
+            "jinja2_env": self.jinja2_env,
             "entrypoint_types": self.entrypoint_types
         }
 
@@ -281,6 +482,9 @@ class EntrypointService(config.Application):
             ), (
                 self.service_prefix + "api/selections/(.+)/contexts/(.+)",
                 SelectionAPIHandler
+            ), (
+                self.service_prefix + "api/metrics",
+                MetricsHandler
             ), (
                 self.service_prefix + "api/users/(.+)/selections/(.+)",
                 HubSelectionAPIHandler
@@ -299,6 +503,126 @@ class EntrypointService(config.Application):
             **self.settings
         )
 
+    async def materialize_spawner_args(self, conn):
+        """Rebuild stored spawner arguments if type configuration changed.
+
+        Hub lookups return spawner arguments rendered when entrypoints were
+        written. A fingerprint of the configured types is stored with them,
+        when it doesn't match the one for the current configuration they are
+        all rendered again.
+
+        """
+
+        fingerprint = self.spawner_args_fingerprint()
+        key = "spawner_args_fingerprint"
+        if await dbi.retrieve_state(conn, key) == fingerprint:
+            return
+
+        rows = list()
+        for row in await dbi.retrieve_all_entrypoint_data(conn):
+            entrypoint_type = self.entrypoint_types.get(row["entrypoint_type"])
+            if entrypoint_type is None:
+                continue
+            spawner_args = entrypoint_type.materialize_spawner_args(
+                row["entrypoint_data"]
+            )
+            rows.append(dict(spawner_args, uuid=row["uuid"]))
+        await dbi.replace_all_spawner_args(conn, rows)
+        await dbi.update_state(conn, key, fingerprint)
+        self.log.info(
+            f"Materialized spawner arguments for {len(rows)} entrypoints"
+        )
+
+    async def load_read_model(self, read_model, engine):
+        """Load the hub lookup read model and log how much memory it uses."""
+
+        start = time.perf_counter()
+        await read_model.load(engine)
+        elapsed = time.perf_counter() - start
+
+        users = len(read_model)
+        footprint = read_model.footprint() / 2**20
+        per_10k = footprint * 10000 / users if users else 0.0
+        self.log.info(
+            f"Loaded read model for {users} users in {elapsed:.2f} s, "
+            f"{footprint:.1f} MiB ({per_10k:.1f} MiB per 10k users)"
+        )
+
+    async def restore_snapshot(self, engine):
+        """Load the database from its snapshot, if one has been written."""
+
+        start = time.perf_counter()
+        try:
+            restored = await dbi.restore_snapshot(engine, self.snapshot_path)
+        except Exception:
+            DB_SNAPSHOT_DURATION_SECONDS.labels(
+                operation="restore", outcome="error"
+            ).observe(time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+
+        if restored:
+            DB_SNAPSHOT_DURATION_SECONDS.labels(
+                operation="restore", outcome="success"
+            ).observe(elapsed)
+            self.log.info(
+                f"Restored database from {self.snapshot_path} in "
+                f"{elapsed:.3f} s"
+            )
+        else:
+            self.log.info(f"No database snapshot at {self.snapshot_path}")
+
+    async def write_snapshot(self, attempts=1):
+        """Write a database snapshot, retrying while a transaction is open.
+
+        Args:
+            attempts (int): Tries before giving up, 0.1 s apart
+
+        Returns:
+            bool: True if the snapshot was written
+
+        """
+
+        engine = self.settings["engine"]
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(0.1)
+            await self.snapshot_lock.acquire()
+            start = time.perf_counter()
+            try:
+                written = await dbi.write_snapshot(engine, self.snapshot_path)
+            except Exception:
+                DB_SNAPSHOT_DURATION_SECONDS.labels(
+                    operation="write", outcome="error"
+                ).observe(time.perf_counter() - start)
+                self.log.exception(
+                    f"Failed to write database snapshot {self.snapshot_path}"
+                )
+                return False
+            finally:
+                self.snapshot_lock.release()
+            if written:
+                DB_SNAPSHOT_DURATION_SECONDS.labels(
+                    operation="write", outcome="success"
+                ).observe(time.perf_counter() - start)
+                DB_SNAPSHOT_LAST_SUCCESS_SECONDS.set_to_current_time()
+                return True
+
+        DB_SNAPSHOT_DURATION_SECONDS.labels(
+            operation="write", outcome="skipped"
+        ).observe(time.perf_counter() - start)
+        self.log.warning("Skipped database snapshot, a transaction was open")
+        return False
+
+    def spawner_args_fingerprint(self):
+        """Hash the configuration spawner arguments depend on."""
+
+        fingerprints = sorted(
+            (name, entrypoint_type.spawner_args_fingerprint())
+            for name, entrypoint_type in self.entrypoint_types.items()
+        )
+        return hashlib.sha256(jsonutil.dumps_bytes(fingerprints)).hexdigest()
+
     def init_logging(self):
         # This prevents double log messages because tornado use a root logger
         # that self.log is a child of. The logging module dipatches log
@@ -327,6 +651,126 @@ class EntrypointService(config.Application):
             logger.parent = self.log
             logger.setLevel(self.log.level)
 
+    def init_engines(self):
+        """Create the primary engine and the engine for reads.
+
+        Returns:
+            tuple: Primary and read `AsyncEngine`, which may be the same
+
+        """
+
+        sqlite_readers = 0
+        if self.sqlite_readers:
+            if self.read_database_url:
+                self.log.warning(
+                    "Ignoring sqlite_readers, reads go to read_database_url"
+                )
+            elif not dbi.sqlite_file(self.database_url):
+                self.log.warning(
+                    "Ignoring sqlite_readers, the database is not a SQLite file"
+                )
+            else:
+                sqlite_readers = self.sqlite_readers
+
+        engine = self.create_engine(
+            self.database_url,
+            "primary",
+            sqlite_mode="writer" if sqlite_readers else None
+        )
+        return engine, self.create_read_engine(engine, sqlite_readers)
+
+    def create_engine(self, url, name, **kwargs):
+        """Create an instrumented engine, `name` labels its metrics."""
+
+        engine = dbi.async_engine(
+            url,
+            sqlite_pragmas=self.sqlite_pragmas,
+            echo=self.verbose_sqlalchemy,
+            future=True,
+            **dict(self.engine_kwargs(), **kwargs)
+        )
+        metrics.instrument_engine(engine)
+        metrics.register_pool(name, engine)
+        dbi.trace_statements(
+            engine,
+            observe=metrics.observe_statement,
+            slow_query_threshold=self.slow_query_threshold,
+            log=self.log
+        )
+        return engine
+
+    def create_read_engine(self, engine, sqlite_readers=0):
+        """Create the engine for reads, which don't need transactions.
+
+        Reads go to `read_database_url` if set, or to `sqlite_readers`
+        read-only connections when the primary engine is a single SQLite
+        writer. Otherwise they share the primary engine's pool with autocommit
+        connections, unless the pool hands one connection to everyone (e.g.
+        in-memory SQLite), where switching it to autocommit would commit
+        writes in progress.
+
+        """
+
+        if sqlite_readers:
+            return self.create_engine(
+                self.database_url,
+                "read",
+                sqlite_mode="reader",
+                pool_size=sqlite_readers
+            )
+        if self.read_database_url:
+            return self.create_engine(
+                self.read_database_url,
+                "read",
+                isolation_level="AUTOCOMMIT"
+            )
+        shared = (SingletonThreadPool, StaticPool)
+        if isinstance(engine.sync_engine.pool, shared):
+            return engine
+        return engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    def engine_kwargs(self):
+        """Pool settings and connect args that were configured.
+
+        Unset ones are left out so that SQLAlchemy picks the pool defaults
+        for the database, some pools (e.g. in-memory SQLite) accept none.
+
+        """
+
+        kwargs = dict()
+        for name in ["pool_size", "max_overflow", "pool_timeout",
+                     "pool_recycle"]:
+            value = getattr(self, name)
+            if value is not None:
+                kwargs[name] = value
+        if self.pool_pre_ping:
+            kwargs["pool_pre_ping"] = True
+        if self.connect_args:
+            kwargs["connect_args"] = self.connect_args
+        return kwargs
+
+    def init_jinja2_env(self):
+        """Create template environment and compile templates up front."""
+
+        loader = FileSystemLoader(
+            self.custom_template_paths + self.default_template_paths
+        )
+
+        bytecode_cache = None
+        if self.template_cache_path:
+            os.makedirs(self.template_cache_path, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(self.template_cache_path)
+
+        self.jinja2_env = Environment(
+            loader=loader,
+            auto_reload=self.template_auto_reload,
+            bytecode_cache=bytecode_cache,
+            enable_async=True
+        )
+
+        for name in self.templates:
+            self.jinja2_env.get_template(name)
+
     # create an ssl cert
     def init_ssl_context(self):
         self.ssl_content = SSLContext().ssl_context()
@@ -334,7 +778,28 @@ class EntrypointService(config.Application):
     # have the web app listen at the port set by the config
     def start(self):
         self.app.listen(self.port)
-        IOLoop.current().start()
+        loop = IOLoop.current()
+        if not self.snapshots:
+            loop.start()
+            return
+
+        # Snapshot periodically, and once more after the loop stops. SIGTERM
+        # and SIGINT stop the loop between callbacks, instead of exiting
+        # without that last snapshot. A second SIGINT interrupts it as usual.
+
+        if self.snapshot_interval > 0:
+            PeriodicCallback(
+                self.write_snapshot,
+                self.snapshot_interval * 1000
+            ).start()
+        asyncio_loop = asyncio.get_event_loop()
+        for signum in [signal.SIGTERM, signal.SIGINT]:
+            asyncio_loop.add_signal_handler(signum, loop.stop)
+        try:
+            loop.start()
+        finally:
+            asyncio_loop.remove_signal_handler(signal.SIGINT)
+            loop.run_sync(lambda: self.write_snapshot(attempts=50))
 
 
 def main():
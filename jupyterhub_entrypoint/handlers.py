@@ -1,17 +1,80 @@
 
+import base64
+import binascii
+from contextlib import asynccontextmanager
 import logging
 import os
+import time
 
-from jinja2 import Environment, FileSystemLoader
 from jupyterhub.services.auth import HubOAuthenticated
 from jupyterhub.utils import url_path_join
-from tornado.escape import json_decode
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from tornado.web import authenticated, HTTPError, RequestHandler
 
-from jupyterhub_entrypoint import dbi
-from jupyterhub_entrypoint.types import (
-    EntrypointType, EntrypointValidationError
+from jupyterhub_entrypoint import dbi, jsonutil
+from jupyterhub_entrypoint.dbi.tracing import StatementCounter, statements
+from jupyterhub_entrypoint.metrics import (
+    DB_POOL_CHECKOUT_DURATION_SECONDS, REQUEST_DURATION_SECONDS,
+    REQUEST_STATEMENTS, REQUESTS_IN_FLIGHT
 )
+from jupyterhub_entrypoint.types import EntrypointValidationError
+
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(after):
+    """Make an opaque page cursor from a `retrieve_entrypoint_page` key."""
+
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(jsonutil.dumps_bytes(after)).decode()
+
+
+def decode_cursor(cursor):
+    """Turn a page cursor back into a key, or fail with a 400."""
+
+    try:
+        after = jsonutil.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPError(400)
+    if (not isinstance(after, list) or len(after) != 3 or
+            not all(isinstance(a, str) for a in after)):
+        raise HTTPError(400)
+    return tuple(after)
+
+
+def entrypoint_groups(entrypoints):
+    """Flatten retrieved entrypoints into groups by context and type."""
+
+    return [
+        dict(
+            context_name=context_name,
+            entrypoint_type=entrypoint_type,
+            entrypoints=entries
+        )
+        for context_name, types in entrypoints.items()
+        for entrypoint_type, entries in types.items()
+    ]
+
+
+def entrypoints_body(entries, limit=None, after=None):
+    """Join serialized entries into a hub entrypoint lookup response.
+
+    Args:
+        entries (list of bytes): Serialized entries
+        limit   (int, optional): Page size, if a page was requested
+        after   (tuple, optional): Key for the next page
+
+    Returns:
+        bytes: Response body
+
+    """
+
+    body = b'{"entrypoints":[' + b",".join(entries) + b"]"
+    if limit is not None:
+        body += b',"after":' + jsonutil.dumps_bytes(encode_cursor(after))
+    return body + b"}"
 
 
 class BaseHandler(RequestHandler):
@@ -22,6 +85,176 @@ class BaseHandler(RequestHandler):
 
         super().initialize()
         self.engine = self.settings["engine"]
+        self.read_engine = self.settings["read_engine"]
+        self.context_ids = self.settings["context_ids"]
+        self.selection_cache = self.settings["selection_cache"]
+        self.read_model = self.settings["read_model"]
+        self.write_coordinator = self.settings["write_coordinator"]
+        self.snapshot_lock = self.settings["snapshot_lock"]
+        self.single_flight = self.settings["single_flight"]
+        self.in_flight = False
+        self.statements = StatementCounter()
+
+    def prepare(self):
+        """Count the request as in flight and count its SQL statements."""
+
+        super().prepare()
+        REQUESTS_IN_FLIGHT.labels(handler=type(self).__name__).inc()
+        self.in_flight = True
+
+        # Each request runs in its own task, so this doesn't leak across them
+
+        statements.set(self.statements)
+
+    def finish(self, chunk=None):
+        """Report the statement count in a header if configured to."""
+
+        if self.settings["query_count_header"] and not self._headers_written:
+            self.set_header("X-Entrypoint-Query-Count", self.statements.count)
+        return super().finish(chunk)
+
+    def on_finish(self):
+        """Record request duration by handler and status code."""
+
+        super().on_finish()
+        handler = type(self).__name__
+        if self.in_flight:
+            REQUESTS_IN_FLIGHT.labels(handler=handler).dec()
+            self.in_flight = False
+        REQUEST_DURATION_SECONDS.labels(
+            handler=handler,
+            code=self.get_status()
+        ).observe(self.request.request_time())
+        REQUEST_STATEMENTS.labels(handler=handler).observe(
+            self.statements.count
+        )
+
+    @asynccontextmanager
+    async def connect(self):
+        """Connect to the primary engine, recording the pool checkout wait.
+
+        For reads made in order to write, which shouldn't lag writes the way
+        `read()` may, nor wait for a batch to commit the way `begin()` may.
+
+        """
+
+        start = time.perf_counter()
+        async with self.engine.connect() as conn:
+            DB_POOL_CHECKOUT_DURATION_SECONDS.labels(pool="primary").observe(
+                time.perf_counter() - start
+            )
+            yield conn
+
+    @asynccontextmanager
+    async def begin(self):
+        """Begin a transaction on a connection from `connect()`.
+
+        With write batching, the transaction is a savepoint in a batch shared
+        with other requests, and ending it waits for the batch to commit. The
+        batch checks out its own connection, which isn't recorded as a pool
+        checkout, and the transaction duration recorded for it includes the
+        batch window. With snapshots of an in-memory database, it holds the
+        snapshot lock.
+
+        """
+
+        if self.write_coordinator is not None:
+            async with self.write_coordinator.begin() as conn:
+                yield conn
+            return
+
+        if self.snapshot_lock is not None:
+            await self.snapshot_lock.acquire()
+        try:
+            async with self.connect() as conn:
+                async with conn.begin():
+                    yield conn
+        finally:
+            if self.snapshot_lock is not None:
+                self.snapshot_lock.release()
+
+    @asynccontextmanager
+    async def read(self):
+        """Connect for reads, routed to the read engine if there is one.
+
+        Read engines use autocommit, so there is no BEGIN/COMMIT round trip.
+        Reads may lag writes by a replica's replication delay, so anything
+        read in order to write should come from `connect()` instead.
+
+        """
+
+        # The read engine may only be the primary one with autocommit
+
+        pool = "read"
+        if self.read_engine.sync_engine.pool is self.engine.sync_engine.pool:
+            pool = "primary"
+        start = time.perf_counter()
+        async with self.read_engine.connect() as conn:
+            DB_POOL_CHECKOUT_DURATION_SECONDS.labels(pool=pool).observe(
+                time.perf_counter() - start
+            )
+            yield conn
+
+    async def invalidate(self, user):
+        """Drop responses cached for a user after a write for them commits.
+
+        The read model, if there is one, reloads the user from the database.
+        The write has committed either way, so if that fails the user is only
+        served from the database until a later refresh succeeds.
+
+        """
+
+        self.selection_cache.invalidate(user)
+        if self.read_model is None:
+            return
+
+        # The reload has to see the write, which a replica may not have yet.
+        # Read-only connections to the primary's SQLite file do.
+
+        engine = self.engine
+        url = self.engine.url
+        if dbi.sqlite_file(url):
+            if self.read_engine.url == dbi.read_only_url(url):
+                engine = self.read_engine
+        try:
+            await self.read_model.refresh(engine, user)
+        except Exception:
+            self.log.exception(f"Failed to refresh read model for {user}")
+
+    def from_read_model(self, user):
+        """Whether to answer a hub lookup for a user from the read model."""
+        if self.read_model is None:
+            return False
+        return not self.read_model.is_stale(user)
+
+    def parse_page_arguments(self):
+        """Get the page size and cursor for keyset pagination, if any.
+
+        Returns:
+            tuple: Page size or None if not paginating, and key to start after
+
+        """
+
+        limit = self.get_query_argument("limit", None)
+        if limit is None:
+            return None, None
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise HTTPError(400)
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise HTTPError(400)
+
+        after = self.get_query_argument("after", None)
+        if after is not None:
+            after = decode_cursor(after)
+        return limit, after
+
+    def write_json(self, obj):
+        """Write `obj` as the JSON response body."""
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(jsonutil.dumps_bytes(obj))
 
     @property
     def log(self):
@@ -42,8 +275,7 @@ class WebHandler(EntrypointHandler):
         """TBD"""
 
         super().initialize()
-        self.loader = FileSystemLoader(self.settings["template_paths"])
-        self.env = Environment(loader=self.loader, enable_async=True)
+        self.env = self.settings["jinja2_env"]
 
 
 class AboutHandler(WebHandler):
@@ -94,7 +326,7 @@ class ViewHandler(WebHandler):
         user = self.get_current_user()
         username = user["name"]
 
-        async with self.engine.begin() as conn:
+        async with self.read() as conn:
             entrypoints = await dbi.retrieve_many_entrypoints(
                 conn, username, None, context_name
             )
@@ -141,10 +373,10 @@ class NewHandler(WebHandler):
         user = self.get_current_user()
 
         try:
-            cls, args = self.entrypoint_types[entrypoint_type_name]
-            entrypoint_type = cls(*args, username=user["name"])
+            entrypoint_type = self.entrypoint_types[entrypoint_type_name]
         except KeyError:
-            raise WebError(404)
+            raise HTTPError(404)
+        entrypoint_type = entrypoint_type.for_user(user["name"])
 
         context_name = self.get_query_argument("context")
 
@@ -186,7 +418,7 @@ class UpdateHandler(WebHandler):
         hub_auth = self.hub_auth
         base_url = hub_auth.hub_prefix
 
-        async with self.engine.begin() as conn:
+        async with self.read() as conn:
             result = await dbi.retrieve_one_entrypoint(
                 conn, username, uuid=uuid
             )
@@ -195,10 +427,10 @@ class UpdateHandler(WebHandler):
         context_names = result["context_names"]
 
         try:
-            cls, args = self.entrypoint_types[entrypoint_type_name]
-            entrypoint_type = cls(*args, username=username)
+            entrypoint_type = self.entrypoint_types[entrypoint_type_name]
         except KeyError:
-            raise WebError(404)
+            raise HTTPError(404)
+        entrypoint_type = entrypoint_type.for_user(username)
 
         chunk = await self.template_manage.render_async(
             base_url=base_url,
@@ -230,6 +462,64 @@ class EntrypointAPIHandler(EntrypointHandler):
             context["context_name"] for context in self.settings["contexts"]
         ]
 
+    @authenticated
+    async def get(self, uuid=None):
+        """List the user's entrypoints, grouped by context and type.
+
+        Optional query arguments `context` and `type` filter the list. With
+        `limit` it is returned a page at a time, along with the cursor to
+        pass as `after` for the next page. Without it the groups are streamed
+        as they are read.
+
+        """
+
+        if uuid is not None:
+            raise HTTPError(404)
+
+        user = self.get_current_user().get("name")
+        context_name = self.get_query_argument("context", None)
+        entrypoint_type = self.get_query_argument("type", None)
+        limit, after = self.parse_page_arguments()
+
+        if limit is not None:
+            async with self.read() as conn:
+                entrypoints, after = await dbi.retrieve_entrypoint_page(
+                    conn, user, entrypoint_type, context_name, limit, after
+                )
+            self.write_json(dict(
+                entrypoints=entrypoint_groups(entrypoints),
+                after=encode_cursor(after)
+            ))
+            return
+
+        # Once part of the list is sent the status can't change, so a failure
+        # drops the connection rather than finishing a truncated response
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        separator = ""
+        self.write('{"entrypoints": [')
+        try:
+            async with self.read() as conn:
+                groups = dbi.stream_many_entrypoints(
+                    conn, user, entrypoint_type, context_name
+                )
+                async for group_context_name, group_type, entries in groups:
+                    self.write(separator)
+                    self.write(jsonutil.dumps_bytes(dict(
+                        context_name=group_context_name,
+                        entrypoint_type=group_type,
+                        entrypoints=entries
+                    )))
+                    separator = ", "
+                    await self.flush()
+        except Exception:
+            if not self._headers_written:
+                raise
+            self.log.exception(f"Streaming entrypoints for {user} failed")
+            self.request.connection.close()
+            return
+        self.write("]}")
+
     @authenticated
     async def post(self):
         """TBD"""
@@ -237,28 +527,43 @@ class EntrypointAPIHandler(EntrypointHandler):
         user = self.get_current_user().get("name")
 
         try:
-            payload = json_decode(self.request.body)
+            payload = jsonutil.loads(self.request.body)
             entrypoint_type_name = payload["entrypoint_type"]
             entrypoint_data = payload["entrypoint_data"]
             await self.validate_entrypoint_data(user, entrypoint_type_name, entrypoint_data)
             context_names = payload["context_names"] or self.context_names
             self.validate_context_names(context_names)
-            async with self.engine.begin() as conn:
+            spawner_args = self.materialize_spawner_args(
+                entrypoint_type_name,
+                entrypoint_data
+            )
+            async with self.begin() as conn:
                 await dbi.create_entrypoint(
                     conn,
                     user,
                     entrypoint_data["entrypoint_name"],
                     entrypoint_type_name,
                     entrypoint_data,
-                    context_names
+                    context_names,
+                    self.context_ids
+                )
+                await dbi.set_spawner_args(
+                    conn,
+                    user,
+                    entrypoint_data["entrypoint_name"],
+                    spawner_args,
+                    replace=False
                 )
-            self.write({"result": True, "message": "Entrypoint added"})
         except EntrypointValidationError:
             self.log.error(f"Validation error: {entrypoint_data}")
-            self.write({"result": False, "message": "Validation error"})
+            self.write_json({"result": False, "message": "Validation error"})
+            return
         except Exception as e:
             self.log.error(f"Error ({e}): {entrypoint_data}")
-            self.write({"result": False, "message": "Error"})
+            self.write_json({"result": False, "message": "Error"})
+            return
+        await self.invalidate(user)
+        self.write_json({"result": True, "message": "Entrypoint added"})
 
     @authenticated
     async def put(self, uuid):
@@ -266,30 +571,23 @@ class EntrypointAPIHandler(EntrypointHandler):
 
         user = self.get_current_user().get("name")
 
-        async with self.engine.begin() as conn:
+        async with self.connect() as conn:
             result = await dbi.retrieve_one_entrypoint(
                 conn, user, uuid=uuid
             )
         entrypoint_type_name = result["entrypoint_type_name"]
-        current_context_names = result["context_names"]
 
         try:
-            payload = json_decode(self.request.body)
+            payload = jsonutil.loads(self.request.body)
             entrypoint_data = payload["entrypoint_data"]
             await self.validate_entrypoint_data(user, entrypoint_type_name, entrypoint_data)
             context_names = payload["context_names"] or self.context_names
             self.validate_context_names(context_names)
-            to_tag = list(
-                set(context_names).difference(
-                    set(current_context_names)
-                )
-            )
-            to_untag = list(
-                set(current_context_names).difference(
-                    set(context_names)
-                )
+            spawner_args = self.materialize_spawner_args(
+                entrypoint_type_name,
+                entrypoint_data
             )
-            async with self.engine.begin() as conn:
+            async with self.begin() as conn:
                 await dbi.update_entrypoint_uuid(
                     conn,
                     user,
@@ -297,27 +595,29 @@ class EntrypointAPIHandler(EntrypointHandler):
                     entrypoint_data["entrypoint_name"],
                     entrypoint_data
                 )
-                for context_name in to_tag:
-                    await dbi.tag_entrypoint(
-                        conn,
-                        user,
-                        entrypoint_data["entrypoint_name"],
-                        context_name
-                    )
-                for context_name in to_untag:
-                    await dbi.untag_entrypoint(
-                        conn,
-                        user,
-                        entrypoint_data["entrypoint_name"],
-                        context_name
-                    )
-            self.write({"result": True, "message": "Entrypoint updated"})
+                await dbi.set_spawner_args(
+                    conn,
+                    user,
+                    entrypoint_data["entrypoint_name"],
+                    spawner_args
+                )
+                await dbi.set_entrypoint_contexts(
+                    conn,
+                    user,
+                    uuid,
+                    context_names,
+                    self.context_ids
+                )
         except EntrypointValidationError:
             self.log.error(f"Validation error: {entrypoint_data}")
-            self.write({"result": False, "message": "Validation error"})
+            self.write_json({"result": False, "message": "Validation error"})
+            return
         except Exception as e:
             self.log.error(f"Error ({e}): {entrypoint_data}")
-            self.write({"result": False, "message": "Error"})
+            self.write_json({"result": False, "message": "Error"})
+            return
+        await self.invalidate(user)
+        self.write_json({"result": True, "message": "Entrypoint updated"})
 
     async def validate_entrypoint_data(
         self,
@@ -336,13 +636,19 @@ class EntrypointAPIHandler(EntrypointHandler):
         # FIXME: Actually check user
 
         try:
-            cls, args = self.entrypoint_types[entrypoint_type_name]
-            entrypoint_type = cls(*args, username=user)
-        except:
+            entrypoint_type = self.entrypoint_types[entrypoint_type_name]
+        except KeyError:
             raise EntrypointValidationError
+        entrypoint_type = entrypoint_type.for_user(user)
 
         await entrypoint_type.validate(entrypoint_data)
 
+    def materialize_spawner_args(self, entrypoint_type_name, entrypoint_data):
+        """Render spawner arguments to store with validated entrypoint data."""
+
+        entrypoint_type = self.entrypoint_types[entrypoint_type_name]
+        return entrypoint_type.materialize_spawner_args(entrypoint_data)
+
     def validate_context_names(self, context_names):
         for name in context_names:
             if name not in self.context_names:
@@ -354,9 +660,10 @@ class EntrypointAPIHandler(EntrypointHandler):
 
         user = self.get_current_user().get("name")
 
-        async with self.engine.begin() as conn:
+        async with self.begin() as conn:
             await dbi.delete_entrypoint(conn, user, entrypoint_name)
-        self.write({})
+        await self.invalidate(user)
+        self.write_json({})
 
 
 class SelectionAPIHandler(EntrypointHandler):
@@ -368,9 +675,12 @@ class SelectionAPIHandler(EntrypointHandler):
 
         user = self.get_current_user().get("name")
 
-        async with self.engine.begin() as conn:
-            await dbi.update_selection(conn, user, entrypoint_name, context_name)
-        self.write({})
+        async with self.begin() as conn:
+            await dbi.update_selection(
+                conn, user, entrypoint_name, context_name, self.context_ids
+            )
+        await self.invalidate(user)
+        self.write_json({})
 
     @authenticated
     async def delete(self, entrypoint_name, context_name):
@@ -379,9 +689,12 @@ class SelectionAPIHandler(EntrypointHandler):
         user = self.get_current_user().get("name")
 
         # FIXME entrypoint_name isn't doing anything here, maybe don't need it
-        async with self.engine.begin() as conn:
-            await dbi.delete_selection(conn, user, context_name)
-        self.write({})
+        async with self.begin() as conn:
+            await dbi.delete_selection(
+                conn, user, context_name, self.context_ids
+            )
+        await self.invalidate(user)
+        self.write_json({})
 
 
 class HubAPIHandler(BaseHandler):
@@ -396,7 +709,7 @@ class HubAPIHandler(BaseHandler):
         """TBD"""
 
         return (
-            self.request.headers["Authorization"] ==
+            self.request.headers.get("Authorization") ==
             f"token {self.entrypoint_api_token}"
         )
 
@@ -411,6 +724,19 @@ class HubAPIHandler(BaseHandler):
         return kwargs
 
 
+class MetricsHandler(HubAPIHandler):
+    """Exposes service metrics in the Prometheus text format."""
+
+    def get(self):
+        """TBD"""
+
+        if not self.validate_token():
+            raise HTTPError(403)
+
+        self.set_header("Content-Type", CONTENT_TYPE_LATEST)
+        self.write(generate_latest(REGISTRY))
+
+
 class HubSelectionAPIHandler(HubAPIHandler):
     """Gives the hub and endpoint to contact to find out a user's selection."""
 
@@ -426,31 +752,70 @@ class HubSelectionAPIHandler(HubAPIHandler):
         if not self.validate_token():
             raise HTTPError(403)
 
+        kwargs = self.parse_query_arguments()
+        key = (user, context_name, tuple(sorted(kwargs.items())))
+
+        if self.from_read_model(user):
+            try:
+                body = self.read_model.selection(
+                    user,
+                    context_name,
+                    kwargs["batchspawner"]
+                )
+            except KeyError:
+                raise HTTPError(404)
+        else:
+            body = self.selection_cache.get(key)
+        if body is None:
+
+            # Concurrent misses share one lookup, unless the user's data has
+            # changed since the lookup in flight started
+
+            version = self.selection_cache.version(user)
+            body = await self.single_flight.run(
+                ("selection",) + key + version,
+                self.get_spawner_args,
+                user,
+                context_name,
+                kwargs
+            )
+            self.selection_cache.set(key, body, version)
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(body)
+
+    async def get_spawner_args(self, user, context_name, kwargs):
+        """Look up the user's selection and render its spawner arguments.
+
+        Returns:
+            bytes: Serialized spawner arguments
+
+        """
+
         try:
-            async with self.engine.begin() as conn:
+            async with self.read() as conn:
                 result = await dbi.retrieve_selection(
                     conn,
                     user,
-                    context_name
+                    context_name,
+                    raw=True,
+                    batchspawner=kwargs["batchspawner"]
                 )
         except ValueError:
             raise HTTPError(404)
-        entrypoint_type_name, entrypoint_data = result
+        entrypoint_type_name, entrypoint_json, spawner_args = result
 
         try:
-            cls, args = self.entrypoint_types[entrypoint_type_name]
-            entrypoint_type = cls(*args, user=user)
+            entrypoint_type = self.entrypoint_types[entrypoint_type_name]
         except KeyError:
-            raise WebError(404)
-
-        spawner_args = dict()
-        if isinstance(entrypoint_type, EntrypointType):
-            kwargs = self.parse_query_arguments()
-            spawner_args = entrypoint_type.spawner_args(
-                entrypoint_data,
-                **kwargs
-            )
-        self.write(spawner_args)
+            raise HTTPError(404)
+
+        # Spawner arguments are stored when entrypoints are written, render
+        # them here only for entrypoints written before that
+
+        if spawner_args is not None:
+            return spawner_args.encode()
+        return entrypoint_type.spawner_args_json(entrypoint_json, **kwargs)
 
 
 class HubEntrypointAPIHandler(HubAPIHandler):
@@ -468,35 +833,119 @@ class HubEntrypointAPIHandler(HubAPIHandler):
         if not self.validate_token():
             raise HTTPError(403)
 
-        async with self.engine.begin() as conn:
-            entrypoints = await dbi.retrieve_many_entrypoints(
-                conn, user, None, context_name
+        # The selection cache version changes with any write for the user, so
+        # requests arriving after a write don't join a lookup from before it
+
+        kwargs = self.parse_query_arguments()
+        limit, after = self.parse_page_arguments()
+
+        if self.from_read_model(user):
+            try:
+                result, after = self.read_model.entrypoints(
+                    user,
+                    context_name,
+                    kwargs["batchspawner"],
+                    limit,
+                    after
+                )
+            except KeyError:
+                raise HTTPError(404)
+            body = entrypoints_body(result, limit, after)
+        else:
+            key = (
+                "entrypoints",
+                user,
+                context_name,
+                tuple(sorted(kwargs.items())),
+                limit,
+                after
+            ) + self.selection_cache.version(user)
+
+            body = await self.single_flight.run(
+                key,
+                self.get_entrypoints,
+                user,
+                context_name,
+                kwargs,
+                limit,
+                after
             )
 
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(body)
+
+    async def get_entrypoints(
+        self,
+        user,
+        context_name,
+        kwargs,
+        limit=None,
+        after=None
+    ):
+        """Look up the user's entrypoints and render their spawner arguments.
+
+        With a `limit`, look up one page, and include the cursor for the next.
+
+        Returns:
+            bytes: Serialized entrypoints
+
+        """
+
+        async with self.read() as conn:
+            if limit is None:
+                entrypoints = await dbi.retrieve_many_entrypoints(
+                    conn,
+                    user,
+                    None,
+                    context_name,
+                    raw=True,
+                    batchspawner=kwargs["batchspawner"]
+                )
+            else:
+                entrypoints, after = await dbi.retrieve_entrypoint_page(
+                    conn,
+                    user,
+                    None,
+                    context_name,
+                    limit,
+                    after,
+                    raw=True,
+                    batchspawner=kwargs["batchspawner"]
+                )
+
         entrypoints = entrypoints.get(context_name, {})
 
+        # Spawner arguments come back as JSON text, or are rendered straight
+        # to JSON if they weren't stored, so each entry is spliced into the
+        # body
+
         result = list()
         for entrypoint_type_name, entrypoint_list in entrypoints.items():
             try:
-                cls, args = self.entrypoint_types[entrypoint_type_name]
-                entrypoint_type = cls(*args, username=user)
+                entrypoint_type = self.entrypoint_types[entrypoint_type_name]
             except KeyError:
-                raise WebError(404)
+                raise HTTPError(404)
             for entrypoint in entrypoint_list:
-                entrypoint_data = entrypoint["entrypoint_data"]
-                entrypoint_name = entrypoint_data["entrypoint_name"]
-                kwargs = self.parse_query_arguments()
-                spawner_args = entrypoint_type.spawner_args(
-                    entrypoint_data,
-                    **kwargs
-                )
-                result.append({
-                    "entrypoint_name": entrypoint_name,
-                    "entrypoint_type": entrypoint_type_name,
-                    "selected": entrypoint["selected"] is True,
-                    "spawner_args": spawner_args
-                })
-        self.write(dict(entrypoints=result))
+                spawner_args = entrypoint["spawner_args"]
+                if spawner_args is None:
+                    spawner_args = entrypoint_type.spawner_args_json(
+                        entrypoint["entrypoint_data"],
+                        **kwargs
+                    )
+                else:
+                    spawner_args = spawner_args.encode()
+                result.append(b"".join((
+                    b'{"entrypoint_name":',
+                    jsonutil.dumps_bytes(entrypoint["entrypoint_name"]),
+                    b',"entrypoint_type":',
+                    jsonutil.dumps_bytes(entrypoint_type_name),
+                    b',"selected":',
+                    b"true" if entrypoint["selected"] is True else b"false",
+                    b',"spawner_args":',
+                    spawner_args,
+                    b"}"
+                )))
+        return entrypoints_body(result, limit, after)
 
 """
 {
@@ -0,0 +1,43 @@
+
+"""JSON encoding and decoding, with orjson if it is installed.
+
+orjson is several times faster than the standard library at both, which adds
+up on the hub's lookup endpoints and for the entrypoint_data column. Output
+is compact either way, so it doesn't depend on which one is in use.
+
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError: # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+
+    def dumps_bytes(obj):
+        """Encode `obj` as UTF-8 JSON bytes."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(obj):
+        """Encode `obj` as a JSON string."""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(s):
+        """Decode JSON from a string or bytes."""
+        return orjson.loads(s)
+
+else: # pragma: no cover
+
+    def dumps_bytes(obj):
+        """Encode `obj` as UTF-8 JSON bytes."""
+        return dumps(obj).encode()
+
+    def dumps(obj):
+        """Encode `obj` as a JSON string."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(s):
+        """Decode JSON from a string or bytes."""
+        return json.loads(s)
@@ -0,0 +1,238 @@
+
+"""Prometheus metrics exported by the entrypoint service.
+
+Metrics are named `entrypoint_<noun>_<verb>_<unit>` following the Prometheus
+naming practices, so they don't collide with JupyterHub's own metrics when
+both are scraped into the same Prometheus.
+
+Caches, request coalescing and write batching keep their own plain counters,
+which are read by a collector at scrape time rather than updated as
+Prometheus metrics on the hot path. Register them with `register_cache`,
+`register_single_flight` and `register_write_coordinator`.
+
+"""
+
+import time
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+REQUEST_DURATION_SECONDS = Histogram(
+    "entrypoint_request_duration_seconds",
+    "Request duration by handler and status code",
+    ["handler", "code"],
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "entrypoint_requests_in_flight",
+    "Requests being handled, by handler",
+    ["handler"],
+)
+
+REQUEST_STATEMENTS = Histogram(
+    "entrypoint_request_statements",
+    "SQL statements executed per request, by handler",
+    ["handler"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, float("inf")),
+)
+
+DB_TRANSACTION_DURATION_SECONDS = Histogram(
+    "entrypoint_db_transaction_duration_seconds",
+    "Database transaction duration from BEGIN to COMMIT or ROLLBACK, "
+    "including the window of batched writes",
+    ["outcome"],
+)
+
+DB_STATEMENT_DURATION_SECONDS = Histogram(
+    "entrypoint_db_statement_duration_seconds",
+    "SQL statement duration by the dbi function that executed it",
+    ["operation"],
+    buckets=(
+        0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+        float("inf")
+    ),
+)
+
+# Recorded by handlers, not for connections write batching checks out
+
+DB_POOL_CHECKOUT_DURATION_SECONDS = Histogram(
+    "entrypoint_db_pool_checkout_duration_seconds",
+    "Time to get a connection from the pool, including any wait",
+    ["pool"],
+    buckets=(
+        0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+        2.5, 5.0, 10.0, 30.0, float("inf")
+    ),
+)
+
+DB_SNAPSHOT_DURATION_SECONDS = Histogram(
+    "entrypoint_db_snapshot_duration_seconds",
+    "Time to write or restore a snapshot of an in-memory database",
+    ["operation", "outcome"],
+    buckets=(
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+        float("inf")
+    ),
+)
+
+DB_SNAPSHOT_LAST_SUCCESS_SECONDS = Gauge(
+    "entrypoint_db_snapshot_last_success_timestamp_seconds",
+    "Unix time the last snapshot of an in-memory database was written",
+)
+
+UPSTREAM_FETCH_DURATION_SECONDS = Histogram(
+    "entrypoint_upstream_fetch_duration_seconds",
+    "Duration of requests to upstream services, like Shifter's image service",
+    ["service", "outcome"],
+)
+
+IMAGE_CATALOG_LOOKUPS = Counter(
+    "entrypoint_image_catalog_lookups",
+    "Shifter image catalog lookups, by whether the cache was fresh or stale",
+    ["result"],
+)
+
+
+class CacheCollector:
+    """Collect counters from registered caches and coalescing layers."""
+
+    def __init__(self):
+        self.caches = dict()
+        self.single_flights = dict()
+        self.write_coordinators = dict()
+        self.pools = dict()
+
+    def collect(self):
+        hits = CounterMetricFamily(
+            "entrypoint_cache_hits",
+            "Cache lookups that found a valid entry",
+            labels=["cache"],
+        )
+        misses = CounterMetricFamily(
+            "entrypoint_cache_misses",
+            "Cache lookups that found no valid entry",
+            labels=["cache"],
+        )
+        size = GaugeMetricFamily(
+            "entrypoint_cache_entries",
+            "Entries held by the cache",
+            labels=["cache"],
+        )
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            size.add_metric([name], len(cache))
+
+        calls = CounterMetricFamily(
+            "entrypoint_coalesced_calls",
+            "Calls started by a request coalescing layer",
+            labels=["layer"],
+        )
+        coalesced = CounterMetricFamily(
+            "entrypoint_coalesced_waiters",
+            "Callers that waited on a call already in flight",
+            labels=["layer"],
+        )
+        for name, single_flight in self.single_flights.items():
+            calls.add_metric([name], single_flight.calls)
+            coalesced.add_metric([name], single_flight.coalesced)
+
+        batches = CounterMetricFamily(
+            "entrypoint_db_write_batches",
+            "Transactions committed by write batching",
+            labels=["engine"],
+        )
+        batched = CounterMetricFamily(
+            "entrypoint_db_write_batched_writes",
+            "Writes committed in those transactions",
+            labels=["engine"],
+        )
+        for name, coordinator in self.write_coordinators.items():
+            batches.add_metric([name], coordinator.batches)
+            batched.add_metric([name], coordinator.writes)
+
+        # Only queue pools track their size and use, e.g. not in-memory SQLite
+
+        pool_size = GaugeMetricFamily(
+            "entrypoint_db_pool_size",
+            "Connections the pool keeps open",
+            labels=["pool"],
+        )
+        checked_out = GaugeMetricFamily(
+            "entrypoint_db_pool_checked_out",
+            "Connections currently checked out of the pool",
+            labels=["pool"],
+        )
+        overflow = GaugeMetricFamily(
+            "entrypoint_db_pool_overflow",
+            "Connections open beyond the pool size, negative if below it",
+            labels=["pool"],
+        )
+        for name, pool in self.pools.items():
+            if not hasattr(pool, "checkedout"):
+                continue
+            pool_size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], pool.overflow())
+
+        return [
+            hits, misses, size, calls, coalesced, batches, batched,
+            pool_size, checked_out, overflow
+        ]
+
+
+COLLECTOR = CacheCollector()
+REGISTRY.register(COLLECTOR)
+
+
+def register_cache(name, cache):
+    """Report hits, misses and size of a `ResponseCache` under `name`."""
+    COLLECTOR.caches[name] = cache
+
+
+def register_single_flight(name, single_flight):
+    """Report calls and coalesced waiters of a `SingleFlight` under `name`."""
+    COLLECTOR.single_flights[name] = single_flight
+
+
+def register_write_coordinator(name, coordinator):
+    """Report batches and writes of a `WriteCoordinator` under `name`."""
+    COLLECTOR.write_coordinators[name] = coordinator
+
+
+def register_pool(name, engine):
+    """Report size and use of an engine's connection pool under `name`."""
+    COLLECTOR.pools[name] = engine.sync_engine.pool
+
+
+def observe_statement(operation, seconds):
+    """Record a statement's duration, see `dbi.trace_statements`."""
+    DB_STATEMENT_DURATION_SECONDS.labels(operation=operation).observe(seconds)
+
+
+def instrument_engine(engine):
+    """Record transaction durations for an engine.
+
+    Args:
+        engine (AsyncEngine): Engine to instrument
+
+    """
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "begin")
+    def begin(conn):
+        conn.info["transaction_start"] = time.perf_counter()
+
+    def end(outcome):
+        def listener(conn):
+            start = conn.info.pop("transaction_start", None)
+            if start is not None:
+                DB_TRANSACTION_DURATION_SECONDS.labels(
+                    outcome=outcome
+                ).observe(time.perf_counter() - start)
+        return listener
+
+    event.listen(sync_engine, "commit", end("commit"))
+    event.listen(sync_engine, "rollback", end("rollback"))
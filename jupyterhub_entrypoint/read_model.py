@@ -0,0 +1,243 @@
+
+import sys
+
+from jupyterhub_entrypoint import dbi, jsonutil
+
+
+class ReadModel:
+    """In-memory copy of what hub lookups need, for every user.
+
+    For each user and context, holds the tagged entrypoints in key order
+    (entrypoint type, then name) as ready-made JSON fragments, with both
+    variants of their spawner arguments, and which of them is selected. Hub
+    lookups are answered from here without touching the database.
+
+    Everything is loaded once at startup. After a write for a user commits,
+    `refresh()` reloads that user, so the copy is only ever behind by writes
+    still in progress. If a refresh fails the user is stale until one
+    succeeds, and lookups for them should go to the database instead. Writes
+    made by other processes are not seen, so this only suits a single service
+    process.
+
+    """
+
+    def __init__(self, entrypoint_types):
+        """Initialize an empty read model.
+
+        Args:
+            entrypoint_types (dict): Entrypoint type registry, for rendering
+                spawner arguments that were not stored
+
+        """
+
+        self.entrypoint_types = entrypoint_types
+        self._users = dict()
+        self._generations = dict()
+        self._applied = dict()
+        self._stale = set()
+
+    def __len__(self):
+        return len(self._users)
+
+    async def load(self, engine):
+        """Replace the whole read model from the database."""
+
+        # Many entrypoints have the same spawner arguments, so equal values
+        # are shared while loading
+
+        users = dict()
+        shared = dict()
+        async with engine.connect() as conn:
+            rows = dbi.stream_tagged_entrypoints(conn)
+            async for r in rows:
+                contexts = users.setdefault(r.user, dict())
+                self._add(contexts, r, shared)
+        self._users = self._freeze(users)
+
+    async def refresh(self, engine, user):
+        """Reload one user after a write for that user has committed.
+
+        Refreshes for a user can finish out of order. Each one reads from the
+        database after its own write committed, so the one started last has
+        seen every write, and earlier ones finishing after it are dropped.
+
+        """
+
+        generation = self._generations.get(user, 0) + 1
+        self._generations[user] = generation
+
+        contexts = dict()
+        try:
+            async with engine.connect() as conn:
+                rows = dbi.stream_tagged_entrypoints(conn, user)
+                async for r in rows:
+                    self._add(contexts, r)
+        except BaseException:
+            self._stale.add(user)
+            raise
+
+        if generation <= self._applied.get(user, 0):
+            return
+        self._applied[user] = generation
+        if generation == self._generations[user]:
+            self._stale.discard(user)
+        if contexts:
+            self._users[user] = self._freeze({user: contexts})[user]
+        else:
+            self._users.pop(user, None)
+
+    def is_stale(self, user):
+        """Whether the user's last refresh failed, or one before it did."""
+        return user in self._stale
+
+    def selection(self, user, context_name, batchspawner=False):
+        """Return serialized spawner arguments of the user's selection.
+
+        Raises:
+            KeyError: If there is no selection, or its type is unknown
+
+        """
+
+        selected, entries = self._users[user][context_name]
+        if selected is None:
+            raise KeyError(context_name)
+        return self._spawner_args(entries[selected], batchspawner)
+
+    def entrypoints(
+        self,
+        user,
+        context_name,
+        batchspawner=False,
+        limit=None,
+        after=None
+    ):
+        """Return serialized entrypoints tagged with a context.
+
+        Args:
+            user            (str): User name
+            context_name    (str): Context name
+            batchspawner    (bool): Which spawner arguments to include
+            limit           (int, optional): Return at most this many
+            after           (tuple, optional): Key returned with previous page
+
+        Returns:
+            tuple: List of JSON entries as bytes, and the key for the next
+                page or None if there isn't one
+
+        Raises:
+            KeyError: If an entrypoint's type is unknown
+
+        """
+
+        contexts = self._users.get(user, {})
+        selected, entries = contexts.get(context_name, (None, ()))
+
+        # Keys order by context name first, see retrieve_entrypoint_page
+
+        start = 0
+        if after:
+            if after[0] > context_name:
+                start = len(entries)
+            elif after[0] == context_name:
+                key = tuple(after[1:])
+                while start < len(entries) and entries[start][:2] <= key:
+                    start += 1
+
+        stop = len(entries)
+        next_after = None
+        if limit is not None and stop - start > limit:
+            stop = start + limit
+            next_after = (context_name,) + entries[stop - 1][:2]
+
+        result = list()
+        for entry in entries[start:stop]:
+            result.append(
+                entry[2] + self._spawner_args(entry, batchspawner) + b"}"
+            )
+        return result, next_after
+
+    def footprint(self):
+        """Estimate memory held by the read model, in bytes."""
+
+        seen = set()
+        stack = [self._users]
+        size = 0
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+        return size
+
+    def _add(self, contexts, r, shared=None):
+        """Add a row from `stream_tagged_entrypoints` to a user's contexts."""
+
+        selected, entries = contexts.setdefault(r.context_name, [None, []])
+        if r.selected:
+            contexts[r.context_name][0] = len(entries)
+
+        spawner_args = r.spawner_args
+        batchspawner_args = r.batchspawner_args
+        if spawner_args is None or batchspawner_args is None:
+            spawner_args, batchspawner_args = self._render(r)
+        else:
+            spawner_args = spawner_args.encode()
+            batchspawner_args = batchspawner_args.encode()
+
+        prefix = b"".join((
+            b'{"entrypoint_name":',
+            jsonutil.dumps_bytes(r.entrypoint_name),
+            b',"entrypoint_type":',
+            jsonutil.dumps_bytes(r.entrypoint_type),
+            b',"selected":',
+            b"true" if r.selected else b"false",
+            b',"spawner_args":'
+        ))
+        entry = (
+            r.entrypoint_type,
+            r.entrypoint_name,
+            prefix,
+            spawner_args,
+            batchspawner_args
+        )
+        if shared is not None:
+            entry = tuple(shared.setdefault(value, value) for value in entry)
+        entries.append(entry)
+
+    def _render(self, r):
+        """Render spawner arguments that were not stored."""
+
+        entrypoint_type = self.entrypoint_types.get(r.entrypoint_type)
+        if entrypoint_type is None:
+            return None, None
+        return (
+            entrypoint_type.spawner_args_json(
+                r.entrypoint_data, batchspawner=False
+            ),
+            entrypoint_type.spawner_args_json(
+                r.entrypoint_data, batchspawner=True
+            )
+        )
+
+    def _freeze(self, users):
+        """Convert contexts to tuples, which are smaller than lists."""
+
+        return dict(
+            (user, dict(
+                (context_name, (selected, tuple(entries)))
+                for context_name, (selected, entries) in contexts.items()
+            ))
+            for user, contexts in users.items()
+        )
+
+    def _spawner_args(self, entry, batchspawner):
+        spawner_args = entry[4] if batchspawner else entry[3]
+        if spawner_args is None:
+            raise KeyError(entry[0])
+        return spawner_args
@@ -1,13 +1,24 @@
 
+import asyncio
+from collections import OrderedDict
+import copy
 import os
 from pathlib import Path
 from textwrap import dedent
 import re
+import time
 
-from jsonschema import validate as json_validate
-from jsonschema.exceptions import ValidationError
+from jsonschema.validators import validator_for
 from tornado.escape import json_decode
 from tornado.httpclient import AsyncHTTPClient
+from tornado.log import app_log
+
+from jupyterhub_entrypoint import jsonutil
+from jupyterhub_entrypoint.cache import SingleFlight
+from jupyterhub_entrypoint.metrics import (
+    IMAGE_CATALOG_LOOKUPS, UPSTREAM_FETCH_DURATION_SECONDS,
+    register_single_flight
+)
 
 
 class EntrypointValidationError(Exception):
@@ -34,6 +45,11 @@ class EntrypointType:
     - get_description   optional classmethod, default is empty string
     - get_options       optional, coroutine
     - validation_hook   optional, coroutine
+    - spawner_args_fingerprint  optional, if spawner_args uses other config
+
+    Bump `spawner_args_version` on any class whose `spawner_args` output
+    changes between releases, so spawner arguments stored by an older
+    release are rendered again.
 
     An `EntrypointType` has the following responsibilities:
 
@@ -55,6 +71,8 @@ class EntrypointType:
 
     """
 
+    spawner_args_version = 1
+
     def __init__(self, **kwargs):
         self.schema = {
             "type": "object",
@@ -67,6 +85,31 @@ class EntrypointType:
         }
         self.executable = kwargs.get("executable", "jupyter-labhub")
         self.username = kwargs.get("username")
+        self.validator = None
+        self.enum_sets = dict()
+
+    def for_user(self, username):
+        """Return a view of this entrypoint type bound to a user.
+
+        The service builds one instance of each configured entrypoint type at
+        startup and shares it across requests. Anything that depends on who
+        is making the request, like listing the images a user may choose from,
+        goes through a view from this method instead. The view is a shallow
+        copy, so the schema and other configuration are not rebuilt.
+
+        Args:
+            username (str): User name
+
+        Returns:
+            EntrypointType: Entrypoint type bound to the user
+
+        """
+
+        if username == self.username:
+            return self
+        bound = copy.copy(self)
+        bound.username = username
+        return bound
 
     def extend_schema(self, properties):
         """Extend the base schema used for validating user entrypoint data.
@@ -91,6 +134,40 @@ class EntrypointType:
             self.schema["required"].append(list(prop.keys())[0])
         self.schema["minProperties"] = len(self.schema["properties"])
         self.schema["maxProperties"] = self.schema["minProperties"]
+        self.validator = None
+
+    def compile_schema(self):
+        """Check the schema and compile a validator for entrypoint data.
+
+        This is called once when the service starts, so that a bad schema is
+        reported right away instead of when a user first submits entrypoint
+        data, and so that validation doesn't rebuild a validator every time.
+
+        Properties restricted to an enum of hashable values, like the scripts
+        of `TrustedScriptEntrypointType`, are checked against a set instead of
+        by the validator, since the validator searches the enum list.
+
+        Raises:
+            jsonschema.exceptions.SchemaError: If the schema is invalid
+
+        """
+
+        cls = validator_for(self.schema)
+        cls.check_schema(self.schema)
+
+        schema = copy.deepcopy(self.schema)
+        enum_sets = dict()
+        for name, prop in schema["properties"].items():
+            if "enum" not in prop:
+                continue
+            try:
+                enum_sets[name] = frozenset(prop["enum"])
+            except TypeError:
+                continue
+            del prop["enum"]
+
+        self.validator = cls(schema)
+        self.enum_sets = enum_sets
 
     @property
     def type_name(self):
@@ -264,10 +341,17 @@ class EntrypointType:
 
         """
 
-        try:
-            json_validate(entrypoint_data, self.schema)
-        except ValidationError:
+        if self.validator is None:
+            self.compile_schema()
+        if not self.validator.is_valid(entrypoint_data):
             raise EntrypointValidationError
+        for name, enum_set in self.enum_sets.items():
+            try:
+                known = entrypoint_data[name] in enum_set
+            except TypeError:
+                known = False
+            if not known:
+                raise EntrypointValidationError
 
     def spawner_args(self, entrypoint_data, **kwargs):
         """Convert entrypoint data into spawner arguments.
@@ -287,6 +371,72 @@ class EntrypointType:
 
         return entrypoint_data
 
+    def spawner_args_json(self, entrypoint_json, **kwargs):
+        """Convert entrypoint data as JSON text into serialized spawner args.
+
+        Types that don't override `spawner_args` pass entrypoint data through
+        verbatim, so the stored JSON is returned as is. Otherwise it is only
+        decoded for `spawner_args` to pick out the fields it needs.
+
+        Args:
+            entrypoint_json (str): Entrypoint data as JSON text
+            kwargs (dict): Query filters
+
+        Returns:
+            bytes: Spawner arguments as UTF-8 JSON
+
+        """
+
+        if type(self).spawner_args is EntrypointType.spawner_args:
+            return entrypoint_json.encode()
+        entrypoint_data = jsonutil.loads(entrypoint_json)
+        return jsonutil.dumps_bytes(
+            self.spawner_args(entrypoint_data, **kwargs)
+        )
+
+    def materialize_spawner_args(self, entrypoint_data):
+        """Render spawner arguments for every variant the Hub asks for.
+
+        The service stores these when entrypoints are written, so Hub lookups
+        don't need to call `spawner_args` at all.
+
+        Args:
+            entrypoint_data (dict): Entrypoint data
+
+        Returns:
+            dict: Spawner arguments as JSON text, with and without
+                batchspawner, for keys "spawner_args" and "batchspawner_args"
+
+        """
+
+        return {
+            "spawner_args": jsonutil.dumps(
+                self.spawner_args(entrypoint_data, batchspawner=False)
+            ),
+            "batchspawner_args": jsonutil.dumps(
+                self.spawner_args(entrypoint_data, batchspawner=True)
+            ),
+        }
+
+    def spawner_args_fingerprint(self):
+        """Describe the configuration `spawner_args` output depends on.
+
+        Materialized spawner arguments are rebuilt at startup when this
+        changes for any configured type. By default it covers the class, its
+        `spawner_args_version` and the executable, subclasses whose spawner
+        arguments depend on other configuration should add it.
+
+        Returns:
+            str: Anything that changes when the spawner arguments would
+
+        """
+
+        cls = type(self)
+        return (
+            f"{cls.__module__}.{cls.__qualname__}"
+            f"/{cls.spawner_args_version}:{self.executable}"
+        )
+
     @classmethod
     def get_type_name(cls):
         """Render the entrypoint type for use as a dict key.
@@ -540,19 +690,35 @@ class ShifterEntrypointType(EntrypointType):
 
     """
 
+    # Image catalogs are shared by all instances, keyed by service URL, image
+    # filter, and user, and kept in the order they were fetched. Concurrent
+    # fetches of the same catalog are coalesced.
+
+    _catalogs = OrderedDict()
+    _fetches = SingleFlight()
+
     def __init__(
         self,
         shifter_api_url,
         shifter_api_token=None,
         image_filter=None,
+        cache_ttl=60.0,
+        cache_stale_ttl=600.0,
         **kwargs
     ):
         """Initialize the Shifter entrypoint type.
 
+        Images fetched for a user are cached for `cache_ttl` seconds. After
+        that, for another `cache_stale_ttl` seconds, the cached images are
+        still used but a refresh is started in the background. Older cached
+        images are fetched again before being used.
+
         Args:
             shifter_api_url (str): URL for Shifter image service
             shifter_api_token (str): API token for Shifter image service
             image_filter (function): Image filter, default is no filtering
+            cache_ttl (float): Seconds cached images are fresh
+            cache_stale_ttl (float): Seconds stale images may still be used
 
         """
 
@@ -562,7 +728,9 @@ class ShifterEntrypointType(EntrypointType):
             shifter_api_token or os.environ["SHIFTER_API_TOKEN"]
         )
         self.extend_schema([{"image": {"type": "string"}}])
-        self.image_filter = image_filter or (lambda image: True)
+        self.image_filter = image_filter or _any_image
+        self.cache_ttl = cache_ttl
+        self.cache_stale_ttl = cache_stale_ttl
 
     def spawner_args(self, entrypoint_data, **kwargs):
         """Convert entrypoint data into spawner arguments.
@@ -622,23 +790,104 @@ class ShifterEntrypointType(EntrypointType):
         """
 
         try:
-            images = await self.get_images()
-        except:
-            # FIXME log message would be good here...
+            catalog = await self.get_catalog()
+        except Exception as e:
+            app_log.error(f"Shifter image service error ({e})")
             raise EntrypointValidationError
-        if entrypoint_data["image"] not in images:
+        if entrypoint_data["image"] not in catalog.tag_set:
             raise EntrypointValidationError
 
     async def get_images(self):
-        """Gets images from the Shifter image service."""
+        """Gets images from the Shifter image service, or the cache."""
+
+        catalog = await self.get_catalog()
+        return catalog.tags
+
+    async def get_catalog(self):
+        """Gets the user's image catalog, from the cache when possible.
+
+        Returns:
+            ShifterImageCatalog: Images available to the user
+
+        """
+
+        key = (self.shifter_api_url, self.image_filter, self.username)
+        catalog = self._catalogs.get(key)
+        if catalog is not None:
+            age = time.monotonic() - catalog.fetched
+            if age < self.cache_ttl:
+                IMAGE_CATALOG_LOOKUPS.labels(result="fresh").inc()
+                return catalog
+            if age < self.cache_ttl + self.cache_stale_ttl:
+                IMAGE_CATALOG_LOOKUPS.labels(result="stale").inc()
+                if key not in self._fetches:
+                    asyncio.ensure_future(self._revalidate(key))
+                return catalog
+        IMAGE_CATALOG_LOOKUPS.labels(result="miss").inc()
+        return await self._fetches.run(key, self._fetch_catalog, key)
+
+    async def _revalidate(self, key):
+        """Refresh a stale catalog in the background, keeping it on error."""
+
+        try:
+            await self._fetches.run(key, self._fetch_catalog, key)
+        except Exception as e:
+            app_log.error(f"Shifter image service error ({e})")
+
+    async def _fetch_catalog(self, key):
+        """Fetch the user's image catalog and cache it."""
 
         client = AsyncHTTPClient()
-        response = await client.fetch(
-            f"{self.shifter_api_url}list/{self.username}",
-            headers={"Authorization": self.shifter_api_token}
-        )
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await client.fetch(
+                f"{self.shifter_api_url}list/{self.username}",
+                headers={"Authorization": self.shifter_api_token}
+            )
+            outcome = "success"
+        finally:
+            UPSTREAM_FETCH_DURATION_SECONDS.labels(
+                service="shifter",
+                outcome=outcome
+            ).observe(time.perf_counter() - start)
         result = json_decode(response.body)
         images = result["images"]
-        return [
+        catalog = ShifterImageCatalog([
             image["tag"][0] for image in images if self.image_filter(image)
-        ]
+        ])
+
+        # Drop catalogs too old to be used at all, oldest are first
+
+        catalogs = self._catalogs
+        catalogs[key] = catalog
+        catalogs.move_to_end(key)
+        expired = catalog.fetched - self.cache_ttl - self.cache_stale_ttl
+        while catalogs:
+            oldest = next(iter(catalogs))
+            if catalogs[oldest].fetched > expired:
+                break
+            del catalogs[oldest]
+        return catalog
+
+
+register_single_flight("shifter_images", ShifterEntrypointType._fetches)
+
+
+class ShifterImageCatalog:
+    """Images available to a user from the Shifter image service.
+
+    Keeps tags in the order the service returned them for presenting as form
+    options, and as a set for checking whether an image is known.
+
+    """
+
+    def __init__(self, tags):
+        self.tags = tags
+        self.tag_set = frozenset(tags)
+        self.fetched = time.monotonic()
+
+
+def _any_image(image):
+    """Default Shifter image filter, which accepts every image."""
+    return True
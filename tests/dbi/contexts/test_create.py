@@ -2,6 +2,7 @@
 import pytest
 
 from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.dbi import upsert
 
 @pytest.mark.asyncio
 async def test_ok(engine, context_names):
@@ -27,3 +28,29 @@ async def test_idempotent(engine, context_names):
         output_context_names = await dbi.retrieve_contexts(conn)
     for output, expected in zip(output_context_names, context_names):
         assert output == expected
+
+@pytest.mark.asyncio
+async def test_bulk(engine, context_names):
+    async with engine.begin() as conn:
+        await dbi.create_context(conn, context_names[0])
+
+    # Existing contexts are skipped without failing the transaction
+
+    async with engine.begin() as conn:
+        await dbi.create_contexts(conn, context_names)
+        await dbi.create_contexts(conn, context_names)
+        output_context_names = await dbi.retrieve_contexts(conn)
+    assert output_context_names == sorted(context_names)
+
+@pytest.mark.asyncio
+async def test_savepoint_fallback(engine, context_names, monkeypatch):
+
+    # Dialects without ON CONFLICT insert each row in a savepoint instead
+
+    monkeypatch.setattr(upsert, "_inserts", {})
+    async with engine.begin() as conn:
+        await dbi.create_context(conn, context_names[0])
+        await dbi.create_contexts(conn, context_names)
+    async with engine.begin() as conn:
+        output_context_names = await dbi.retrieve_contexts(conn)
+    assert output_context_names == sorted(context_names)
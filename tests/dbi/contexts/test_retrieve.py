@@ -16,3 +16,16 @@ async def test_ok(engine, context_names):
     for output, expected in zip(output_context_names, context_names):
         assert output == expected
 
+
+@pytest.mark.asyncio
+async def test_ids(engine, context_names):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+
+    # Retrieve context ids, every context should have its own id
+
+    async with engine.begin() as conn:
+        context_ids = await dbi.retrieve_context_ids(conn)
+    assert sorted(context_ids) == sorted(context_names)
+    assert len(set(context_ids.values())) == len(context_names)
@@ -52,3 +52,28 @@ async def test_name_ok(engine, context_names, entrypoint_args):
         async with engine.begin() as conn:
             await dbi.create_entrypoint(conn, *args)
 
+
+@pytest.mark.asyncio
+async def test_context_ids(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+        context_ids = await dbi.retrieve_context_ids(conn)
+
+    # Creating entrypoints with known context ids tags them the same way
+
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args, context_ids)
+
+    for args in entrypoint_args:
+        async with engine.begin() as conn:
+            output = await dbi.retrieve_one_entrypoint(conn, *args[:2])
+        assert sorted(output["context_names"]) == sorted(args[-1])
+
+    # Unknown context names fail against the mapping too
+
+    args = (*entrypoint_args[1][:-1], entrypoint_args[1][-1] + ["multivac"])
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.create_entrypoint(conn, *args, context_ids)
@@ -1,4 +1,6 @@
 
+import json
+
 import pytest
 
 from jupyterhub_entrypoint import dbi
@@ -171,3 +173,31 @@ async def test_context_unknown(
     async with engine.begin() as conn:
         outputs = await dbi.retrieve_many_entrypoints(conn, user, None, context_name)
     assert len(outputs) == 0
+
+@pytest.mark.asyncio
+async def test_raw(engine, context_names, entrypoint_args, users):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Raw mode has the same entries, with data as JSON text and the name
+
+    user = users[1]
+    async with engine.begin() as conn:
+        outputs = await dbi.retrieve_many_entrypoints(conn, user)
+        raw_outputs = await dbi.retrieve_many_entrypoints(conn, user, raw=True)
+    assert raw_outputs.keys() == outputs.keys()
+    for context_name, types in outputs.items():
+        assert raw_outputs[context_name].keys() == types.keys()
+        for entrypoint_type, entries in types.items():
+            raw_entries = raw_outputs[context_name][entrypoint_type]
+            for entry, raw_entry in zip(entries, raw_entries):
+                entrypoint_data = json.loads(raw_entry.pop("entrypoint_data"))
+                assert entrypoint_data == entry.pop("entrypoint_data")
+                assert raw_entry.pop("entrypoint_name") == (
+                    entrypoint_data["entrypoint_name"]
+                )
+                assert raw_entry == entry
@@ -0,0 +1,82 @@
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+def flatten(outputs):
+    return [
+        (context_name, entrypoint_type, x["uuid"])
+        for context_name, types in outputs.items()
+        for entrypoint_type, entries in types.items()
+        for x in entries
+    ]
+
+@pytest.mark.asyncio
+async def test_pages(engine, context_names, entrypoint_args, users):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Walking every page gives the same entries, in order, as one retrieval
+
+    user = users[1]
+    async with engine.begin() as conn:
+        expected = flatten(await dbi.retrieve_many_entrypoints(conn, user))
+
+    pages = list()
+    after = None
+    while True:
+        async with engine.begin() as conn:
+            page, after = await dbi.retrieve_entrypoint_page(
+                conn, user, limit=5, after=after
+            )
+        assert len(flatten(page)) <= 5
+        pages += flatten(page)
+        if after is None:
+            break
+    assert pages == expected
+
+@pytest.mark.asyncio
+async def test_context(engine, context_names, entrypoint_args, users):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    user = users[1]
+    context_name = context_names[0]
+    async with engine.begin() as conn:
+        expected = await dbi.retrieve_many_entrypoints(
+            conn, user, None, context_name
+        )
+        page, after = await dbi.retrieve_entrypoint_page(
+            conn, user, None, context_name, limit=1000
+        )
+    assert page == expected
+    assert after is None
+
+@pytest.mark.asyncio
+async def test_stream(engine, context_names, entrypoint_args, users):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Streamed groups add up to the same structure as one retrieval
+
+    user = users[1]
+    async with engine.begin() as conn:
+        expected = await dbi.retrieve_many_entrypoints(conn, user)
+        outputs = dict()
+        groups = dbi.stream_many_entrypoints(conn, user)
+        async for context_name, entrypoint_type, entries in groups:
+            assert entrypoint_type not in outputs.get(context_name, {})
+            outputs.setdefault(context_name, {})[entrypoint_type] = entries
+    assert outputs == expected
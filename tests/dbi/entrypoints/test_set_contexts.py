@@ -0,0 +1,98 @@
+
+import pytest
+from sqlalchemy.sql import select
+
+from jupyterhub_entrypoint import dbi
+
+def uuid_statement(user, entrypoint_name):
+    entrypoints = dbi.model.entrypoints
+    return (
+        select(entrypoints.c.uuid)
+        .where(
+            entrypoints.c.user == user,
+            entrypoints.c.entrypoint_name == entrypoint_name
+        )
+    )
+
+async def populate(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Find an entrypoint tagged with some but not all contexts
+
+    for a in entrypoint_args:
+        if 0 < len(a[-1]) < len(context_names):
+            user, entrypoint_name = a[:2]
+            break
+    async with engine.begin() as conn:
+        output = await dbi.retrieve_one_entrypoint(conn, user, entrypoint_name)
+        uuid = await conn.scalar(uuid_statement(user, entrypoint_name))
+    return user, entrypoint_name, uuid, output["context_names"]
+
+@pytest.mark.asyncio
+async def test_ok(engine, context_names, entrypoint_args):
+    user, entrypoint_name, uuid, current = await populate(
+        engine, context_names, entrypoint_args
+    )
+
+    # Swap current contexts for the others
+
+    wanted = sorted(set(context_names) - set(current))
+    async with engine.begin() as conn:
+        await dbi.set_entrypoint_contexts(conn, user, uuid, wanted)
+    async with engine.begin() as conn:
+        output = await dbi.retrieve_one_entrypoint(conn, user, entrypoint_name)
+    assert sorted(output["context_names"]) == wanted
+
+    # Setting the same contexts again changes nothing
+
+    async with engine.begin() as conn:
+        await dbi.set_entrypoint_contexts(conn, user, uuid, wanted)
+    async with engine.begin() as conn:
+        output = await dbi.retrieve_one_entrypoint(conn, user, entrypoint_name)
+    assert sorted(output["context_names"]) == wanted
+
+@pytest.mark.asyncio
+async def test_rename(engine, context_names, entrypoint_args):
+    user, entrypoint_name, uuid, current = await populate(
+        engine, context_names, entrypoint_args
+    )
+
+    # Rename and retag in one transaction, as an update does
+
+    async with engine.begin() as conn:
+        await dbi.update_entrypoint_uuid(
+            conn, user, uuid, "renamed", dict(entrypoint_name="renamed")
+        )
+        await dbi.set_entrypoint_contexts(conn, user, uuid, context_names)
+    async with engine.begin() as conn:
+        output = await dbi.retrieve_one_entrypoint(conn, user, "renamed")
+    assert sorted(output["context_names"]) == sorted(context_names)
+
+@pytest.mark.asyncio
+async def test_removes_selection(engine, context_names, entrypoint_args):
+    user, entrypoint_name, uuid, current = await populate(
+        engine, context_names, entrypoint_args
+    )
+    async with engine.begin() as conn:
+        await dbi.update_selection(conn, user, entrypoint_name, current[0])
+
+    others = sorted(set(context_names) - {current[0]})
+    async with engine.begin() as conn:
+        await dbi.set_entrypoint_contexts(conn, user, uuid, others)
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.retrieve_selection(conn, user, current[0])
+
+@pytest.mark.asyncio
+async def test_context_unknown(engine, context_names, entrypoint_args):
+    user, entrypoint_name, uuid, current = await populate(
+        engine, context_names, entrypoint_args
+    )
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.set_entrypoint_contexts(conn, user, uuid, ["HAL-9000"])
@@ -44,3 +44,19 @@ async def test_fails(engine, context_names, entrypoint_args):
     with pytest.raises(ValueError):
         async with engine.begin() as conn:
             await dbi.delete_selection(conn, user, "multivac")
+
+@pytest.mark.asyncio
+async def test_no_selection(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Deleting a selection that was never made is fine but reports it
+
+    user = entrypoint_args[0][0]
+    async with engine.begin() as conn:
+        deleted = await dbi.delete_selection(conn, user, context_names[1])
+    assert deleted is False
@@ -1,4 +1,6 @@
 
+import json
+
 import pytest
 
 from jupyterhub_entrypoint import dbi
@@ -47,3 +49,30 @@ async def test_unknown(engine, context_names, entrypoint_args):
         async with engine.begin() as conn:
             output_data = await dbi.retrieve_selection(conn, user, "multivac")
 
+
+@pytest.mark.asyncio
+async def test_raw(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Raw mode returns the stored JSON text for the same selection
+
+    for a in entrypoint_args:
+        if a[-1]:
+            user, entrypoint_name = a[:2]
+            context_name = a[-1][0]
+            break
+    async with engine.begin() as conn:
+        await dbi.update_selection(conn, user, entrypoint_name, context_name)
+    async with engine.begin() as conn:
+        output_data = await dbi.retrieve_selection(conn, user, context_name)
+        raw_data = await dbi.retrieve_selection(
+            conn, user, context_name, raw=True
+        )
+    assert raw_data[0] == output_data[0]
+    assert isinstance(raw_data[1], str)
+    assert json.loads(raw_data[1]) == output_data[1]
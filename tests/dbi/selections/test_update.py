@@ -56,3 +56,90 @@ async def test_entrypoint_unknown(engine, context_names, entrypoint_args):
         async with engine.begin() as conn:
             await dbi.update_selection(conn, user, "quantum", context_names[1])
 
+
+@pytest.mark.asyncio
+async def test_replace(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Select two fully-tagged entrypoints in turn, second replaces the first
+
+    tagged = [a for a in entrypoint_args if len(a[-1]) == len(context_names)]
+    user = tagged[0][0]
+    first, second = [a[1] for a in tagged if a[0] == user][:2]
+
+    async with engine.begin() as conn:
+        replaced = await dbi.update_selection(conn, user, first, context_names[1])
+    assert replaced is False
+
+    async with engine.begin() as conn:
+        replaced = await dbi.update_selection(conn, user, second, context_names[1])
+    assert replaced is True
+
+    async with engine.begin() as conn:
+        output = await dbi.retrieve_one_entrypoint(conn, user, second)
+        entrypoint_type_name, entrypoint_data = await (
+            dbi.retrieve_selection(conn, user, context_names[1])
+        )
+    assert entrypoint_data == output["entrypoint_data"]
+
+@pytest.mark.asyncio
+async def test_entrypoint_untagged(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Selecting an entrypoint not tagged with the context should fail
+
+    args = None
+    for a in entrypoint_args:
+        if not a[-1]:
+            args = a
+            break
+
+    user, entrypoint_name = args[:2]
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.update_selection(conn, user, entrypoint_name, context_names[1])
+
+@pytest.mark.asyncio
+async def test_context_ids(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+        context_ids = await dbi.retrieve_context_ids(conn)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Select using known context ids, then fail on an unknown context
+
+    args = None
+    for a in entrypoint_args:
+        if len(a[-1]) == len(context_names):
+            args = a
+            break
+
+    user, entrypoint_name = args[:2]
+    async with engine.begin() as conn:
+        await dbi.update_selection(
+            conn, user, entrypoint_name, context_names[1], context_ids
+        )
+    async with engine.begin() as conn:
+        entrypoint_type_name, entrypoint_data = await (
+            dbi.retrieve_selection(conn, user, context_names[1])
+        )
+    assert entrypoint_data == args[-2]
+
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.update_selection(
+                conn, user, entrypoint_name, "multivac", context_ids
+            )
@@ -0,0 +1,60 @@
+
+import json
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+@pytest.mark.asyncio
+async def test_ok(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Render spawner args for every entrypoint of one type
+
+    async with engine.begin() as conn:
+        rows = await dbi.retrieve_all_entrypoint_data(conn)
+    assert len(rows) == len(entrypoint_args)
+    entrypoint_type = entrypoint_args[0][2]
+    rendered = [
+        dict(
+            uuid=row["uuid"],
+            spawner_args=json.dumps(row["entrypoint_data"]),
+            batchspawner_args="{}"
+        )
+        for row in rows if row["entrypoint_type"] == entrypoint_type
+    ]
+    async with engine.begin() as conn:
+        await dbi.replace_all_spawner_args(conn, rendered)
+
+    # Entrypoints of other types have none
+
+    user = entrypoint_args[0][0]
+    async with engine.begin() as conn:
+        outputs = await dbi.retrieve_many_entrypoints(
+            conn, user, batchspawner=False
+        )
+    for types in outputs.values():
+        for type_name, entries in types.items():
+            for entry in entries:
+                if type_name == entrypoint_type:
+                    assert json.loads(entry["spawner_args"]) == (
+                        entry["entrypoint_data"]
+                    )
+                else:
+                    assert entry["spawner_args"] is None
+
+    # Replacing with nothing clears them all
+
+    async with engine.begin() as conn:
+        await dbi.replace_all_spawner_args(conn, [])
+        outputs = await dbi.retrieve_many_entrypoints(
+            conn, user, batchspawner=True
+        )
+    for types in outputs.values():
+        for entries in types.values():
+            assert all(entry["spawner_args"] is None for entry in entries)
@@ -0,0 +1,106 @@
+
+import json
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+def spawner_args(name):
+    return dict(
+        spawner_args=json.dumps(dict(cmd=[name])),
+        batchspawner_args=json.dumps(dict(cmd=[name, "batch"]))
+    )
+
+async def populate(engine, context_names, entrypoint_args):
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+    async with engine.begin() as conn:
+        for args in entrypoint_args:
+            await dbi.create_entrypoint(conn, *args)
+
+    # Find a tagged entrypoint, select it and store its spawner args
+
+    for a in entrypoint_args:
+        if a[-1]:
+            user, entrypoint_name = a[:2]
+            context_name = a[-1][0]
+            break
+    async with engine.begin() as conn:
+        await dbi.update_selection(conn, user, entrypoint_name, context_name)
+        await dbi.set_spawner_args(
+            conn, user, entrypoint_name, spawner_args(entrypoint_name)
+        )
+    return user, entrypoint_name, context_name
+
+@pytest.mark.asyncio
+async def test_ok(engine, context_names, entrypoint_args):
+    user, entrypoint_name, context_name = await populate(
+        engine, context_names, entrypoint_args
+    )
+    expected = spawner_args(entrypoint_name)
+
+    # Both variants come back with the selection and entrypoint lists
+
+    async with engine.begin() as conn:
+        for batchspawner, key in [
+            (False, "spawner_args"),
+            (True, "batchspawner_args")
+        ]:
+            result = await dbi.retrieve_selection(
+                conn, user, context_name, batchspawner=batchspawner
+            )
+            assert result[2] == expected[key]
+
+            outputs = await dbi.retrieve_many_entrypoints(
+                conn, user, context_name=context_name,
+                raw=True, batchspawner=batchspawner
+            )
+            for entries in outputs[context_name].values():
+                for entry in entries:
+                    if entry["entrypoint_name"] == entrypoint_name:
+                        assert entry["spawner_args"] == expected[key]
+                    else:
+                        assert entry["spawner_args"] is None
+
+@pytest.mark.asyncio
+async def test_replace(engine, context_names, entrypoint_args):
+    user, entrypoint_name, context_name = await populate(
+        engine, context_names, entrypoint_args
+    )
+
+    # Setting spawner args again replaces them
+
+    async with engine.begin() as conn:
+        await dbi.set_spawner_args(
+            conn, user, entrypoint_name, spawner_args("other")
+        )
+    async with engine.begin() as conn:
+        result = await dbi.retrieve_selection(
+            conn, user, context_name, batchspawner=False
+        )
+    assert result[2] == spawner_args("other")["spawner_args"]
+
+@pytest.mark.asyncio
+async def test_cascade(engine, context_names, entrypoint_args):
+    user, entrypoint_name, context_name = await populate(
+        engine, context_names, entrypoint_args
+    )
+    async with engine.begin() as conn:
+        await dbi.delete_entrypoint(conn, user, entrypoint_name)
+    async with engine.begin() as conn:
+        count = await conn.scalar(
+            dbi.model.entrypoint_spawner_args.select().with_only_columns(
+                dbi.model.entrypoint_spawner_args.c.entrypoint_id
+            ).limit(1)
+        )
+    assert count is None
+
+@pytest.mark.asyncio
+async def test_unknown(engine, context_names, entrypoint_args):
+    await populate(engine, context_names, entrypoint_args)
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.set_spawner_args(
+                conn, "hal", "mercury", spawner_args("mercury")
+            )
@@ -0,0 +1,17 @@
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+@pytest.mark.asyncio
+async def test_ok(engine):
+    async with engine.begin() as conn:
+        assert await dbi.retrieve_state(conn, "fingerprint") is None
+        await dbi.update_state(conn, "fingerprint", "abc")
+        await dbi.update_state(conn, "other", "xyz")
+    async with engine.begin() as conn:
+        assert await dbi.retrieve_state(conn, "fingerprint") == "abc"
+        await dbi.update_state(conn, "fingerprint", "def")
+    async with engine.begin() as conn:
+        assert await dbi.retrieve_state(conn, "fingerprint") == "def"
+        assert await dbi.retrieve_state(conn, "other") == "xyz"
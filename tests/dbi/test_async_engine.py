@@ -2,3 +2,101 @@
 import pytest
 
 from jupyterhub_entrypoint import dbi
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+async def pragma(engine, name):
+    async with engine.connect() as conn:
+        result = await conn.execute(text(f"PRAGMA {name}"))
+        return result.scalar()
+
+@pytest.mark.asyncio
+async def test_pragmas(tmp_path):
+    engine = dbi.async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}",
+        sqlite_pragmas=dict(journal_mode="WAL", busy_timeout=1234),
+        future=True
+    )
+    assert await pragma(engine, "journal_mode") == "wal"
+    assert await pragma(engine, "busy_timeout") == 1234
+    assert await pragma(engine, "foreign_keys") == 1
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_foreign_keys_forced():
+    engine = dbi.async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        sqlite_pragmas=dict(foreign_keys="OFF"),
+        future=True
+    )
+    assert await pragma(engine, "foreign_keys") == 1
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_per_engine(engine):
+
+    # Pragmas apply to the engine they were given for, not every engine
+
+    other = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    assert await pragma(engine, "foreign_keys") == 1
+    assert await pragma(other, "foreign_keys") == 0
+    await other.dispose()
+
+def test_invalid_pragma():
+    with pytest.raises(ValueError):
+        dbi.async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            sqlite_pragmas={"journal_mode": "WAL; DROP TABLE contexts"}
+        )
+
+@pytest.mark.asyncio
+async def test_sqlite_modes(tmp_path, context_names):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}"
+    pragmas = dict(journal_mode="WAL")
+    writer = dbi.async_engine(
+        url,
+        sqlite_pragmas=pragmas,
+        sqlite_mode="writer",
+        pool_size=8,
+        future=True
+    )
+    reader = dbi.async_engine(
+        url,
+        sqlite_pragmas=pragmas,
+        sqlite_mode="reader",
+        pool_size=4,
+        future=True
+    )
+    assert writer.sync_engine.pool.size() == 1
+    assert reader.sync_engine.pool.size() == 4
+
+    # Readers see what the writer committed, and can't write themselves
+
+    async with writer.begin() as conn:
+        await dbi.init_db(conn, True)
+        await dbi.create_contexts(conn, context_names)
+    async with reader.connect() as conn:
+        assert await dbi.retrieve_contexts(conn) == context_names
+        with pytest.raises(Exception, match="readonly"):
+            await dbi.create_context(conn, "wopr")
+    assert await pragma(reader, "foreign_keys") == 1
+
+    await writer.dispose()
+    await reader.dispose()
+
+def test_invalid_sqlite_mode(tmp_path):
+    with pytest.raises(ValueError):
+        dbi.async_engine("sqlite+aiosqlite:///:memory:", sqlite_mode="writer")
+    with pytest.raises(ValueError):
+        dbi.async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}",
+            sqlite_mode="replica"
+        )
+
+def test_sqlite_file():
+    assert dbi.sqlite_file("sqlite+aiosqlite:///:memory:") is None
+    assert dbi.sqlite_file("postgresql+asyncpg://db/entrypoint") is None
+    assert dbi.sqlite_file("sqlite+aiosqlite:///a.sqlite") == "a.sqlite"
+    assert str(dbi.read_only_url("sqlite+aiosqlite:///a.sqlite")) == (
+        "sqlite+aiosqlite:///file%3Aa.sqlite?mode=ro&uri=true"
+    )
@@ -0,0 +1,98 @@
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+@pytest.fixture
+async def file_engine(tmp_path):
+    path = tmp_path / "entrypoint.sqlite"
+    engine = dbi.async_engine(f"sqlite+aiosqlite:///{path}", future=True)
+    async with engine.begin() as conn:
+        await dbi.init_db(conn, True)
+    yield engine, path
+    await engine.dispose()
+
+def committed_contexts(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(r[0] for r in conn.execute(
+            "select context_name from contexts"
+        ))
+
+@pytest.mark.asyncio
+async def test_batch(file_engine, context_names):
+    engine, path = file_engine
+    coordinator = dbi.WriteCoordinator(engine, window=60)
+    seen = list()
+
+    async def create(context_name):
+        async with coordinator.begin() as conn:
+            await dbi.create_context(conn, context_name)
+            seen.append(committed_contexts(path))
+
+    # Concurrent writes share one commit, and aren't seen before it. Writers
+    # queue for the lock once started, so the flush comes after them all.
+
+    tasks = [asyncio.ensure_future(create(c)) for c in context_names]
+    await asyncio.sleep(0)
+    await coordinator.flush()
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=10)
+    assert seen == [[]] * len(context_names)
+    assert committed_contexts(path) == context_names
+    assert (coordinator.batches, coordinator.writes) == (1, len(context_names))
+
+@pytest.mark.asyncio
+async def test_error(file_engine, context_names):
+    engine, path = file_engine
+    coordinator = dbi.WriteCoordinator(engine, window=0.05)
+
+    async def create(context_name):
+        async with coordinator.begin() as conn:
+            await dbi.create_context(conn, context_name)
+            if context_name == context_names[0]:
+                raise ValueError
+
+    # Only the failing caller's writes are rolled back
+
+    results = await asyncio.gather(
+        *[create(c) for c in context_names],
+        return_exceptions=True
+    )
+    assert isinstance(results[0], ValueError)
+    assert results[1:] == [None] * (len(context_names) - 1)
+    assert committed_contexts(path) == context_names[1:]
+
+@pytest.mark.asyncio
+async def test_max_batch(file_engine, context_names):
+    engine, path = file_engine
+    coordinator = dbi.WriteCoordinator(engine, window=60, max_batch=2)
+
+    async def create(context_name):
+        async with coordinator.begin() as conn:
+            await dbi.create_context(conn, context_name)
+
+    # Full batches commit without waiting out the window
+
+    await asyncio.wait_for(
+        asyncio.gather(*[create(c) for c in context_names]),
+        timeout=10
+    )
+    assert coordinator.batches == len(context_names) // 2
+    assert committed_contexts(path) == context_names
+
+@pytest.mark.asyncio
+async def test_flush(file_engine, context_names):
+    engine, path = file_engine
+    coordinator = dbi.WriteCoordinator(engine, window=60)
+
+    async def create(context_name):
+        async with coordinator.begin() as conn:
+            await dbi.create_context(conn, context_name)
+
+    task = asyncio.ensure_future(create(context_names[0]))
+    await asyncio.sleep(0)
+    await coordinator.flush()
+    await asyncio.wait_for(task, timeout=10)
+    assert committed_contexts(path) == context_names[:1]
@@ -0,0 +1,166 @@
+
+import pytest
+from sqlalchemy.sql import select
+
+from jupyterhub_entrypoint import dbi
+
+# Statement budgets for the dbi calls handlers make, with context ids cached
+# the way the service does. Raise a budget only on purpose.
+
+@pytest.fixture
+async def populated(engine, context_names, users):
+    dbi.trace_statements(engine)
+    async with engine.begin() as conn:
+        for context_name in context_names:
+            await dbi.create_context(conn, context_name)
+        context_ids = await dbi.retrieve_context_ids(conn)
+        await dbi.create_entrypoint(
+            conn,
+            users[0],
+            "mercury",
+            "script",
+            dict(entrypoint_name="mercury"),
+            context_names[:2],
+            context_ids=context_ids
+        )
+    return engine, context_ids
+
+@pytest.mark.asyncio
+async def test_create(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        with dbi.statement_budget(2):
+            await dbi.create_entrypoint(
+                conn,
+                users[0],
+                "venus",
+                "script",
+                dict(entrypoint_name="venus"),
+                context_names,
+                context_ids=context_ids
+            )
+
+@pytest.mark.asyncio
+async def test_retrieve(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        with dbi.statement_budget(1):
+            await dbi.retrieve_many_entrypoints(
+                conn,
+                users[0],
+                context_name=context_names[0]
+            )
+        with dbi.statement_budget(1):
+            await dbi.retrieve_one_entrypoint(conn, users[0], "mercury")
+
+@pytest.mark.asyncio
+async def test_tag(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        with dbi.statement_budget(2):
+            await dbi.tag_entrypoint(
+                conn,
+                users[0],
+                "mercury",
+                context_names[2],
+                context_ids=context_ids
+            )
+        with dbi.statement_budget(2):
+            await dbi.untag_entrypoint(
+                conn,
+                users[0],
+                "mercury",
+                context_names[2],
+                context_ids=context_ids
+            )
+
+@pytest.mark.asyncio
+async def test_set_contexts(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        uuid = await conn.scalar(
+            select(dbi.model.entrypoints.c.uuid)
+            .where(dbi.model.entrypoints.c.entrypoint_name == "mercury")
+        )
+        with dbi.statement_budget(2):
+            await dbi.set_entrypoint_contexts(
+                conn,
+                users[0],
+                uuid,
+                context_names[1:],
+                context_ids=context_ids
+            )
+
+@pytest.mark.asyncio
+async def test_selection(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        with dbi.statement_budget(2):
+            await dbi.update_selection(
+                conn,
+                users[0],
+                "mercury",
+                context_names[0],
+                context_ids=context_ids
+            )
+        with dbi.statement_budget(1):
+            await dbi.retrieve_selection(conn, users[0], context_names[0])
+        with dbi.statement_budget(1):
+            await dbi.delete_selection(
+                conn,
+                users[0],
+                context_names[0],
+                context_ids=context_ids
+            )
+
+@pytest.mark.asyncio
+async def test_exceeded(populated, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        with pytest.raises(AssertionError):
+            with dbi.statement_budget(1):
+                await dbi.retrieve_one_entrypoint(conn, users[0], "mercury")
+                await dbi.retrieve_one_entrypoint(conn, users[0], "mercury")
+
+@pytest.mark.asyncio
+async def test_spawner_args(populated, context_names, users):
+    engine, context_ids = populated
+    async with engine.begin() as conn:
+        await dbi.update_selection(
+            conn,
+            users[0],
+            "mercury",
+            context_names[0],
+            context_ids=context_ids
+        )
+        with dbi.statement_budget(1):
+            await dbi.set_spawner_args(
+                conn,
+                users[0],
+                "mercury",
+                dict(spawner_args="{}", batchspawner_args="{}"),
+                replace=False
+            )
+        with dbi.statement_budget(2):
+            await dbi.set_spawner_args(
+                conn,
+                users[0],
+                "mercury",
+                dict(spawner_args="{}", batchspawner_args="{}")
+            )
+        with dbi.statement_budget(1):
+            await dbi.retrieve_selection(
+                conn,
+                users[0],
+                context_names[0],
+                raw=True,
+                batchspawner=True
+            )
+        with dbi.statement_budget(1):
+            await dbi.retrieve_many_entrypoints(
+                conn,
+                users[0],
+                context_name=context_names[0],
+                raw=True,
+                batchspawner=False
+            )
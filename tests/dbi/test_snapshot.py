@@ -0,0 +1,45 @@
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+@pytest.mark.asyncio
+async def test_ok(engine, context_names, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+    assert dbi.is_memory_database(engine)
+    async with engine.begin() as conn:
+        await dbi.create_contexts(conn, context_names)
+    assert await dbi.write_snapshot(engine, path)
+
+    # A fresh in-memory database restored from the snapshot has its data
+
+    restored = dbi.async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    assert await dbi.restore_snapshot(restored, path)
+    async with restored.begin() as conn:
+        assert await dbi.retrieve_contexts(conn) == sorted(context_names)
+    await restored.dispose()
+
+@pytest.mark.asyncio
+async def test_in_transaction(engine, context_names, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+
+    # Uncommitted changes are never written
+
+    async with engine.begin() as conn:
+        await dbi.create_contexts(conn, context_names)
+        assert not await dbi.write_snapshot(engine, path)
+    assert not (tmp_path / "snapshot.sqlite").exists()
+
+    # Trying didn't disturb the transaction
+
+    async with engine.connect() as conn:
+        assert await dbi.retrieve_contexts(conn) == context_names
+
+@pytest.mark.asyncio
+async def test_no_snapshot(engine, tmp_path):
+    path = str(tmp_path / "snapshot.sqlite")
+    assert not await dbi.restore_snapshot(engine, path)
+
+def test_file_database(tmp_path):
+    engine = dbi.async_engine(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite")
+    assert not dbi.is_memory_database(engine)
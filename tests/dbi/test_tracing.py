@@ -0,0 +1,35 @@
+
+import logging
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.dbi.tracing import redact
+
+@pytest.mark.asyncio
+async def test_operation(engine, context_names):
+    observed = list()
+    dbi.trace_statements(
+        engine,
+        observe=lambda name, seconds: observed.append(name)
+    )
+    async with engine.begin() as conn:
+        await dbi.create_context(conn, context_names[0])
+        await dbi.retrieve_contexts(conn)
+    assert observed == ["create_context", "retrieve_contexts"]
+
+@pytest.mark.asyncio
+async def test_slow_query_log(engine, context_names, caplog):
+    log = logging.getLogger("test_tracing")
+    dbi.trace_statements(engine, slow_query_threshold=1e-9, log=log)
+    with caplog.at_level(logging.WARNING, logger="test_tracing"):
+        async with engine.begin() as conn:
+            await dbi.create_context(conn, context_names[0])
+    message, = [r.getMessage() for r in caplog.records]
+    assert "create_context" in message
+    assert "INSERT INTO contexts" in message
+    assert context_names[0] not in message
+
+def test_redact():
+    assert redact(("forbin", 1, None)) == ("<str:6>", 1, None)
+    assert redact({"user": "forbin"}) == {"user": "<str:6>"}
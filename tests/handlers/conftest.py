@@ -0,0 +1,138 @@
+
+import json
+
+import pytest
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.cache import ResponseCache, SingleFlight
+from jupyterhub_entrypoint.handlers import (
+    EntrypointAPIHandler, SelectionAPIHandler, HubSelectionAPIHandler,
+    HubEntrypointAPIHandler
+)
+from jupyterhub_entrypoint.types import TrustedScriptEntrypointType
+
+SCRIPT = "/usr/local/bin/entrypoint.sh"
+TOKEN = "secret"
+
+# Handlers get the user from a header rather than from the hub
+
+class TestUser:
+    def get_current_user(self):
+        return {"name": self.request.headers.get("X-User", "forbin")}
+
+class TestEntrypointAPIHandler(TestUser, EntrypointAPIHandler):
+    pass
+
+class TestSelectionAPIHandler(TestUser, SelectionAPIHandler):
+    pass
+
+class Client:
+    """Makes requests to a test service as a user or as the hub."""
+
+    def __init__(self, port):
+        self.url = f"http://127.0.0.1:{port}"
+        self.http = AsyncHTTPClient()
+
+    async def fetch(self, path, method="GET", body=None, user="forbin"):
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if method in ("POST", "PUT") and body is None:
+            body = ""
+        return await self.http.fetch(
+            self.url + path,
+            method=method,
+            body=body,
+            headers={"X-User": user, "Authorization": f"token {TOKEN}"},
+            raise_error=False
+        )
+
+    async def create(self, name, context_names, user="forbin"):
+        response = await self.fetch("/api/entrypoints/", "POST", dict(
+            entrypoint_type="trusted_script",
+            entrypoint_data=dict(entrypoint_name=name, script=SCRIPT),
+            context_names=context_names
+        ), user)
+        assert json.loads(response.body)["result"]
+        return response
+
+@pytest.fixture
+def context_names():
+    return ["colossus", "skynet"]
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engines = list()
+
+    def create(**kwargs):
+        url = f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}"
+        engine = dbi.async_engine(
+            url,
+            sqlite_pragmas=dict(journal_mode="WAL", busy_timeout=5000),
+            future=True,
+            **kwargs
+        )
+        dbi.trace_statements(engine)
+        engines.append(engine)
+        return engine
+
+    yield create
+
+@pytest.fixture
+async def serve(monkeypatch, context_names, file_engine):
+    """Start the service's API handlers, return a client for them."""
+
+    monkeypatch.setenv("ENTRYPOINT_API_TOKEN", TOKEN)
+    servers = list()
+    engines = list()
+
+    async def serve(engine=None, read_engine=None, **settings):
+        engine = engine or file_engine()
+        if read_engine is None:
+            read_engine = engine.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+        engines.extend([engine, read_engine])
+        async with engine.begin() as conn:
+            await dbi.init_db(conn)
+            await dbi.create_contexts(conn, context_names)
+            context_ids = await dbi.retrieve_context_ids(conn)
+
+        entrypoint_type = TrustedScriptEntrypointType(SCRIPT)
+        app = Application([
+            (r"/api/entrypoints/$", TestEntrypointAPIHandler),
+            (r"/api/entrypoints/(.+)", TestEntrypointAPIHandler),
+            (
+                r"/api/selections/(.+)/contexts/(.+)",
+                TestSelectionAPIHandler
+            ),
+            (r"/api/users/(.+)/selections/(.+)", HubSelectionAPIHandler),
+            (r"/api/users/(.+)/entrypoints/(.+)", HubEntrypointAPIHandler),
+        ], **dict(dict(
+            engine=engine,
+            read_engine=read_engine,
+            contexts=[dict(context_name=c) for c in context_names],
+            context_ids=context_ids,
+            query_count_header=True,
+            read_model=None,
+            selection_cache=ResponseCache(0),
+            single_flight=SingleFlight(),
+            write_coordinator=None,
+            snapshot_lock=None,
+            entrypoint_types={"trusted_script": entrypoint_type}
+        ), **settings))
+
+        sock, port = bind_unused_port()
+        server = HTTPServer(app)
+        server.add_sockets([sock])
+        servers.append(server)
+        return Client(port)
+
+    yield serve
+    for server in servers:
+        server.stop()
+    for engine in engines:
+        await engine.dispose()
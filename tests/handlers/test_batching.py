@@ -0,0 +1,50 @@
+
+import asyncio
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+
+USERS = ["forbin", "kleinemann", "blake", "grauber"]
+
+@pytest.mark.asyncio
+async def test_selections(serve, file_engine, context_names):
+    engine = file_engine()
+    coordinator = dbi.WriteCoordinator(engine, window=60, max_batch=4)
+    client = await serve(engine, write_coordinator=coordinator)
+    context_name = context_names[0]
+    path = f"/api/selections/mercury/contexts/{context_name}"
+
+    # A full batch commits without waiting out the window, so these share one
+
+    await asyncio.wait_for(asyncio.gather(
+        *[client.create("mercury", context_names, user) for user in USERS]
+    ), timeout=10)
+    coordinator.max_batch = 1
+    await client.fetch(path, "PUT", user=USERS[3])
+
+    # Selecting a missing entrypoint fails only that caller, while the other
+    # writes commit together in the next batch
+
+    coordinator.max_batch = 3
+    responses = await asyncio.wait_for(asyncio.gather(
+        client.fetch(path, "PUT", user=USERS[0]),
+        client.fetch(
+            f"/api/selections/venus/contexts/{context_name}",
+            "PUT",
+            user=USERS[1]
+        ),
+        client.fetch(path, "PUT", user=USERS[2]),
+        client.fetch(path, "DELETE", user=USERS[3]),
+    ), timeout=10)
+    assert [r.code for r in responses] == [200, 500, 200, 200]
+
+    selected = list()
+    for user in USERS:
+        response = await client.fetch(
+            f"/api/users/{user}/selections/{context_name}"
+        )
+        if response.code == 200:
+            selected.append(user)
+    assert selected == [USERS[0], USERS[2]]
+    assert (coordinator.batches, coordinator.writes) == (3, 8)
@@ -0,0 +1,70 @@
+
+import json
+
+import pytest
+
+from .conftest import SCRIPT
+
+# Statement budgets for whole requests to hot handlers, as reported in the
+# query count header. Raise a budget only on purpose.
+
+def statements(response):
+    assert response.code == 200, response.body
+    return int(response.headers["X-Entrypoint-Query-Count"])
+
+@pytest.fixture
+async def client(serve, context_names):
+    client = await serve()
+    await client.create("mercury", context_names)
+    await client.create("venus", context_names[:1])
+    return client
+
+async def uuid(client, entrypoint_name):
+    response = await client.fetch("/api/entrypoints/")
+    for group in json.loads(response.body)["entrypoints"]:
+        for entry in group["entrypoints"]:
+            if entry["entrypoint_data"]["entrypoint_name"] == entrypoint_name:
+                return entry["uuid"]
+
+@pytest.mark.asyncio
+async def test_create(client, context_names):
+    response = await client.create("earth", context_names)
+    assert statements(response) <= 3
+
+@pytest.mark.asyncio
+async def test_update(client, context_names):
+
+    # Retagging costs the same however many contexts change
+
+    response = await client.fetch(
+        f"/api/entrypoints/{await uuid(client, 'mercury')}",
+        "PUT",
+        dict(
+            entrypoint_data=dict(entrypoint_name="mercury", script=SCRIPT),
+            context_names=context_names[1:]
+        )
+    )
+    assert json.loads(response.body)["result"]
+    assert statements(response) <= 6
+
+@pytest.mark.asyncio
+async def test_delete(client):
+    response = await client.fetch("/api/entrypoints/venus", "DELETE")
+    assert statements(response) <= 1
+
+@pytest.mark.asyncio
+async def test_selection(client, context_names):
+    path = f"/api/selections/mercury/contexts/{context_names[0]}"
+    assert statements(await client.fetch(path, "PUT")) <= 2
+    assert statements(await client.fetch(path, "DELETE")) <= 1
+
+@pytest.mark.asyncio
+async def test_hub(client, context_names):
+    await client.fetch(
+        f"/api/selections/mercury/contexts/{context_names[0]}", "PUT"
+    )
+    for kind in ["selections", "entrypoints"]:
+        response = await client.fetch(
+            f"/api/users/forbin/{kind}/{context_names[0]}"
+        )
+        assert statements(response) <= 1
@@ -0,0 +1,103 @@
+
+import pytest
+from prometheus_client import REGISTRY
+
+from jupyterhub_entrypoint.entrypoint import EntrypointService
+from jupyterhub_entrypoint.read_model import ReadModel
+from jupyterhub_entrypoint.types import TrustedScriptEntrypointType
+
+from .conftest import SCRIPT
+
+def checkouts(pool):
+    return REGISTRY.get_sample_value(
+        "entrypoint_db_pool_checkout_duration_seconds_count",
+        dict(pool=pool)
+    ) or 0.0
+
+async def hub_reads(client, context_names):
+    before = checkouts("primary"), checkouts("read")
+    response = await client.fetch(
+        f"/api/users/forbin/entrypoints/{context_names[0]}"
+    )
+    assert response.code == 200
+    return checkouts("primary") - before[0], checkouts("read") - before[1]
+
+@pytest.mark.asyncio
+async def test_autocommit_reads(serve, context_names):
+
+    # Autocommit reads from the primary pool are counted as the primary's
+
+    client = await serve()
+    assert await hub_reads(client, context_names) == (1, 0)
+
+@pytest.fixture
+async def service(tmp_path, caplog):
+    """Create engines the way the service does, dispose of them after."""
+
+    engines = list()
+
+    def create(**kwargs):
+        url = f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}"
+        service = EntrypointService(**dict(dict(database_url=url), **kwargs))
+        service.log.addHandler(caplog.handler)
+        try:
+            engine, read_engine = service.init_engines()
+        finally:
+            service.log.removeHandler(caplog.handler)
+        engines.extend([engine, read_engine])
+        return engine, read_engine
+
+    yield create
+    for engine in engines:
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_sqlite_readers(serve, service, context_names, caplog):
+
+    # Hub reads go to the read-only pool
+
+    engine, read_engine = service(sqlite_readers=2)
+    assert caplog.messages == []
+    assert read_engine.url.query.get("mode") == "ro"
+    client = await serve(engine, read_engine)
+    assert await hub_reads(client, context_names) == (0, 1)
+
+@pytest.mark.asyncio
+async def test_sqlite_readers_refresh(serve, service, context_names):
+
+    # So do read model refreshes after writes
+
+    engine, read_engine = service(sqlite_readers=2)
+    read_model = ReadModel(
+        {"trusted_script": TrustedScriptEntrypointType(SCRIPT)}
+    )
+    client = await serve(engine, read_engine, read_model=read_model)
+    await read_model.load(engine)
+
+    engines = list()
+    refresh = read_model.refresh
+
+    async def recorded(engine, user):
+        engines.append(engine)
+        await refresh(engine, user)
+
+    read_model.refresh = recorded
+    await client.create("mercury", context_names)
+    assert engines == [read_engine]
+    assert not read_model.is_stale("forbin")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kwargs, warning", [
+    (
+        dict(read_database_url="sqlite+aiosqlite:///:memory:"),
+        "Ignoring sqlite_readers, reads go to read_database_url"
+    ),
+    (
+        dict(database_url="sqlite+aiosqlite:///:memory:"),
+        "Ignoring sqlite_readers, the database is not a SQLite file"
+    ),
+])
+async def test_sqlite_readers_ignored(service, kwargs, warning, caplog):
+    engine, read_engine = service(sqlite_readers=2, **kwargs)
+    assert caplog.messages == [warning]
+    assert read_engine.url.query.get("mode") != "ro"
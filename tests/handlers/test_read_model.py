@@ -0,0 +1,65 @@
+
+import json
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.read_model import ReadModel
+from jupyterhub_entrypoint.types import TrustedScriptEntrypointType
+
+from .conftest import SCRIPT
+
+@pytest.mark.asyncio
+async def test_refresh_error(serve, file_engine, context_names, monkeypatch):
+    engine = file_engine()
+    read_model = ReadModel(
+        {"trusted_script": TrustedScriptEntrypointType(SCRIPT)}
+    )
+    client = await serve(engine, read_model=read_model)
+    await read_model.load(engine)
+
+    def failing(*args, **kwargs):
+        raise RuntimeError
+
+    # The write committed, so it is reported as such, and hub lookups for the
+    # user go to the database until the read model catches up
+
+    monkeypatch.setattr(dbi, "stream_tagged_entrypoints", failing)
+    response = await client.create("mercury", context_names)
+    assert json.loads(response.body)["result"]
+    assert read_model.is_stale("forbin")
+
+    response = await client.fetch(
+        f"/api/users/forbin/entrypoints/{context_names[0]}"
+    )
+    entries = json.loads(response.body)["entrypoints"]
+    assert [e["entrypoint_name"] for e in entries] == ["mercury"]
+
+@pytest.mark.asyncio
+async def test_refresh_replica(serve, file_engine, context_names, tmp_path):
+    engine = file_engine()
+    replica = dbi.async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'replica.sqlite'}",
+        future=True,
+        isolation_level="AUTOCOMMIT"
+    )
+    async with replica.begin() as conn:
+        await dbi.init_db(conn)
+    read_model = ReadModel(
+        {"trusted_script": TrustedScriptEntrypointType(SCRIPT)}
+    )
+    client = await serve(engine, replica, read_model=read_model)
+    await read_model.load(engine)
+
+    # A replica that hasn't caught up with writes yet doesn't hold the read
+    # model back, which reloads users from the primary
+
+    await client.create("mercury", context_names)
+    await client.fetch(
+        f"/api/selections/mercury/contexts/{context_names[0]}", "PUT"
+    )
+    response = await client.fetch(
+        f"/api/users/forbin/selections/{context_names[0]}"
+    )
+    assert response.code == 200
+    assert json.loads(response.body)["cmd"][0] == SCRIPT
@@ -0,0 +1,46 @@
+
+import asyncio
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.entrypoint import EntrypointService
+
+MEMORY = "sqlite+aiosqlite:///:memory:"
+
+@pytest.mark.asyncio
+async def test_snapshot_waits(serve, context_names, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot.sqlite")
+    engine = dbi.async_engine(MEMORY, future=True)
+    service = EntrypointService(snapshot_path=path)
+    service.snapshot_lock = asyncio.Lock()
+    service.settings = dict(engine=engine)
+    client = await serve(engine, engine, snapshot_lock=service.snapshot_lock)
+
+    paused = asyncio.Event()
+    resume = asyncio.Event()
+    create = dbi.create_entrypoint
+
+    async def slow(*args, **kwargs):
+        await create(*args, **kwargs)
+        paused.set()
+        await resume.wait()
+
+    # A snapshot waits for a write transaction in progress, then has it
+
+    monkeypatch.setattr(dbi, "create_entrypoint", slow)
+    write = asyncio.ensure_future(client.create("mercury", context_names))
+    await paused.wait()
+    snapshot = asyncio.ensure_future(service.write_snapshot())
+    await asyncio.sleep(0.05)
+    assert not snapshot.done()
+    resume.set()
+    await write
+    assert await snapshot
+
+    restored = dbi.async_engine(MEMORY, future=True)
+    assert await dbi.restore_snapshot(restored, path)
+    async with restored.connect() as conn:
+        entrypoints = await dbi.retrieve_many_entrypoints(conn, "forbin")
+    assert entrypoints
+    await restored.dispose()
@@ -0,0 +1,61 @@
+
+import json
+
+import pytest
+from tornado.simple_httpclient import HTTPStreamClosedError
+
+from jupyterhub_entrypoint import dbi
+
+@pytest.fixture
+async def client(serve, context_names):
+    client = await serve()
+    await client.create("mercury", context_names[:1])
+    await client.create("venus", context_names[1:])
+    return client
+
+@pytest.mark.asyncio
+async def test_stream(client, context_names):
+    response = await client.fetch("/api/entrypoints/")
+    assert response.headers["Content-Type"].startswith("application/json")
+    groups = json.loads(response.body)["entrypoints"]
+    assert [g["context_name"] for g in groups] == context_names
+
+@pytest.mark.asyncio
+async def test_page(client, context_names):
+    response = await client.fetch("/api/entrypoints/?limit=1")
+    assert response.headers["Content-Type"].startswith("application/json")
+    body = json.loads(response.body)
+    assert [g["context_name"] for g in body["entrypoints"]] == context_names[:1]
+
+    after = body["after"]
+    response = await client.fetch(f"/api/entrypoints/?limit=1&after={after}")
+    body = json.loads(response.body)
+    assert [g["context_name"] for g in body["entrypoints"]] == context_names[1:]
+
+@pytest.mark.asyncio
+async def test_stream_error(client, monkeypatch):
+    stream = dbi.stream_many_entrypoints
+
+    async def failing(*args, **kwargs):
+        async for group in stream(*args, **kwargs):
+            yield group
+            raise RuntimeError
+
+    # Failing after the first group was sent never looks like a success
+
+    monkeypatch.setattr(dbi, "stream_many_entrypoints", failing)
+    with pytest.raises(HTTPStreamClosedError):
+        await client.fetch("/api/entrypoints/")
+
+@pytest.mark.asyncio
+async def test_stream_error_first(client, monkeypatch):
+
+    async def failing(*args, **kwargs):
+        raise RuntimeError
+        yield
+
+    # Failing before anything was sent is an error response
+
+    monkeypatch.setattr(dbi, "stream_many_entrypoints", failing)
+    response = await client.fetch("/api/entrypoints/")
+    assert response.code == 500
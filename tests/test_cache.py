@@ -0,0 +1,127 @@
+
+import asyncio
+import time
+
+import pytest
+
+from jupyterhub_entrypoint.cache import ResponseCache, SingleFlight
+
+def test_hit_miss():
+    cache = ResponseCache(max_size=4, ttl=60)
+    key = ("forbin", "colossus", ())
+    assert cache.get(key) is None
+    cache.set(key, "{}")
+    assert cache.get(key) == "{}"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lru():
+    cache = ResponseCache(max_size=2, ttl=60)
+    cache.set(("forbin", "colossus", ()), 1)
+    cache.set(("kuprin", "colossus", ()), 2)
+    cache.get(("forbin", "colossus", ()))
+    cache.set(("dyson", "colossus", ()), 3)
+
+    # Least recently used entry is the one evicted
+
+    assert cache.get(("kuprin", "colossus", ())) is None
+    assert cache.get(("forbin", "colossus", ())) == 1
+    assert len(cache) == 2
+
+def test_ttl():
+    cache = ResponseCache(max_size=4, ttl=0.01)
+    cache.set(("forbin", "colossus", ()), 1)
+    time.sleep(0.02)
+    assert cache.get(("forbin", "colossus", ())) is None
+    assert len(cache) == 0
+
+def test_invalidate():
+    cache = ResponseCache(max_size=4, ttl=60)
+    cache.set(("forbin", "colossus", ()), 1)
+    cache.set(("forbin", "guardian", ()), 2)
+    cache.set(("kuprin", "colossus", ()), 3)
+    cache.invalidate("forbin")
+
+    # Only the invalidated user's entries are dropped
+
+    assert cache.get(("forbin", "colossus", ())) is None
+    assert cache.get(("forbin", "guardian", ())) is None
+    assert cache.get(("kuprin", "colossus", ())) == 3
+
+def test_invalidate_during_read():
+    cache = ResponseCache(max_size=4, ttl=60)
+    key = ("forbin", "colossus", ())
+
+    # Value read before an invalidation is not cached after it
+
+    version = cache.version("forbin")
+    cache.invalidate("forbin")
+    cache.set(key, 1, version)
+    assert cache.get(key) is None
+
+    version = cache.version("forbin")
+    cache.clear()
+    cache.set(key, 1, version)
+    assert cache.get(key) is None
+
+def test_disabled():
+    cache = ResponseCache(max_size=0, ttl=60)
+    cache.set(("forbin", "colossus", ()), 1)
+    assert cache.get(("forbin", "colossus", ())) is None
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    single_flight = SingleFlight()
+    calls = list()
+
+    async def lookup(user):
+        calls.append(user)
+        await asyncio.sleep(0.01)
+        return dict(user=user)
+
+    # Concurrent calls with the same key share one call and its result
+
+    results = await asyncio.gather(
+        single_flight.run(("forbin",), lookup, "forbin"),
+        single_flight.run(("forbin",), lookup, "forbin"),
+        single_flight.run(("kuprin",), lookup, "kuprin"),
+    )
+    assert calls == ["forbin", "kuprin"]
+    assert results[0] is results[1]
+    assert (single_flight.calls, single_flight.coalesced) == (2, 1)
+
+    # Once finished, the next call starts over
+
+    await single_flight.run(("forbin",), lookup, "forbin")
+    assert calls == ["forbin", "kuprin", "forbin"]
+
+@pytest.mark.asyncio
+async def test_single_flight_error():
+    single_flight = SingleFlight()
+
+    async def lookup():
+        await asyncio.sleep(0.01)
+        raise ValueError
+
+    # Every waiter gets the exception
+
+    results = await asyncio.gather(
+        single_flight.run(("forbin",), lookup),
+        single_flight.run(("forbin",), lookup),
+        return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+    assert ("forbin",) not in single_flight
+
+def test_invalidated_bounded():
+    cache = ResponseCache(max_size=2, ttl=60)
+    version = cache.version("forbin")
+    for i in range(10):
+        cache.invalidate(f"user{i}")
+
+    # Only recent invalidations are kept, and older ones still count
+
+    assert len(cache._invalidated) == 2
+    cache.set(("forbin", "colossus", ()), 1, version)
+    assert cache.get(("forbin", "colossus", ())) is None
+    cache.set(("forbin", "colossus", ()), 1, cache.version("forbin"))
+    assert cache.get(("forbin", "colossus", ())) == 1
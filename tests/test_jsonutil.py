@@ -0,0 +1,14 @@
+
+import json
+
+from jupyterhub_entrypoint import jsonutil
+
+def test_round_trip():
+    obj = {"entrypoint_name": "mercury", "cmd": ["a", "b"], "n": 1, "x": None}
+    assert jsonutil.loads(jsonutil.dumps(obj)) == obj
+    assert jsonutil.loads(jsonutil.dumps_bytes(obj)) == obj
+    assert json.loads(jsonutil.dumps(obj)) == obj
+
+def test_compact():
+    assert jsonutil.dumps({"a": [1, 2]}) == '{"a":[1,2]}'
+    assert jsonutil.dumps_bytes({"a": "é"}) == '{"a":"é"}'.encode()
@@ -0,0 +1,64 @@
+
+import pytest
+
+from prometheus_client import REGISTRY
+
+from jupyterhub_entrypoint import dbi, metrics
+from jupyterhub_entrypoint.cache import ResponseCache, SingleFlight
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_cache_collector():
+    cache = ResponseCache(max_size=4, ttl=60)
+    metrics.register_cache("test", cache)
+    cache.get(("forbin", "colossus", ()))
+    cache.set(("forbin", "colossus", ()), "{}")
+    cache.get(("forbin", "colossus", ()))
+    assert sample("entrypoint_cache_hits_total", cache="test") == 1
+    assert sample("entrypoint_cache_misses_total", cache="test") == 1
+    assert sample("entrypoint_cache_entries", cache="test") == 1
+
+@pytest.mark.asyncio
+async def test_single_flight_collector():
+    single_flight = SingleFlight()
+    metrics.register_single_flight("test", single_flight)
+
+    async def call():
+        return 1
+
+    await single_flight.run(("forbin",), call)
+    assert sample("entrypoint_coalesced_calls_total", layer="test") == 1
+
+@pytest.mark.asyncio
+async def test_instrument_engine():
+    engine = dbi.async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    metrics.instrument_engine(engine)
+    name = "entrypoint_db_transaction_duration_seconds_count"
+    commits = sample(name, outcome="commit")
+    rollbacks = sample(name, outcome="rollback")
+
+    async with engine.begin() as conn:
+        await dbi.init_db(conn, True)
+    with pytest.raises(ValueError):
+        async with engine.begin() as conn:
+            await dbi.create_context(conn, "colossus")
+            await dbi.retrieve_selection(conn, "forbin", "colossus")
+
+    assert sample(name, outcome="commit") == commits + 1
+    assert sample(name, outcome="rollback") == rollbacks + 1
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_pool_collector(tmp_path):
+    engine = dbi.async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'entrypoint.sqlite'}",
+        pool_size=3,
+        future=True
+    )
+    metrics.register_pool("test", engine)
+    async with engine.connect():
+        assert sample("entrypoint_db_pool_size", pool="test") == 3
+        assert sample("entrypoint_db_pool_checked_out", pool="test") == 1
+    assert sample("entrypoint_db_pool_checked_out", pool="test") == 0
+    await engine.dispose()
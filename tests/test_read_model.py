@@ -0,0 +1,185 @@
+
+import json
+
+import pytest
+
+from jupyterhub_entrypoint import dbi
+from jupyterhub_entrypoint.read_model import ReadModel
+from jupyterhub_entrypoint.types import TrustedScriptEntrypointType
+
+SCRIPT = "/usr/local/bin/entrypoint.sh"
+
+@pytest.fixture
+async def engine():
+    engine = dbi.async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async with engine.begin() as conn:
+        await dbi.init_db(conn, True)
+        await dbi.create_contexts(conn, ["colossus", "skynet"])
+    yield engine
+    await engine.dispose()
+
+@pytest.fixture
+def entrypoint_types():
+    entrypoint_type = TrustedScriptEntrypointType(SCRIPT)
+    return {entrypoint_type.get_type_name(): entrypoint_type}
+
+async def create(engine, entrypoint_types, user, entrypoint_name, contexts):
+    entrypoint_data = dict(entrypoint_name=entrypoint_name, script=SCRIPT)
+    entrypoint_type = entrypoint_types["trusted_script"]
+    async with engine.begin() as conn:
+        await dbi.create_entrypoint(
+            conn,
+            user,
+            entrypoint_name,
+            "trusted_script",
+            entrypoint_data,
+            contexts
+        )
+        await dbi.set_spawner_args(
+            conn,
+            user,
+            entrypoint_name,
+            entrypoint_type.materialize_spawner_args(entrypoint_data)
+        )
+
+def decode(entries):
+    return [json.loads(entry) for entry in entries]
+
+@pytest.mark.asyncio
+async def test_load(engine, entrypoint_types):
+    for name in ["mercury", "venus", "earth"]:
+        await create(engine, entrypoint_types, "forbin", name, ["colossus"])
+    async with engine.begin() as conn:
+        await dbi.update_selection(conn, "forbin", "venus", "colossus")
+
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+    assert len(read_model) == 1
+    assert read_model.footprint() > 0
+
+    # Same spawner args the type renders, entrypoints in name order
+
+    entrypoint_type = entrypoint_types["trusted_script"]
+    for batchspawner in [False, True]:
+        assert json.loads(read_model.selection(
+            "forbin", "colossus", batchspawner
+        )) == entrypoint_type.spawner_args(
+            dict(entrypoint_name="venus", script=SCRIPT),
+            batchspawner=batchspawner
+        )
+    entries, after = read_model.entrypoints("forbin", "colossus")
+    assert after is None
+    assert [
+        (e["entrypoint_name"], e["selected"]) for e in decode(entries)
+    ] == [("earth", False), ("mercury", False), ("venus", True)]
+
+    # No selection, or no such user
+
+    with pytest.raises(KeyError):
+        read_model.selection("forbin", "skynet")
+    with pytest.raises(KeyError):
+        read_model.selection("kuprin", "colossus")
+    assert read_model.entrypoints("kuprin", "colossus") == ([], None)
+
+@pytest.mark.asyncio
+async def test_pages(engine, entrypoint_types):
+    names = [f"e{i}" for i in range(5)]
+    for name in names:
+        await create(engine, entrypoint_types, "forbin", name, ["colossus"])
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+
+    # Pages match what the database returns
+
+    seen = list()
+    after = db_after = None
+    while True:
+        entries, after = read_model.entrypoints(
+            "forbin", "colossus", limit=2, after=after
+        )
+        async with engine.connect() as conn:
+            page, db_after = await dbi.retrieve_entrypoint_page(
+                conn, "forbin", None, "colossus", 2, db_after
+            )
+        assert after == db_after
+        seen += [e["entrypoint_name"] for e in decode(entries)]
+        if after is None:
+            break
+    assert seen == names
+
+@pytest.mark.asyncio
+async def test_refresh(engine, entrypoint_types):
+    await create(engine, entrypoint_types, "forbin", "mercury", ["colossus"])
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+
+    # Writes show up once the user is refreshed
+
+    await create(engine, entrypoint_types, "forbin", "venus", ["colossus"])
+    async with engine.begin() as conn:
+        await dbi.update_selection(conn, "forbin", "venus", "colossus")
+    assert len(read_model.entrypoints("forbin", "colossus")[0]) == 1
+    await read_model.refresh(engine, "forbin")
+    assert len(read_model.entrypoints("forbin", "colossus")[0]) == 2
+    read_model.selection("forbin", "colossus")
+
+    # A user with nothing tagged left is dropped
+
+    async with engine.begin() as conn:
+        await dbi.delete_entrypoint(conn, "forbin", "mercury")
+        await dbi.delete_entrypoint(conn, "forbin", "venus")
+    await read_model.refresh(engine, "forbin")
+    assert len(read_model) == 0
+
+@pytest.mark.asyncio
+async def test_refresh_order(engine, entrypoint_types):
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+
+    # A refresh finishing after a later one doesn't overwrite it
+
+    await create(engine, entrypoint_types, "forbin", "mercury", ["colossus"])
+    read_model._generations["forbin"] = 1
+    read_model._applied["forbin"] = 2
+    await read_model.refresh(engine, "forbin")
+    assert len(read_model) == 0
+    await read_model.refresh(engine, "forbin")
+    assert len(read_model) == 1
+
+@pytest.mark.asyncio
+async def test_unknown_type(engine, entrypoint_types):
+    async with engine.begin() as conn:
+        await dbi.create_entrypoint(
+            conn,
+            "forbin",
+            "mercury",
+            "conda",
+            dict(entrypoint_name="mercury"),
+            ["colossus"]
+        )
+        await dbi.update_selection(conn, "forbin", "mercury", "colossus")
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+    with pytest.raises(KeyError):
+        read_model.selection("forbin", "colossus")
+    with pytest.raises(KeyError):
+        read_model.entrypoints("forbin", "colossus")
+
+@pytest.mark.asyncio
+async def test_refresh_error(engine, entrypoint_types, monkeypatch):
+    read_model = ReadModel(entrypoint_types)
+    await read_model.load(engine)
+
+    # A failed refresh leaves the user stale until one succeeds
+
+    def failing(*args, **kwargs):
+        raise RuntimeError
+
+    with monkeypatch.context() as m:
+        m.setattr(dbi, "stream_tagged_entrypoints", failing)
+        with pytest.raises(RuntimeError):
+            await read_model.refresh(engine, "forbin")
+    assert read_model.is_stale("forbin")
+    assert not read_model.is_stale("kuprin")
+    await read_model.refresh(engine, "forbin")
+    assert not read_model.is_stale("forbin")
@@ -0,0 +1,121 @@
+
+import asyncio
+
+import pytest
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from jupyterhub_entrypoint.types import (
+    EntrypointValidationError, ShifterEntrypointType
+)
+
+# Stand-in for the Shifter image service, like examples/*/image-server.py
+
+class ImageHandler(RequestHandler):
+
+    def initialize(self, requests):
+        self.requests = requests
+
+    async def get(self, username):
+        self.requests.append(username)
+        self.write({"images": [
+            {"tag": ["ubuntu:latest"]},
+            {"tag": ["centos:latest"]},
+            {"tag": ["nginx:latest"]},
+        ]})
+
+@pytest.fixture
+async def image_service():
+    requests = list()
+    app = Application([
+        ("/services/images/list/(.+)", ImageHandler, dict(requests=requests))
+    ])
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    yield f"http://127.0.0.1:{port}/services/images/", requests
+    server.stop()
+    ShifterEntrypointType._catalogs.clear()
+
+@pytest.mark.asyncio
+async def test_cached(image_service):
+    url, requests = image_service
+    entrypoint_type = ShifterEntrypointType(url, "token", username="forbin")
+
+    # Form options and validation share one upstream request
+
+    images = await entrypoint_type.get_options("image", None)
+    assert images == ["ubuntu:latest", "centos:latest", "nginx:latest"]
+    await entrypoint_type.validation_hook(
+        dict(entrypoint_name="mercury", image="centos:latest")
+    )
+    with pytest.raises(EntrypointValidationError):
+        await entrypoint_type.validation_hook(
+            dict(entrypoint_name="mercury", image="mysql:latest")
+        )
+    assert requests == ["forbin"]
+
+    # Cache is per user
+
+    entrypoint_type = ShifterEntrypointType(url, "token", username="kuprin")
+    await entrypoint_type.get_images()
+    assert requests == ["forbin", "kuprin"]
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate(image_service):
+    url, requests = image_service
+    entrypoint_type = ShifterEntrypointType(
+        url, "token", None, 0.01, 60, username="forbin"
+    )
+    await entrypoint_type.get_images()
+    await asyncio.sleep(0.02)
+
+    # Stale catalog is returned right away and refreshed in the background
+
+    catalog = await entrypoint_type.get_catalog()
+    assert len(requests) == 1
+    await asyncio.sleep(0.1)
+    assert len(requests) == 2
+    assert await entrypoint_type.get_catalog() is not catalog
+
+@pytest.mark.asyncio
+async def test_expired(image_service):
+    url, requests = image_service
+    entrypoint_type = ShifterEntrypointType(
+        url, "token", None, 0.01, 0.01, username="forbin"
+    )
+    await entrypoint_type.get_images()
+    await asyncio.sleep(0.03)
+
+    # Catalog too old to use is fetched again before returning
+
+    await entrypoint_type.get_images()
+    assert len(requests) == 2
+
+@pytest.mark.asyncio
+async def test_coalesced(image_service):
+    url, requests = image_service
+    entrypoint_type = ShifterEntrypointType(url, "token", username="forbin")
+
+    # Concurrent cache misses make one upstream request
+
+    results = await asyncio.gather(*[
+        entrypoint_type.get_images() for i in range(5)
+    ])
+    assert requests == ["forbin"]
+    assert all(r == results[0] for r in results)
+
+@pytest.mark.asyncio
+async def test_for_user(image_service):
+    url, requests = image_service
+    entrypoint_type = ShifterEntrypointType(url, "token")
+
+    # Views bound to users share configuration but fetch their own images
+
+    forbin = entrypoint_type.for_user("forbin")
+    kuprin = entrypoint_type.for_user("kuprin")
+    assert forbin.schema is kuprin.schema is entrypoint_type.schema
+    await forbin.get_images()
+    await kuprin.get_images()
+    assert requests == ["forbin", "kuprin"]
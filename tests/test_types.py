@@ -0,0 +1,95 @@
+
+import json
+
+import pytest
+from jsonschema.exceptions import SchemaError
+
+from jupyterhub_entrypoint.types import (
+    EntrypointType, EntrypointValidationError, TrustedScriptEntrypointType
+)
+
+@pytest.fixture
+def scripts():
+    return [f"/usr/local/bin/entrypoint-{i}.sh" for i in range(500)]
+
+@pytest.mark.asyncio
+async def test_trusted_script(scripts):
+    entrypoint_type = TrustedScriptEntrypointType(*scripts)
+    entrypoint_type.compile_schema()
+    validator = entrypoint_type.validator
+
+    # Known scripts validate, with the same compiled validator every time
+
+    for script in scripts[::50]:
+        await entrypoint_type.validate(
+            dict(entrypoint_name="mercury", script=script)
+        )
+    assert entrypoint_type.validator is validator
+    assert entrypoint_type.enum_sets["script"] == frozenset(scripts)
+
+    # Form options still come from the schema, in order
+
+    assert await entrypoint_type.get_options(
+        "script", entrypoint_type.schema["properties"]["script"]
+    ) == scripts
+
+@pytest.mark.parametrize("entrypoint_data", [
+    dict(entrypoint_name="mercury", script="/bin/sh"),
+    dict(entrypoint_name="mercury", script=["/bin/sh"]),
+    dict(entrypoint_name="mercury"),
+    dict(entrypoint_name="mercury", script="/bin/sh", other="x"),
+])
+def test_trusted_script_invalid(scripts, entrypoint_data):
+    entrypoint_type = TrustedScriptEntrypointType(*scripts)
+    entrypoint_type.compile_schema()
+    with pytest.raises(EntrypointValidationError):
+        entrypoint_type.validate_schema(entrypoint_data)
+
+def test_bad_schema():
+    entrypoint_type = EntrypointType()
+    entrypoint_type.extend_schema([{"path": {"type": "path"}}])
+    with pytest.raises(SchemaError):
+        entrypoint_type.compile_schema()
+
+def test_spawner_args_json(scripts):
+    entrypoint_json = (
+        '{"entrypoint_name": "mercury", "script": "%s"}' % scripts[0]
+    )
+
+    # Data passes through untouched unless spawner_args is overridden
+
+    assert EntrypointType().spawner_args_json(entrypoint_json) == (
+        entrypoint_json.encode()
+    )
+    entrypoint_type = TrustedScriptEntrypointType(*scripts)
+    assert json.loads(entrypoint_type.spawner_args_json(entrypoint_json)) == (
+        dict(cmd=[scripts[0], entrypoint_type.executable])
+    )
+
+def test_materialize_spawner_args(scripts, monkeypatch):
+    entrypoint_type = TrustedScriptEntrypointType(*scripts)
+    entrypoint_data = dict(entrypoint_name="mercury", script=scripts[0])
+    materialized = entrypoint_type.materialize_spawner_args(entrypoint_data)
+    for key, batchspawner in [
+        ("spawner_args", False),
+        ("batchspawner_args", True)
+    ]:
+        assert json.loads(materialized[key]) == entrypoint_type.spawner_args(
+            entrypoint_data, batchspawner=batchspawner
+        )
+
+    # The fingerprint changes with configuration spawner args depend on
+
+    other = TrustedScriptEntrypointType(*scripts, executable="jupyterhub")
+    assert entrypoint_type.spawner_args_fingerprint() == (
+        TrustedScriptEntrypointType(*scripts).spawner_args_fingerprint()
+    )
+    assert entrypoint_type.spawner_args_fingerprint() != (
+        other.spawner_args_fingerprint()
+    )
+
+    # And with the format version, bumped when spawner args output changes
+
+    fingerprint = entrypoint_type.spawner_args_fingerprint()
+    monkeypatch.setattr(TrustedScriptEntrypointType, "spawner_args_version", 2)
+    assert entrypoint_type.spawner_args_fingerprint() != fingerprint